@@ -0,0 +1 @@
+'''tslove-tools ベンチマーク'''
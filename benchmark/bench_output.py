@@ -0,0 +1,88 @@
+'''HTML出力のベンチマーク
+
+コメント数を増やした日記ページに対して、soup.prettify() でまとめて書き込む旧実装と
+少しずつ書き込む出力(互換形式と字下げなし形式)の処理時間と最大メモリ使用量を計測します
+
+usage: python -m benchmark.bench_output [-n <count>] [-c <comments> ...]
+'''
+
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+from typing import Callable, Tuple
+
+from bs4 import BeautifulSoup  # type: ignore
+
+from tslove.core.parser import make_soup
+from tslove.core.serializer import write_html, COMPACT, COMPATIBLE
+
+from benchmark.synthetic import build_diary_page
+
+
+def prettify_output(soup: BeautifulSoup, file_name: str) -> None:
+    '''旧実装の出力'''
+    with open(file_name, 'w', encoding='utf-8') as file:
+        file.write(soup.prettify(formatter='html'))
+
+
+def stream_output(mode: str) -> Callable[[BeautifulSoup, str], None]:
+    '''少しずつ書き込む出力'''
+    def output(soup: BeautifulSoup, file_name: str) -> None:
+        with open(file_name, 'w', encoding='utf-8') as file:
+            write_html(soup, file, mode)
+    return output
+
+
+def measure(output: Callable, html: str, file_name: str, count: int) -> Tuple[float, int]:
+    '''1ページあたりの出力時間(秒)と出力中の最大メモリ使用量(バイト)を計測します
+
+    処理時間は tracemalloc を止めた状態で計測します。パースの時間とメモリは含みません
+    '''
+    soup = make_soup(html)
+
+    elapsed = 0.0
+    for _ in range(count):
+        start = time.perf_counter()
+        output(soup, file_name)
+        elapsed += time.perf_counter() - start
+
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    base, _ = tracemalloc.get_traced_memory()
+    output(soup, file_name)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    soup.decompose()
+    return elapsed / count, peak - base
+
+
+def main():
+    '''エントリポイント'''
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument('-n', '--count', help='iterations per page', metavar='<count>', type=int, default=10)
+    arg_parser.add_argument('-c', '--comments', help='number of comments', metavar='<comments>', type=int,
+                            nargs='+', default=[15, 100, 500])
+    args = arg_parser.parse_args()
+
+    outputs = [('prettify', prettify_output),
+               (COMPATIBLE, stream_output(COMPATIBLE)),
+               (COMPACT, stream_output(COMPACT))]
+
+    with tempfile.TemporaryDirectory() as output_path:
+        file_name = os.path.join(output_path, 'diary.html')
+
+        print('{:>8} {:>10} {:>12} {:>12} {:>10}'.format('comments', 'output', 'time', 'peak memory', 'size'))
+        for comments in args.comments:
+            html = build_diary_page(comments)
+            for name, output in outputs:
+                elapsed, peak = measure(output, html, file_name, args.count)
+                size = os.path.getsize(file_name)
+                print('{:>8} {:>10} {:>9.2f} ms {:>9.0f} KB {:>7.0f} KB'.format(
+                    comments, name, elapsed * 1000, peak / 1024, size / 1024))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+'''HTMLパーサーのベンチマーク
+
+test/diarydump/data/original-diary-page.html を利用可能な各パーサーで
+DiaryPage に読み込む時間を計測します
+
+usage: python -m benchmark.bench_parser [-n <count>]
+'''
+
+import argparse
+import os
+import time
+
+from bs4.builder import builder_registry  # type: ignore
+
+from tslove.core import parser
+from tslove.core.diary import DiaryPage
+
+DATA_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                         'test', 'diarydump', 'data', 'original-diary-page.html')
+
+PARSERS = ['html.parser', 'lxml', 'html5lib']
+
+
+def measure(name: str, html: str, count: int) -> float:
+    '''1ページあたりの読み込み時間(秒)を計測します'''
+    parser.set_html_parser(name)
+
+    start = time.perf_counter()
+    for _ in range(count):
+        page = DiaryPage()
+        page.append(html)
+        page.release()
+    return (time.perf_counter() - start) / count
+
+
+def main():
+    '''エントリポイント'''
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument('-n', '--count', help='iterations per parser', metavar='<count>', type=int, default=50)
+    args = arg_parser.parse_args()
+
+    with open(DATA_FILE, 'r', encoding='utf-8') as file:
+        html = file.read()
+
+    results = {}
+    for name in PARSERS:
+        if builder_registry.lookup(name) is None:
+            print('{:<12} not installed'.format(name))
+            continue
+        results[name] = measure(name, html, args.count)
+
+    base = results['html.parser']
+    for name, elapsed in results.items():
+        print('{:<12} {:8.2f} ms/page  x{:.2f}'.format(name, elapsed * 1000, base / elapsed))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+'''書き換え処理のベンチマーク
+
+コメント数を増やした日記ページに対して、find_all による旧実装と
+単一走査の書き換えエンジンの処理時間を計測します
+
+usage: python -m benchmark.bench_rewrite [-n <count>] [-c <comments> ...]
+'''
+
+import argparse
+import sys
+import tempfile
+import time
+from typing import Callable
+
+from tslove.core.parser import make_soup
+from tslove.diarydump import DiaryDumpApp
+
+from benchmark.legacy import legacy_rewrite
+from benchmark.synthetic import build_diary_page
+
+
+def measure(rewrite: Callable, html: str, count: int) -> float:
+    '''1ページあたりの書き換え時間(秒)を計測します。パースの時間は含みません'''
+    elapsed = 0.0
+    for _ in range(count):
+        soup = make_soup(html)
+        start = time.perf_counter()
+        rewrite(soup)
+        elapsed += time.perf_counter() - start
+        soup.decompose()
+    return elapsed / count
+
+
+def main():
+    '''エントリポイント'''
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument('-n', '--count', help='iterations per page', metavar='<count>', type=int, default=10)
+    arg_parser.add_argument('-c', '--comments', help='number of comments', metavar='<comments>', type=int,
+                            nargs='+', default=[15, 100, 500])
+    args = arg_parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as output_path:
+        sys.argv = ['diarydump', '-o', output_path]
+        app = DiaryDumpApp()
+
+        print('{:>8} {:>12} {:>12} {:>8}'.format('comments', 'legacy', 'single-pass', 'speedup'))
+        for comments in args.comments:
+            html = build_diary_page(comments)
+            legacy = measure(lambda soup: legacy_rewrite(app, soup), html, args.count)
+            single = measure(app._rewrite_diary, html, args.count)  # pylint: disable=W0212
+            print('{:>8} {:>9.2f} ms {:>9.2f} ms {:>7.2f}x'.format(comments, legacy * 1000, single * 1000, legacy / single))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+'''書き換え処理の旧実装
+
+diarydump が find_all による複数回の走査で日記ページを書き換えていた頃の実装です
+単一走査の書き換えエンジンとの出力の同一性の確認と速度の比較に利用します
+'''
+
+import os
+import re
+
+from bs4 import BeautifulSoup  # type: ignore
+
+from tslove.diarydump import DiaryDumpApp
+
+
+def legacy_rewrite(app: DiaryDumpApp, soup: BeautifulSoup) -> None:
+    '''旧実装で日記ページを書き換えます
+
+    :param app: 画像の大きさの参照に利用するDiaryDumpApp
+    :param soup: ページ
+    '''
+    _remove_script(soup)
+    _remove_form_items(soup)
+    _fix_link(app, soup)
+
+
+def _remove_script(soup: BeautifulSoup) -> None:
+    for script_tag in soup.find_all('script'):
+        if script_tag.has_attr('src'):
+            src = script_tag['src']
+            if src.startswith('./js/prototype.js') or src.startswith('./js/Selection.js') or src == './js/comment.js':
+                script_tag.decompose()
+        else:
+            if 'url2cmd' not in script_tag.string:
+                script_tag.decompose()
+
+    for a_tag in soup.find_all('a', onclick=True):
+        a_tag.decompose()
+
+
+def _remove_form_items(soup: BeautifulSoup) -> None:
+    div_tag = soup.find('div', id='commentForm')
+    if div_tag:
+        div_tag.decompose()
+
+    for div_tag in soup.find_all('div', class_='operation'):
+        div_tag.decompose()
+
+    form_tag = soup.find('form')
+    if form_tag:
+        form_tag.unwrap()
+
+    for input_tag in soup.find_all('input'):
+        input_tag.decompose()
+
+
+def _fix_link(app: DiaryDumpApp, soup: BeautifulSoup) -> None:  # pylint: disable=R0912
+    link_tag = soup.find('link', rel='stylesheet')
+    if link_tag:
+        link_tag['href'] = './stylesheet/tslove.css'
+
+    for a_tag in soup.find_all('a', href=re.compile(r'^(\./)?\?m=pc&a=page_fh_diary_list.*')):
+        a_tag['href'] = './index.html'
+        del a_tag['rel']
+        del a_tag['target']
+
+    for a_tag in soup.find_all('a', href=re.compile(r'^(\./)?\?m=pc&a=page_fh_diary.*')):
+        result = DiaryDumpApp.DIARY_ID_PATTERN.match(a_tag['href'])
+        a_tag['href'] = './{}.html'.format(result.group('id')) if result else '#'
+        del a_tag['rel']
+        del a_tag['target']
+
+    for a_tag in soup.find_all('a', href='./'):
+        a_tag['href'] = './index.html'
+        del a_tag['rel']
+        del a_tag['target']
+
+    for a_tag in soup.find_all('a', href=re.compile(r'^(\./)?\?m=pc&a=.+')):
+        a_tag['href'] = '#'
+        del a_tag['rel']
+        del a_tag['target']
+
+    for a_tag in soup.find_all('a', href=re.compile(r'^(\./)?img.php.+')):
+        a_tag['href'] = './images/' + app._find_filename_from_src_path(a_tag['href'])  # pylint: disable=W0212
+
+    for img_tag in soup.find_all('img'):
+        path = os.path.join('./images/', app._find_filename_from_src_path(img_tag['src']))  # pylint: disable=W0212
+        if 'w=120&h=120' in img_tag['src']:
+            size = app._image_sizes.get(os.path.basename(path))  # pylint: disable=W0212
+            if size is None or size[0] == size[1]:
+                img_tag['width'] = 120
+                img_tag['height'] = 120
+            elif size[0] > size[1]:
+                img_tag['width'] = 120
+            else:
+                img_tag['height'] = 120
+        img_tag['src'] = path
+
+    for script_tag in soup.find_all('script', src=True):
+        script_tag['src'] = 'scripts/' + os.path.basename(script_tag['src'])
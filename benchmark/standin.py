@@ -0,0 +1,448 @@
+'''T's LOVE の代役サーバ
+
+TsLoveWeb が利用するエンドポイントを実装したローカルのHTTPサーバです
+実サイトにアクセスせずに diarydump のスループットや再試行の動作を確認するために利用します
+
+- do_o_login (POST), page_h_prof, page_fh_diary_list, page_fh_diary
+- xhtml_style.php, img.php, img_skin.php, ./skin/ と /img/ 以下の画像, ./js/*.js, ./cmd/*.js
+
+日記は指定した数だけ前後の日記へのリンクでつながった状態で生成します
+本文とコメントは test/diarydump/data/original-diary-page.html を元にします
+
+以下の障害を指定した割合で発生させることができます
+
+- 応答の遅延
+- エラーステータス(503)
+- 「ページが表示できませんでした」のページ
+- 長さ0の text/html の画像
+- 誤った Content-Type
+
+usage: python -m benchmark.standin [-p <port>] [-d <diaries>] [-c <comments>] ...
+'''
+
+import argparse
+import datetime
+import io
+import os
+import posixpath
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+from PIL import Image  # type: ignore
+
+from benchmark.synthetic import DATA_DIR, build_diary_page, load_diary_page
+
+USERNAME = 'user'
+PASSWORD = 'pass'
+PHP_SESSION_ID = 'standin0123456789'
+SNS_SESSION_ID = '0123456789abcdef0123456789abcdef'
+
+FIRST_DIARY_ID = 1000001
+FIRST_DATE = datetime.datetime(2020, 1, 1, 12, 0)
+LIST_PAGE_SIZE = 20
+COMMENT_PAGE_SIZE = 100
+ETAG = '"standin-1"'
+
+TEMPLATE_DIARY_ID = '2686448'
+TEMPLATE_PREV_DIARY_ID = '2685064'
+TEMPLATE_NEXT_DIARY_ID = '2686834'
+TEMPLATE_TITLE = '<p class="heading">テストの日記</p>'
+TEMPLATE_DATE = '<dt>2020年<br />07月19日<br />02:10</dt>'
+TEMPLATE_PAGER = '<div class="pagerRelative"><p class="number">1番～15番を表示</p></div>'
+PREV_LINK_PATTERN = re.compile(r'<p class="prev"><a [^>]*>≪前の日記</a></p>')
+NEXT_LINK_PATTERN = re.compile(r'<p class="next"><a [^>]*>次の日記≫</a></p>')
+
+ERROR_PAGE = '''<html>
+<head>
+<title>ページが表示できませんでした</title>
+</head>
+<body><p>ページが表示できませんでした</p></body>
+</html>
+'''
+
+NO_SUCH_DIARY_PAGE = '''<html>
+<head>
+<title>T&#039;sLOVE-女装・ニューハーフSNS</title>
+</head>
+<body><table><tr><td>該当する日記が見つかりません。</td></tr></table></body>
+</html>
+'''
+
+PROFILE_PAGE = '''<html>
+<head>
+<title>T&#039;sLOVE-女装・ニューハーフSNS</title>
+</head>
+<body><a href="./?m=pc&amp;a=do_inc_page_header_logout&amp;sessid={}">ログアウト</a></body>
+</html>
+'''.format(SNS_SESSION_ID)
+
+
+@dataclass
+class Faults:
+    '''障害の発生割合'''
+    latency: float = 0.0
+    server_error_rate: float = 0.0
+    error_page_rate: float = 0.0
+    empty_image_rate: float = 0.0
+    wrong_type_rate: float = 0.0
+    seed: Optional[int] = None
+
+
+def encode_image(size: Tuple[int, int], image_format: str) -> bytes:
+    '''単色の画像を作成します'''
+    buffer = io.BytesIO()
+    Image.new('RGB', size, (200, 120, 160)).save(buffer, image_format)
+    return buffer.getvalue()
+
+
+class StandInSite:
+    '''代役サーバが返すコンテンツと障害の発生を管理します
+
+    複数のスレッドから同時に利用できます
+    '''
+
+    def __init__(self, diaries: int = 30, comments: int = 15, long_comments: int = 0, long_every: int = 0,  # pylint: disable=R0913
+                 faults: Faults = None):
+        '''
+        :param diaries: 日記の数
+        :param comments: 日記ごとのコメント数
+        :param long_comments: long_every 件ごとの日記に付けるコメント数
+        :param long_every: コメントの多い日記の間隔。0の場合はコメントの多い日記を作りません
+        :param faults: 障害の発生割合
+        '''
+        self.__diary_ids = [str(FIRST_DIARY_ID + number) for number in range(diaries)]
+        self.__comments = comments
+        self.__long_comments = long_comments
+        self.__long_every = long_every
+        self.__faults = faults or Faults()
+        self.__random = random.Random(self.__faults.seed)
+        self.__lock = threading.Lock()
+        self.__stats: Counter = Counter()
+
+        self.__template = load_diary_page()
+        with open(os.path.join(DATA_DIR, 'original-stylesheet.css'), 'r', encoding='utf-8') as file:
+            self.__stylesheet = file.read()
+        self.__images = {
+            'jpeg': encode_image((480, 360), 'JPEG'),
+            'thumbnail': encode_image((120, 90), 'JPEG'),
+            'gif': encode_image((16, 16), 'GIF'),
+        }
+
+    @property
+    def diary_ids(self) -> List[str]:
+        '''日記IDのリスト(古い順)'''
+        return list(self.__diary_ids)
+
+    @property
+    def faults(self) -> Faults:
+        '''障害の発生割合'''
+        return self.__faults
+
+    @property
+    def stats(self) -> Counter:
+        '''エンドポイントごとのリクエスト数と発生させた障害の数'''
+        with self.__lock:
+            return Counter(self.__stats)
+
+    def count(self, name: str) -> None:
+        '''統計を記録します'''
+        with self.__lock:
+            self.__stats[name] += 1
+
+    def inject(self, rate: float, name: str) -> bool:
+        '''rate の割合で障害を発生させるか決めます'''
+        if rate <= 0:
+            return False
+        with self.__lock:
+            hit = self.__random.random() < rate
+            if hit:
+                self.__stats['fault.' + name] += 1
+        return hit
+
+    def comment_count(self, diary_id: str) -> int:
+        '''日記のコメント数'''
+        number = int(diary_id) - FIRST_DIARY_ID + 1
+        if self.__long_every and number % self.__long_every == 0:
+            return self.__long_comments
+        return self.__comments
+
+    def diary_date(self, diary_id: str) -> datetime.datetime:
+        '''日記の日時'''
+        return FIRST_DATE + datetime.timedelta(days=int(diary_id) - FIRST_DIARY_ID)
+
+    def diary_list_page(self, page: int) -> str:
+        '''日記の一覧ページ。新しい日記から順に LIST_PAGE_SIZE 件ずつ表示します'''
+        newest_first = list(reversed(self.__diary_ids))
+        items = []
+        for diary_id in newest_first[(page - 1) * LIST_PAGE_SIZE:page * LIST_PAGE_SIZE]:
+            items.append('<dt>{}</dt><dd><a href="./?m=pc&amp;a=page_fh_diary&amp;target_c_diary_id={}">'
+                         'diary {} ({})</a></dd>'.format(self.diary_date(diary_id).strftime('%m月%d日'), diary_id,
+                                                         diary_id, self.comment_count(diary_id)))
+        return ('<html>\n<head>\n<title>T&#039;sLOVE-女装・ニューハーフSNS</title>\n</head>\n'
+                '<body><dl>{}</dl></body>\n</html>\n'.format(''.join(items)))
+
+    def diary_page(self, diary_id: str, page: int) -> Optional[str]:
+        '''日記ページ。存在しない日記の場合は None
+
+        コメントは COMMENT_PAGE_SIZE 件ずつのページに分けます
+        '''
+        if diary_id not in self.__diary_ids:
+            return None
+
+        position = self.__diary_ids.index(diary_id)
+        total = self.comment_count(diary_id)
+        start = (page - 1) * COMMENT_PAGE_SIZE + 1
+        end = min(page * COMMENT_PAGE_SIZE, total)
+
+        html = self.__template
+        if position == 0:
+            html = PREV_LINK_PATTERN.sub('', html)
+        if position == len(self.__diary_ids) - 1:
+            html = NEXT_LINK_PATTERN.sub('', html)
+        html = html.replace(TEMPLATE_PREV_DIARY_ID, self.__diary_ids[position - 1] if position else '')
+        html = html.replace(TEMPLATE_NEXT_DIARY_ID, self.__diary_ids[position + 1] if position + 1 < len(self.__diary_ids) else '')
+        html = html.replace(TEMPLATE_DIARY_ID, diary_id)
+        html = html.replace(TEMPLATE_TITLE, '<p class="heading">diary {}</p>'.format(diary_id))
+        html = html.replace(TEMPLATE_DATE, self.diary_date(diary_id).strftime('<dt>%Y年<br />%m月%d日<br />%H:%M</dt>'))
+
+        if end < start:
+            return html.replace(TEMPLATE_PAGER, '<div class="pagerRelative"></div>')
+
+        html = build_diary_page(end - start + 1, html)
+        link = '<p class="{0}"><a href="./?m=pc&amp;a=page_fh_diary&amp;target_c_diary_id={1}&amp;page={2}">{3}</a></p>'
+        pager = '<p class="number">{}番～{}番を表示</p>'.format(start, end)
+        if page > 1:
+            pager = link.format('prev', diary_id, page - 1, '前を表示') + pager
+        if end < total:
+            pager += link.format('next', diary_id, page + 1, '次を表示')
+        return html.replace(TEMPLATE_PAGER, '<div class="pagerRelative">{}</div>'.format(pager))
+
+    @property
+    def stylesheet(self) -> str:
+        '''スタイルシート'''
+        return self.__stylesheet
+
+    def image(self, kind: str) -> bytes:
+        '''画像'''
+        return self.__images[kind]
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    '''代役サーバのリクエストハンドラ'''
+
+    protocol_version = 'HTTP/1.1'
+    server: 'StandInServer'
+
+    def log_message(self, format, *args):  # pylint: disable=W0622
+        '''アクセスログを出力しません'''
+
+    def __send(self, status: int, content_type: Optional[str], body: bytes = b'', headers: Dict[str, str] = None) -> None:
+        '''レスポンスを送ります'''
+        self.send_response(status)
+        if content_type is not None:
+            self.send_header('Content-Type', content_type)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if body and self.command != 'HEAD':
+            self.wfile.write(body)
+
+    def __send_page(self, html: str) -> None:
+        '''HTMLページを送ります。障害の発生対象です'''
+        site = self.server.site
+        if site.inject(site.faults.error_page_rate, 'error_page'):
+            html = ERROR_PAGE
+        content_type = 'text/html; charset=UTF-8'
+        if site.inject(site.faults.wrong_type_rate, 'wrong_type'):
+            content_type = 'text/plain'
+        self.__send(200, content_type, html.encode('utf-8'))
+
+    def __send_text(self, text: str, content_type: str) -> None:
+        '''スタイルシートやスクリプトを送ります。ETag による条件付きリクエストに対応します'''
+        site = self.server.site
+        if self.headers.get('If-None-Match') == ETAG:
+            self.__send(304, None, headers={'ETag': ETAG})
+            return
+        if site.inject(site.faults.wrong_type_rate, 'wrong_type'):
+            content_type = 'text/plain'
+        self.__send(200, content_type, text.encode('utf-8'), {'ETag': ETAG})
+
+    def __send_image(self, kind: str) -> None:
+        '''画像を送ります。ETag による条件付きリクエストに対応します。障害の発生対象です'''
+        site = self.server.site
+        if self.headers.get('If-None-Match') == ETAG:
+            self.__send(304, None, headers={'ETag': ETAG})
+            return
+        if site.inject(site.faults.empty_image_rate, 'empty_image'):
+            self.__send(200, 'text/html')
+            return
+        content_type = 'image/gif' if kind == 'gif' else 'image/jpeg'
+        if site.inject(site.faults.wrong_type_rate, 'wrong_type'):
+            content_type = 'image/png'
+        self.__send(200, content_type, site.image(kind), {'ETag': ETAG})
+
+    def __begin(self, endpoint: str) -> bool:
+        '''遅延とエラーステータスを発生させます
+
+        :return: エラーステータスを返した場合 False
+        '''
+        site = self.server.site
+        site.count(endpoint)
+        if site.faults.latency > 0:
+            time.sleep(site.faults.latency)
+        if site.inject(site.faults.server_error_rate, 'server_error'):
+            self.__send(503, 'text/html', b'Service Unavailable')
+            return False
+        return True
+
+    def do_POST(self):  # pylint: disable=C0103
+        '''ログイン'''
+        length = int(self.headers.get('Content-Length', 0))
+        form = {name: values[0] for name, values in parse_qs(self.rfile.read(length).decode('utf-8')).items()}
+        if form.get('a') != 'do_o_login':
+            self.__send(404, 'text/html')
+            return
+        if not self.__begin('do_o_login'):
+            return
+
+        if form.get('username') == USERNAME and form.get('password') == PASSWORD:
+            self.__send(302, 'text/html', headers={'Location': './', 'Set-Cookie': 'PHPSESSID={}; path=/'.format(PHP_SESSION_ID)})
+        else:
+            self.__send(302, 'text/html', headers={'Location': './?m=pc&a=page_o_login'})
+
+    def do_GET(self):  # pylint: disable=C0103
+        '''ページ、スタイルシート、画像、スクリプト'''
+        site = self.server.site
+        url = urlparse(self.path)
+        query = {name: values[0] for name, values in parse_qs(url.query).items()}
+        path = posixpath.normpath(url.path)
+
+        if path == '/' and 'a' in query:
+            action = query['a']
+            if not self.__begin(action):
+                return
+            if 'PHPSESSID={}'.format(PHP_SESSION_ID) not in self.headers.get('Cookie', ''):
+                self.__send_page(ERROR_PAGE)
+            elif action == 'page_h_prof':
+                self.__send_page(PROFILE_PAGE)
+            elif action == 'page_fh_diary_list':
+                self.__send_page(site.diary_list_page(int(query.get('page', 1))))
+            elif action == 'page_fh_diary':
+                html = site.diary_page(query.get('target_c_diary_id', ''), int(query.get('page', 1)))
+                self.__send_page(html if html is not None else NO_SUCH_DIARY_PAGE)
+            else:
+                self.__send(404, 'text/html')
+            return
+
+        if path == '/xhtml_style.php':
+            if self.__begin('xhtml_style.php'):
+                self.__send_text(site.stylesheet, 'text/css')
+        elif path == '/img.php':
+            if self.__begin('img.php'):
+                self.__send_image('thumbnail' if 'w' in query else 'jpeg')
+        elif path == '/img_skin.php':
+            if self.__begin('img_skin.php'):
+                self.__send_image('gif')
+        elif path.startswith(('/skin/', '/img/')) and path.endswith(('.gif', '.jpg')):
+            if self.__begin('static'):
+                self.__send_image('gif' if path.endswith('.gif') else 'jpeg')
+        elif path.startswith('/js/') or path.startswith('/cmd/'):
+            if self.__begin('js'):
+                self.__send_text('// {}\n'.format(path), 'text/javascript')
+        else:
+            self.__send(404, 'text/html')
+
+
+class StandInServer(ThreadingHTTPServer):
+    '''代役サーバ
+
+    start でバックグラウンドのスレッドで待ち受けを開始し、stop で終了します
+    '''
+
+    daemon_threads = True
+
+    def __init__(self, site: StandInSite, host: str = '127.0.0.1', port: int = 0):
+        '''
+        :param site: 返すコンテンツ
+        :param host: 待ち受けるアドレス
+        :param port: 待ち受けるポート。0の場合は空いているポートを利用します
+        '''
+        super().__init__((host, port), StandInHandler)
+        self.site = site
+        self.__thread: Optional[threading.Thread] = None
+
+    def handle_error(self, request, client_address):
+        '''クライアントが接続を切った場合のエラーは出力しません'''
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    @property
+    def url(self) -> str:
+        '''起点URL'''
+        host, port = self.server_address[:2]
+        return 'http://{}:{}/'.format(host, port)
+
+    def start(self) -> None:
+        '''バックグラウンドで待ち受けを開始します'''
+        self.__thread = threading.Thread(target=self.serve_forever, name='tslove-standin', daemon=True)
+        self.__thread.start()
+
+    def stop(self) -> None:
+        '''待ち受けを終了します'''
+        self.shutdown()
+        self.server_close()
+        if self.__thread is not None:
+            self.__thread.join()
+            self.__thread = None
+
+
+def main():
+    '''エントリポイント'''
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument('-p', '--port', help='port to listen. (default 8080)', metavar='<port>', type=int, default=8080)
+    arg_parser.add_argument('-d', '--diaries', help='number of diaries', metavar='<diaries>', type=int, default=30)
+    arg_parser.add_argument('-c', '--comments', help='comments per diary', metavar='<comments>', type=int, default=15)
+    arg_parser.add_argument('--long-comments', help='comments on long diaries', metavar='<n>', type=int, default=250)
+    arg_parser.add_argument('--long-every', help='make every n-th diary long. (0 for none)', metavar='<n>', type=int, default=10)
+    arg_parser.add_argument('--latency', help='delay of each response in seconds', metavar='<sec>', type=float, default=0.0)
+    arg_parser.add_argument('--server-error-rate', help='rate of 503 responses', metavar='<rate>', type=float, default=0.0)
+    arg_parser.add_argument('--error-page-rate', help='rate of error pages', metavar='<rate>', type=float, default=0.0)
+    arg_parser.add_argument('--empty-image-rate', help='rate of zero-length text/html images', metavar='<rate>', type=float, default=0.0)
+    arg_parser.add_argument('--wrong-type-rate', help='rate of wrong Content-Type', metavar='<rate>', type=float, default=0.0)
+    arg_parser.add_argument('--seed', help='random seed of faults', metavar='<seed>', type=int, default=None)
+    args = arg_parser.parse_args()
+
+    faults = Faults(latency=args.latency, server_error_rate=args.server_error_rate, error_page_rate=args.error_page_rate,
+                    empty_image_rate=args.empty_image_rate, wrong_type_rate=args.wrong_type_rate, seed=args.seed)
+    site = StandInSite(args.diaries, args.comments, args.long_comments, args.long_every, faults)
+    server = StandInServer(site, port=args.port)
+
+    print('Serving {} diaries on {} (user: {} pass: {})'.format(len(site.diary_ids), server.url, USERNAME, PASSWORD))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        for name, count in sorted(site.stats.items()):
+            print('{:<24} {}'.format(name, count))
+
+
+if __name__ == '__main__':
+    main()
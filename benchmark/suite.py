@@ -0,0 +1,213 @@
+'''ベンチマークスイート
+
+diarydump のCPU側の主な処理(パース、書き換え、HTML出力、インデックスの出力、ページ情報の読み込み)の
+処理時間を計測し、結果をJSONで保存します。保存済みの結果を基準として比較することもできます
+
+usage: python -m benchmark.suite [-n <count>] [-c <comments> ...] [-k <pattern>]
+                                 [--output <FILE>] [--baseline <FILE>] [--threshold <ratio>]
+'''
+
+import argparse
+import datetime
+import io
+import json
+import os
+import platform
+import re
+import statistics
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List, Tuple
+
+import bs4  # type: ignore
+
+from tslove.core.archive import ArchiveIndex
+from tslove.core.diary import DiaryPage
+from tslove.core.parser import html_parser, make_soup
+from tslove.core.serializer import write_html, COMPACT, COMPATIBLE
+from tslove.diarydump import DiaryDumpApp
+
+from benchmark.synthetic import build_diary_page
+
+INDEX_ENTRIES = 10000
+DEFAULT_THRESHOLD = 1.10
+
+Run = Callable[[], None]
+Setup = Callable[[], Run]
+
+
+def diary_page_cases(app: DiaryDumpApp, comments: int) -> List[Tuple[str, Setup]]:
+    '''日記ページ1件に対する処理のケース'''
+    html = build_diary_page(comments)
+
+    def parse() -> Run:
+        def run() -> None:
+            page = DiaryPage()
+            page.append(html)
+            page.release()
+        return run
+
+    def rewrite() -> Run:
+        soup = make_soup(html)
+        return lambda: app._rewrite_diary(soup)  # pylint: disable=W0212
+
+    def output(mode: str) -> Setup:
+        def setup() -> Run:
+            soup = make_soup(html)
+            app._rewrite_diary(soup)  # pylint: disable=W0212
+            if mode == 'prettify':
+                return lambda: soup.prettify(formatter='html')
+            return lambda: write_html(soup, io.StringIO(), mode)
+        return setup
+
+    return [('parse/{}'.format(comments), parse),
+            ('rewrite/{}'.format(comments), rewrite),
+            ('output.prettify/{}'.format(comments), output('prettify')),
+            ('output.{}/{}'.format(COMPATIBLE, comments), output(COMPATIBLE)),
+            ('output.{}/{}'.format(COMPACT, comments), output(COMPACT))]
+
+
+def make_page_infos(count: int) -> List[dict]:
+    '''1日1件の日記のページ情報を作成します'''
+    start = datetime.datetime(2000, 1, 1, 12, 0)
+    return [{'diary_id': str(1000000 + number),
+             'title': 'diary {}'.format(number),
+             'date': start + datetime.timedelta(days=number),
+             'prev_diary_id': str(1000000 + number - 1) if number else None,
+             'fingerprint': None}
+            for number in range(count)]
+
+
+def archive_cases(app: DiaryDumpApp, output_path: str) -> List[Tuple[str, Setup]]:
+    '''インデックスの出力とページ情報の読み込みのケース'''
+    page_infos = make_page_infos(INDEX_ENTRIES)
+    archive_file_name = os.path.join(output_path, 'bench-archive.sqlite3')
+    with ArchiveIndex(archive_file_name) as archive:
+        archive.put_many(page_infos)
+
+    app._archive = ArchiveIndex(archive_file_name)  # pylint: disable=W0212
+    all_months = {(page_info['date'].year, page_info['date'].month) for page_info in page_infos}
+    last_month = max(all_months)
+
+    diary_file_name = os.path.join(output_path, 'bench-diary.html')
+    soup = make_soup(build_diary_page(15))
+    app._rewrite_diary(soup)  # pylint: disable=W0212
+    app._embed_page_info(soup, page_infos[-1])  # pylint: disable=W0212
+    with open(diary_file_name, 'w', encoding='utf-8') as file:
+        write_html(soup, file)
+
+    def output_index(months: set) -> Setup:
+        return lambda: lambda: app._output_index(months)  # pylint: disable=W0212
+
+    def load_archive() -> Run:
+        def run() -> None:
+            with ArchiveIndex(archive_file_name) as archive:
+                for _ in archive.iterate(reverse=True):
+                    pass
+        return run
+
+    def lookup_archive() -> Run:
+        archive = app._archive  # pylint: disable=W0212
+
+        def run() -> None:
+            for page_info in page_infos:
+                archive.get(page_info['diary_id'])
+        return run
+
+    return [('index.full/{}'.format(INDEX_ENTRIES), output_index(all_months)),
+            ('index.incremental/{}'.format(INDEX_ENTRIES), output_index({last_month})),
+            ('page_info.archive_load/{}'.format(INDEX_ENTRIES), load_archive),
+            ('page_info.archive_get/{}'.format(INDEX_ENTRIES), lookup_archive),
+            ('page_info.embedded', lambda: lambda: app._read_embedded_page_info(diary_file_name))]  # pylint: disable=W0212
+
+
+def measure(setup: Setup, count: int) -> Dict[str, float]:
+    '''ケースを count 回実行して処理時間(ミリ秒)を集計します。setup の時間は含みません'''
+    times = []
+    for _ in range(count):
+        run = setup()
+        start = time.perf_counter()
+        run()
+        times.append((time.perf_counter() - start) * 1000)
+    return {'median_ms': statistics.median(times), 'min_ms': min(times), 'runs': count}
+
+
+def compare(results: Dict[str, dict], baseline: Dict[str, dict], threshold: float) -> int:
+    '''基準の結果と比較して表示します
+
+    :return: 基準より threshold 倍を超えて遅くなったケースの数
+    '''
+    regressions = 0
+    print('\n{:<32} {:>12} {:>12} {:>8}'.format('case', 'baseline', 'current', 'ratio'))
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        ratio = result['median_ms'] / baseline[name]['median_ms']
+        mark = ''
+        if ratio > threshold:
+            mark = ' slower'
+            regressions += 1
+        elif ratio < 1 / threshold:
+            mark = ' faster'
+        print('{:<32} {:>9.2f} ms {:>9.2f} ms {:>7.2f}x{}'.format(name, baseline[name]['median_ms'],
+                                                                  result['median_ms'], ratio, mark))
+    return regressions
+
+
+def main():
+    '''エントリポイント'''
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument('-n', '--count', help='iterations per case', metavar='<count>', type=int, default=5)
+    arg_parser.add_argument('-c', '--comments', help='number of comments', metavar='<comments>', type=int,
+                            nargs='+', default=[15, 100, 500])
+    arg_parser.add_argument('-k', '--filter', help='run only cases matching the pattern', metavar='<pattern>', default=None)
+    arg_parser.add_argument('--output', help='save results as JSON', metavar='<FILE>', default=None)
+    arg_parser.add_argument('--baseline', help='compare with saved results', metavar='<FILE>', default=None)
+    arg_parser.add_argument('--threshold', help='ratio to report as regression. (default {})'.format(DEFAULT_THRESHOLD),
+                            metavar='<ratio>', type=float, default=DEFAULT_THRESHOLD)
+    args = arg_parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as output_path:
+        sys.argv = ['diarydump', '-o', output_path]
+        app = DiaryDumpApp()
+        app._prepare_directories()  # pylint: disable=W0212
+
+        cases = []
+        for comments in args.comments:
+            cases.extend(diary_page_cases(app, comments))
+        cases.extend(archive_cases(app, output_path))
+
+        results = {}
+        for name, setup in cases:
+            if args.filter and not re.search(args.filter, name):
+                continue
+            results[name] = measure(setup, args.count)
+            print('{:<32} {:>9.2f} ms (min {:.2f} ms)'.format(name, results[name]['median_ms'], results[name]['min_ms']))
+
+        app._close_archive()  # pylint: disable=W0212
+
+    report = {
+        'environment': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'beautifulsoup4': bs4.__version__,
+            'html_parser': html_parser(),
+            'date': datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        },
+        'results': results
+    }
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump(report, file, ensure_ascii=False, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as file:
+            baseline = json.load(file)
+        if compare(results, baseline['results'], args.threshold):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+'''合成データ
+
+test/diarydump/data/original-diary-page.html を元に、コメントと画像の数を増やした
+日記ページを生成します
+'''
+
+import os
+import re
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'test', 'diarydump', 'data')
+
+COMMENT_LIST_MARKER = 'id="commentList"'
+COMMENT_PATTERN = re.compile(r'<dl>\n<dt>.*?</dl>\n', re.DOTALL)
+COMMENT_ID_PATTERN = re.compile(r'(value=|dc_)(?P<id>[0-9]{8})')
+
+
+def load_diary_page() -> str:
+    '''元になる日記ページを読み込みます'''
+    with open(os.path.join(DATA_DIR, 'original-diary-page.html'), 'r', encoding='utf-8') as file:
+        return file.read()
+
+
+def build_diary_page(comments: int, html: str = None) -> str:
+    '''コメント数を指定して日記ページを生成します
+
+    元のページのコメントを繰り返して comments 件のコメントを持つページを作成します
+    コメントのIDと添付画像のファイル名は重複しないように振り直します
+
+    :param comments: コメント数
+    :param html: 元になるページ。省略した場合はテストデータを利用します
+    :return: 日記ページ
+    '''
+    if html is None:
+        html = load_diary_page()
+
+    comment_list = html.index(COMMENT_LIST_MARKER)  # 日記の本文も同じ形の dl なのでコメント欄から探す
+    blocks = COMMENT_PATTERN.findall(html, comment_list)
+    start = html.index(blocks[0], comment_list)
+    end = html.index(blocks[-1], start) + len(blocks[-1])
+
+    generated = []
+    for number in range(comments):
+        block = blocks[number % len(blocks)]
+        offset = (number // len(blocks)) * 1000000
+
+        def renumber(result, offset=offset):
+            return '{}{:08d}'.format(result.group(1), (int(result.group('id')) + offset) % 100000000)
+
+        generated.append(COMMENT_ID_PATTERN.sub(renumber, block) if offset else block)
+
+    return html[:start] + ''.join(generated) + html[end:]
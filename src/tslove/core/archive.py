@@ -0,0 +1,198 @@
+'''アーカイブ索引モジュール
+
+ダンプした日記のページ情報を SQLite に保存します
+
+ページ情報は以下のキーを持つ辞書です
+
+- diary_id: 日記ID (文字列)
+- title: タイトル
+- date: 日時 (datetime)
+- prev_diary_id: 前の日記のID (文字列) もしくは None
+- fingerprint: 日記の一覧ページから求めた変更検出用の値 もしくは None (省略可)
+'''
+
+import datetime
+import json
+import os
+import sqlite3
+from typing import Iterator, List, Optional, Tuple
+
+from tslove.core.journal import Journal
+
+DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+COLUMNS = 'diary_id, title, date, prev_diary_id, fingerprint'
+INSERT = 'INSERT OR REPLACE INTO diary ({}) VALUES (?, ?, ?, ?, ?)'.format(COLUMNS)
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS diary (
+    diary_id INTEGER PRIMARY KEY,
+    title TEXT NOT NULL,
+    date TEXT NOT NULL,
+    prev_diary_id INTEGER,
+    fingerprint TEXT
+);
+CREATE INDEX IF NOT EXISTS diary_date ON diary (date);
+'''
+
+
+def _convert_datetime(dct: dict) -> dict:
+    '''JSONから読み込んだページ情報の日付を datetime へ変換します'''
+    if 'date' in dct:
+        dct['date'] = datetime.datetime.strptime(dct['date'], DATE_FORMAT)
+    return dct
+
+
+class ArchiveIndex:
+    '''ページ情報の索引
+
+    ページ情報は put するたびにコミットされるため、異常終了しても登録済みの情報は失われません
+    作成したスレッドからのみ利用できます
+    '''
+
+    def __init__(self, file_name: str):
+        '''
+        :param file_name: データベースファイル名。':memory:' も指定できます
+        :raises sqlite3.Error: データベースを開けない場合
+        '''
+        self.__connection = sqlite3.connect(file_name)
+        self.__connection.execute('PRAGMA journal_mode=WAL')
+        self.__connection.execute('PRAGMA synchronous=NORMAL')
+        self.__connection.executescript(SCHEMA)
+        self.__upgrade()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self) -> int:
+        return self.__connection.execute('SELECT COUNT(*) FROM diary').fetchone()[0]
+
+    def __contains__(self, diary_id: object) -> bool:
+        row = self.__connection.execute('SELECT 1 FROM diary WHERE diary_id = ?', (int(str(diary_id)),)).fetchone()
+        return row is not None
+
+    def __upgrade(self) -> None:
+        '''以前のバージョンで作成したテーブルに不足している列を追加します'''
+        columns = {row[1] for row in self.__connection.execute('PRAGMA table_info(diary)')}
+        if 'fingerprint' not in columns:
+            with self.__connection:
+                self.__connection.execute('ALTER TABLE diary ADD COLUMN fingerprint TEXT')
+
+    def close(self) -> None:
+        '''データベースを閉じます'''
+        self.__connection.close()
+
+    @staticmethod
+    def __to_page_info(row: tuple) -> dict:
+        '''行をページ情報へ変換します'''
+        diary_id, title, date, prev_diary_id, fingerprint = row
+        return {
+            'title': title,
+            'date': datetime.datetime.strptime(date, DATE_FORMAT),
+            'prev_diary_id': str(prev_diary_id) if prev_diary_id is not None else None,
+            'diary_id': str(diary_id),
+            'fingerprint': fingerprint
+        }
+
+    @staticmethod
+    def __to_row(page_info: dict) -> tuple:
+        '''ページ情報を行へ変換します'''
+        prev_diary_id = page_info['prev_diary_id']
+        return (int(page_info['diary_id']),
+                page_info['title'],
+                page_info['date'].strftime(DATE_FORMAT),
+                int(prev_diary_id) if prev_diary_id is not None else None,
+                page_info.get('fingerprint'))
+
+    def get(self, diary_id: str) -> Optional[dict]:
+        '''ページ情報を取得します
+
+        :param diary_id: 日記ID
+        :return: ページ情報。登録されていない場合は None
+        '''
+        row = self.__connection.execute('SELECT {} FROM diary WHERE diary_id = ?'.format(COLUMNS),
+                                        (int(diary_id),)).fetchone()
+        return self.__to_page_info(row) if row else None
+
+    def put(self, page_info: dict) -> None:
+        '''ページ情報を登録します。登録済みの場合は置き換えます
+
+        :param page_info: ページ情報
+        '''
+        with self.__connection:
+            self.__connection.execute(INSERT, self.__to_row(page_info))
+
+    def put_many(self, page_infos) -> None:
+        '''複数のページ情報を一つのトランザクションで登録します
+
+        :param page_infos: ページ情報のイテラブル
+        '''
+        with self.__connection:
+            self.__connection.executemany(INSERT, (self.__to_row(page_info) for page_info in page_infos))
+
+    def iterate(self, reverse: bool = False) -> Iterator[dict]:
+        '''ページ情報を日記IDの順に返します
+
+        :param reverse: 日記IDの降順にする場合 True
+        :return: ページ情報のイテレータ
+        '''
+        order = 'DESC' if reverse else 'ASC'
+        cursor = self.__connection.execute('SELECT {} FROM diary ORDER BY diary_id {}'.format(COLUMNS, order))
+        for row in cursor:
+            yield self.__to_page_info(row)
+
+    def months(self) -> List[Tuple[int, int, int]]:
+        '''日記のある年月と日記の数を新しい順に返します
+
+        :return: (年, 月, 日記の数) のリスト
+        '''
+        cursor = self.__connection.execute('SELECT substr(date, 1, 7) AS month, COUNT(*) FROM diary '
+                                           'GROUP BY month ORDER BY month DESC')
+        return [(int(month[:4]), int(month[5:7]), count) for month, count in cursor]
+
+    def iterate_month(self, year: int, month: int, reverse: bool = False) -> Iterator[dict]:
+        '''指定した年月の日記のページ情報を日記IDの順に返します
+
+        :param year: 年
+        :param month: 月
+        :param reverse: 日記IDの降順にする場合 True
+        :return: ページ情報のイテレータ
+        '''
+        start = '{:04d}-{:02d}'.format(year, month)
+        end = '{:04d}-{:02d}'.format(year + 1, 1) if month == 12 else '{:04d}-{:02d}'.format(year, month + 1)
+        order = 'DESC' if reverse else 'ASC'
+        cursor = self.__connection.execute('SELECT {} FROM diary WHERE date >= ? AND date < ? ORDER BY diary_id {}'
+                                           .format(COLUMNS, order), (start, end))
+        for row in cursor:
+            yield self.__to_page_info(row)
+
+    def migrate_json(self, json_file_name: str, journal_file_name: Optional[str] = None) -> int:
+        '''ページ情報ファイル(page_info.json)とそのジャーナルの内容を取り込みます
+
+        取り込んだファイルは拡張子 .migrated を付けて退避します
+
+        :param json_file_name: ページ情報ファイル名
+        :param journal_file_name: ジャーナルファイル名
+        :return: 取り込んだページ情報の数
+        :raises OSError: ファイルの読み込みに失敗した場合
+        :raises ValueError: ページ情報ファイルの内容が不正な場合
+        '''
+        page_info: dict = {}
+        if os.path.exists(json_file_name):
+            with open(json_file_name, 'r', encoding='utf-8') as file:
+                page_info = json.load(file, object_hook=_convert_datetime)
+
+        if journal_file_name is not None:
+            for record in Journal(journal_file_name, object_hook=_convert_datetime).replay():
+                page_info[record['id']] = record['page_info']
+
+        self.put_many(page_info.values())
+
+        for file_name in (json_file_name, journal_file_name):
+            if file_name is not None and os.path.exists(file_name):
+                os.replace(file_name, file_name + '.migrated')
+
+        return len(page_info)
@@ -0,0 +1,361 @@
+'''非同期Webモジュール
+
+T'sLove へのログインとコンテンツの取得を asyncio で行う
+
+aiohttp が必要です (pip install tslove-tools[async])
+'''
+
+import asyncio
+import io
+import os
+from typing import Any, Awaitable, Callable, Optional
+
+import requests
+from PIL import Image  # type: ignore
+
+from tslove.core.imageinfo import SNIFF_SIZE, is_consistent
+from tslove.core.retry import RetryPolicy
+from tslove.core.web import (DOWNLOAD_CHUNK_SIZE, USER_AGENT, default_retry_policy, find_sns_session_id,
+                             is_valid_page)
+
+try:
+    import aiohttp
+    from yarl import URL
+except ImportError:  # pragma: no cover
+    aiohttp = None
+
+DEFAULT_CONCURRENCY = 4
+
+_RETRY = object()
+
+
+def _as_requests_error(err: BaseException) -> requests.RequestException:
+    '''aiohttp の例外を、再試行の方針で分類できるように requests の対応する例外へ置き換えます
+
+    タイムアウトと接続の失敗、レスポンスボディの読み出し中の切断は TsLoveWeb と同じく再試行の対象になります
+
+    :param err: aiohttp の例外もしくは asyncio.TimeoutError
+    :return: 対応する requests の例外
+    '''
+    if isinstance(err, asyncio.TimeoutError):
+        mapped: requests.RequestException = requests.Timeout(str(err))
+    elif isinstance(err, aiohttp.ClientPayloadError):
+        mapped = requests.exceptions.ChunkedEncodingError(str(err))
+    elif isinstance(err, aiohttp.ClientConnectionError):
+        mapped = requests.ConnectionError(str(err))
+    else:
+        mapped = requests.RequestException(str(err))
+    mapped.__cause__ = err
+    return mapped
+
+
+class AsyncTsLoveWeb:
+    '''T'sLove 非同期webアクセスクラス
+
+    TsLoveWeb と同じ Content-Type の検証を行い、同じ再試行の方針(RetryPolicy)に従って再試行します
+    再試行の回数は取得処理ごとに数えるため、複数の取得処理を並行して実行できます
+
+    async with AsyncTsLoveWeb() as web: の形で利用します
+    '''
+
+    def __init__(self, url: str = 'https://tslove.net/', concurrency: int = DEFAULT_CONCURRENCY,
+                 retry_policy: Optional[RetryPolicy] = None):
+        '''
+        :param url: T'sLove の起点URL
+        :param concurrency: 同時に発行するリクエスト数の上限
+        :param retry_policy: 再試行の方針。省略した場合は web.RETRY_COUNT, web.RETRY_INTERVAL に従います
+        :raises ImportError: aiohttp がインストールされていない場合
+        '''
+        if aiohttp is None:
+            raise ImportError('AsyncTsLoveWeb requires aiohttp. (pip install tslove-tools[async])')
+        if concurrency < 1:
+            raise ValueError('concurrency must be positive.')
+
+        self.__url = url
+        self.__concurrency = concurrency
+        self.__session: Optional[aiohttp.ClientSession] = None
+        self.__semaphore: Optional[asyncio.Semaphore] = None
+        self.__php_session_id: Optional[str] = None
+        self.__sns_session_id: Optional[str] = None
+        self.__retry_policy = retry_policy if retry_policy is not None else default_retry_policy()
+        self.__total_retries = 0
+
+    async def __aenter__(self):
+        await self.open()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def open(self) -> None:
+        '''コネクションプールを用意します'''
+        if self.__session is not None:
+            return
+
+        connector = aiohttp.TCPConnector(limit=self.__concurrency, ssl=False)
+        timeout = aiohttp.ClientTimeout(sock_connect=15, sock_read=15)
+        self.__session = aiohttp.ClientSession(connector=connector, timeout=timeout,
+                                               cookie_jar=aiohttp.CookieJar(unsafe=True),
+                                               headers={'User-Agent': USER_AGENT})
+        self.__semaphore = asyncio.Semaphore(self.__concurrency)
+
+    async def close(self) -> None:
+        '''コネクションプールを閉じます'''
+        if self.__session is not None:
+            await self.__session.close()
+            self.__session = None
+
+    @property
+    def url(self) -> str:
+        '''T'sLove の起点URL'''
+        return self.__url
+
+    @property
+    def retry_policy(self) -> RetryPolicy:
+        '''再試行の方針'''
+        return self.__retry_policy
+
+    @property
+    def php_session_id(self) -> Optional[str]:
+        '''PHPSESSID'''
+        return self.__php_session_id
+
+    @property
+    def sns_session_id(self) -> Optional[str]:
+        '''sns_session_id'''
+        return self.__sns_session_id
+
+    @property
+    def total_retries(self) -> int:
+        '''total_retries'''
+        return self.__total_retries
+
+    async def __request(self, method: str, path: str, reader: Callable[[Any], Awaitable[Any]],
+                        params: dict = None, data: dict = None) -> Any:
+        '''T'sLoveへリクエストを発行してレスポンスを読み出します
+
+        self.retry_policy の方針に従って再試行を行います
+        レスポンスが正常でない場合、reader が _RETRY を返した場合、aiohttpの処理に失敗した場合に再試行します
+        再試行の対象でないステータスや例外の場合は再試行せずに例外を送出します
+        Retry-After ヘッダがある場合はその時間以上待機します
+
+        :param method: GET もしくは POST
+        :param path: url path
+        :param reader: レスポンスを読み出す関数
+        :param params: クエリパラメータ
+        :param data: POSTデータ
+        :returns: reader の戻り値
+        :raises RecuestError: aiohttpの処理に失敗し、再試行の対象でない場合
+        :raises UnexpectedStatusError: 再試行の対象でないステータスを受け取った場合
+        :raises RetryCountExceededError: リトライ回数が基準を超過した場合
+        :raises RetryBudgetExceededError: 再試行の予算を使い切った場合
+        '''
+        assert self.__session is not None and self.__semaphore is not None, 'call open() first.'
+
+        url = self.__url + path if path else self.__url
+        retry = self.__retry_policy.start()
+
+        while True:
+            if retry.retries != 0:
+                print(self.__message(method, path, params or data, retry.delay))
+                await asyncio.sleep(retry.delay)
+                self.__total_retries += 1
+
+            try:
+                async with self.__semaphore:
+                    async with self.__session.request(method, url, params=params, data=data,
+                                                      allow_redirects=False) as response:
+                        if not response.ok:
+                            retry.failed(status=response.status, retry_after=response.headers.get('Retry-After'))
+                            continue
+                        result = await reader(response)
+                        if result is not _RETRY:
+                            return result
+            except (aiohttp.ClientError, asyncio.TimeoutError) as err:
+                retry.failed(error=_as_requests_error(err))
+                continue
+
+            retry.failed()
+
+    @staticmethod
+    def __message(method: str, path: str, params: Optional[dict], interval: float) -> str:
+        '''リトライメッセージを生成します'''
+        msg = 'Retry {}'.format(method)
+        msg += ' path:{}'.format(path) if path else ''
+        if params:
+            msg += ' action:{}'.format(params['a']) if 'a' in params else ''
+            msg += ' file:{}'.format(params['filename']) if 'filename' in params else ''
+        msg += ' after {:.1f} sec.'.format(interval)
+        return msg
+
+    async def login(self, username: Optional[str], password: Optional[str], php_session_id: Optional[str] = None) -> bool:
+        '''T'sLoveへのログインをおこないます
+
+        TsLoveWeb.login と同じ手順でログインします
+
+        :param username: ユーザ名(メールアドレス)
+        :param password: パスワード
+        :param php_session_id: PHPSESSID
+        :return: sns_session_idを取得できた場合 True
+        :raises RecuestError: aiohttpの処理に失敗した場合
+        :raises RetryCountExceededError: リトライ回数が基準を超過した場合
+        '''
+        assert self.__session is not None, 'call open() first.'
+
+        if php_session_id is None:
+            if username and password:
+                self.__php_session_id = await self.__get_php_session_id(username, password)
+            else:
+                return False
+        else:
+            self.__php_session_id = php_session_id
+            self.__session.cookie_jar.update_cookies({'PHPSESSID': php_session_id}, URL(self.__url))
+
+        if self.__php_session_id is None:
+            return False
+
+        params = {'m': 'pc',
+                  'a': 'page_h_prof',
+                  }
+        self.__sns_session_id = find_sns_session_id(await self.get_page(params))
+        return self.__sns_session_id is not None
+
+    async def __get_php_session_id(self, username: str, password: str) -> Optional[str]:
+        '''PHPSESSIDを取得します
+
+        :param username: ユーザ名
+        :param password: パスワード
+        :return: PHPSESSID もしくは None
+        '''
+        payload = {'username': username,
+                   'password': password,
+                   'm': 'pc',
+                   'a': 'do_o_login',
+                   'login_params': '',
+                   'is_save': '1',
+                   }
+
+        async def reader(response):
+            if 'PHPSESSID' in response.cookies:
+                return response.cookies['PHPSESSID'].value
+            if response.status == 302:  # 認証失敗
+                return None
+            return _RETRY
+
+        return await self.__request('POST', '', reader, data=payload)
+
+    async def get_page(self, params: dict) -> str:
+        '''ページを取得します
+
+        :param params: クエリパラメータ
+        :return: ページの内容
+        :raises RecuestError: aiohttpの処理に失敗した場合
+        :raises RetryCountExceededError: リトライ回数が基準を超過した場合
+        '''
+        async def reader(response):
+            if not response.headers.get('Content-Type', '').startswith('text/html'):
+                return _RETRY
+            text = await response.text()
+            return text if is_valid_page(text) else _RETRY
+
+        return await self.__request('GET', '', reader, params=params)
+
+    async def get_stylesheet(self) -> str:
+        '''スタイルシートを取得します
+
+        :return: スタイルシートの内容
+        :raises RecuestError: aiohttpの処理に失敗した場合
+        :raises RetryCountExceededError: リトライ回数が基準を超過した場合
+        '''
+        async def reader(response):
+            if response.headers.get('Content-Type', '').startswith('text/css'):
+                return await response.text()
+            return _RETRY
+
+        return await self.__request('GET', 'xhtml_style.php', reader)
+
+    async def get_image(self, path: str, params: dict = None) -> Image:
+        '''画像を取得します
+
+        画像が不正(Content-Type が text/html かつContent-Length 0)なものについては
+        ダミーのイメージを生成して返却します
+
+        :param path: url path
+        :param params: クエリパラメータ
+        :return: PIL Image オブジェクト
+        :raises RequestError: aiohttpの処理に失敗した場合
+        :raises RetryCountExceededError: リトライ回数が基準を超過した場合
+        '''
+        async def reader(response):
+            content_type = response.headers.get('Content-Type', '')
+            if content_type.startswith('image/'):
+                return Image.open(io.BytesIO(await response.read()))
+            if content_type.startswith('text/html') and response.headers.get('Content-Length') == '0':
+                return Image.new("1", (1, 1), 1)
+            return _RETRY
+
+        return await self.__request('GET', path, reader, params=params)
+
+    async def download_image(self, path: str, file_name: str, params: dict = None) -> None:
+        '''画像を取得してファイルへ保存します
+
+        TsLoveWeb.download_image と同じくレスポンスボディをデコードせずに保存します
+
+        :param path: url path
+        :param file_name: 保存先のファイル名
+        :param params: クエリパラメータ
+        :raises RequestError: aiohttpの処理に失敗した場合
+        :raises RetryCountExceededError: リトライ回数が基準を超過した場合
+        :raises OSError: ファイルの書き込みに失敗した場合
+        '''
+        async def reader(response):
+            content_type = response.headers.get('Content-Type', '')
+            if content_type.startswith('image/'):
+                return True if await self.__save_response_body(response, content_type, file_name) else _RETRY
+            if content_type.startswith('text/html') and response.headers.get('Content-Length') == '0':
+                Image.new("1", (1, 1), 1).save(file_name)
+                return True
+            return _RETRY
+
+        await self.__request('GET', path, reader, params=params)
+
+    @staticmethod
+    async def __save_response_body(response, content_type: str, file_name: str) -> bool:
+        '''レスポンスボディを一時ファイル経由でファイルへ保存します
+
+        :return: 保存した場合 True, 先頭のバイト列が Content-Type と矛盾した場合 False
+        '''
+        head = await response.content.read(SNIFF_SIZE)
+        while len(head) < SNIFF_SIZE and not response.content.at_eof():
+            head += await response.content.read(SNIFF_SIZE - len(head))
+
+        if not is_consistent(content_type, head):
+            return False
+
+        temp_file_name = file_name + '.part'
+        try:
+            with open(temp_file_name, 'wb') as file:
+                file.write(head)
+                async for chunk in response.content.iter_chunked(DOWNLOAD_CHUNK_SIZE):
+                    file.write(chunk)
+            os.replace(temp_file_name, file_name)
+        finally:
+            if os.path.exists(temp_file_name):
+                os.remove(temp_file_name)
+
+        return True
+
+    async def get_javascript(self, path: str) -> str:
+        '''JavaScriptを取得します
+
+        :param path: url path
+        :return: JavaScriptファイルの内容
+        :raises RequestError: aiohttpの処理に失敗した場合
+        :raises RetryCountExceededError: リトライ回数が基準を超過した場合
+        '''
+        async def reader(response):
+            if response.headers.get('Content-Type', '').startswith('text/javascript'):
+                return await response.text()
+            return _RETRY
+
+        return await self.__request('GET', path, reader)
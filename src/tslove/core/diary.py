@@ -3,7 +3,9 @@
 日記ページと日記に関連する機能を扱います
 '''
 
+import copy
 import re
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from typing import Optional, TypedDict
 
@@ -12,6 +14,12 @@ from bs4 import BeautifulSoup  # type: ignore
 from tslove.core.web import TsLoveWeb
 from tslove.core.page import Page
 from tslove.core.exception import NoSuchDiaryError
+from tslove.core.profiler import profiler, FETCH
+
+COMMENT_PAGE_SIZE = 100
+COMMENT_PAGE_WORKERS = 3
+COMMENT_NUMBER_PATTERN = re.compile(r'(?P<start>[0-9]+)番～(?P<end>[0-9]+)番を表示')
+NO_SUCH_DIARY_PATTERN = re.compile(r'<td>該当する日記が見つかりません。</td>')
 
 
 class DiaryRegexPatterns(TypedDict):
@@ -23,34 +31,75 @@ class DiaryPage(Page):
     '''日記ページの取得と操作を提供します'''
 
     @classmethod
-    def fetch_from_web(cls, *args, **kwargs):
+    def fetch_from_web(cls, web: TsLoveWeb, *args, **kwargs):
         '''webから日記ページを取得します
 
+        コメントが COMMENT_PAGE_SIZE 件を超える場合は2ページ目以降も取得して追加します
+        2ページ目以降は kwargs['workers'] ページずつ並行して取得し、
+        コメントの番号が続かないページに到達した時点で終了します
+
+        :param web: ページの取得に利用するセッション
         :param args: args[0] diary_id
+        :param kwargs: kwargs['workers'] コメントのページを並行して取得する数
+        '''
+        diary_id = args[0]
+        workers = kwargs.get('workers', COMMENT_PAGE_WORKERS)
+
+        page = DiaryPage()
+        page.append(cls.__fetch_html(web, diary_id, 1))
+        if not page.has_next_comments:
+            return page
+
+        fetch_html = profiler().bind(lambda number: cls.__fetch_html(web, diary_id, number), FETCH)
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='tslove-comment') as executor:
+            next_page = 2
+            while page.has_next_comments:
+                numbers = range(next_page, next_page + workers)
+                for html in executor.map(fetch_html, numbers):
+                    result = COMMENT_NUMBER_PATTERN.search(html)
+                    if result is None or int(result.group('start')) != page.comment_count + 1:
+                        return page
+                    page.append(html)
+                    if not page.has_next_comments:
+                        return page
+                next_page += workers
+
+        return page
+
+    @staticmethod
+    def __fetch_html(web: TsLoveWeb, diary_id: str, page_number: int) -> str:
+        '''日記ページのHTMLを取得します
+
+        :param web: ページの取得に利用するセッション
+        :param diary_id: diary_id
+        :param page_number: コメントのページ番号(1から)
+        :return: HTML
+        :raises NoSuchDiaryError: 日記が存在しない場合
         '''
         param = {
             'm': 'pc',
             'a': 'page_fh_diary',
-            'target_c_diary_id': args[0],
+            'target_c_diary_id': diary_id,
             'order': 'asc',
-            'page_size': 100
+            'page_size': COMMENT_PAGE_SIZE
         }
-        web = TsLoveWeb.get_instance()
+        if page_number > 1:
+            param['page'] = page_number
+
         html = web.get_page(param)
 
-        error_pattern = re.compile(r'<td>該当する日記が見つかりません。</td>')
-        if error_pattern.search(html):
+        if NO_SUCH_DIARY_PATTERN.search(html):
             raise NoSuchDiaryError
 
-        page = DiaryPage()
-        page.append(html)
-        return page
+        return html
 
     def __init__(self, re_pattern: Optional[DiaryRegexPatterns] = None):
         super().__init__()
         self.__title: str = ''
         self.__date: Optional[datetime] = None
         self.__prev_diary_id: Optional[str] = None
+        self.__comment_count = 0
+        self.__has_next_comments = False
         self.__re_pattern: DiaryRegexPatterns = {
             'prev_diary_id': re.compile(r'target_c_diary_id=(?P<id>[0-9]+)')
         }
@@ -73,12 +122,53 @@ class DiaryPage(Page):
         '''一つ前の日記のdiary_id'''
         return self.__prev_diary_id
 
+    @property
+    def comment_count(self) -> int:
+        '''追加済みのページに含まれるコメントの最後の番号'''
+        return self.__comment_count
+
+    @property
+    def has_next_comments(self) -> bool:
+        '''最後に追加したページにコメントの続きのページへのリンクがある場合 True'''
+        return self.__has_next_comments
+
+    def detach_merged_soup(self) -> BeautifulSoup:
+        '''すべてのページのコメントを1ページ目にまとめたツリーを取り出します
+
+        2ページ目以降のツリーは解放され、コメントのページ送りのリンクは取り除かれます
+
+        :return: パース済みのツリー
+        :raises ValueError: ツリーが既に取り出されているか解放されている場合
+        '''
+        soup = self.detach_soup(0)
+        if len(self) == 1:
+            return soup
+
+        comment_div_tag = soup.find('div', id='commentList')
+        last_dl_tag = comment_div_tag.dl.parent.find_all('dl', recursive=False)[-1]
+        for key in range(1, len(self)):
+            other_soup = self.detach_soup(key)
+            other_dl_tag = other_soup.find('div', id='commentList').dl
+            for dl_tag in other_dl_tag.parent.find_all('dl', recursive=False):  # コメント1件ごとのdlタグ
+                last_dl_tag.insert_after(dl_tag.extract())
+                last_dl_tag = dl_tag
+            other_soup.decompose()
+
+        for pager_div_tag in comment_div_tag.find_all('div', class_='pagerRelative'):
+            for p_tag in pager_div_tag.find_all('p', class_=['prev', 'next']):
+                p_tag.decompose()
+            number_p_tag = pager_div_tag.find('p', class_='number')
+            if number_p_tag:
+                number_p_tag.string = '1番～{}番を表示'.format(self.__comment_count)
+
+        return soup
+
     def _parse(self, soup: BeautifulSoup):
         '''日記ページをパースしてプロパティをセットします'''
         super()._parse(soup)
 
         if not self.__title:
-            title_p_tag = soup.find('p', class_='heading')
+            title_p_tag = copy.copy(soup.find('p', class_='heading'))
             for img_tag in title_p_tag.find_all('img'):
                 alt_string = img_tag['alt']
                 img_tag.replace_with('({})'.format(alt_string))
@@ -98,3 +188,13 @@ class DiaryPage(Page):
                     result = pattern.search(prev_p_tag.a['href'])
                     if result:
                         self.__prev_diary_id = result.group('id')
+
+        self.__has_next_comments = False
+        comment_div_tag = soup.find('div', id='commentList')
+        if comment_div_tag:
+            pager_div_tag = comment_div_tag.find('div', class_='pagerRelative')
+            if pager_div_tag:
+                result = COMMENT_NUMBER_PATTERN.search(pager_div_tag.get_text())
+                if result:
+                    self.__comment_count = max(self.__comment_count, int(result.group('end')))
+                self.__has_next_comments = pager_div_tag.find('p', class_='next') is not None
@@ -20,5 +20,17 @@ class RetryCountExceededError(WebAccessError):
     '''再試行回数を超過した際に送出されます'''
 
 
+class RetryBudgetExceededError(RetryCountExceededError):
+    '''再試行の予算を使い切った際に送出されます'''
+
+
+class UnexpectedStatusError(WebAccessError):
+    '''再試行の対象でないステータスが返された際に送出されます'''
+
+    def __init__(self, status: int):
+        super().__init__('Unexpected status {}.'.format(status))
+        self.status = status
+
+
 class NoSuchDiaryError(TsLoveToolsException):
     '''指定された日記が存在しなかった際に送出されます'''
@@ -0,0 +1,116 @@
+'''HTTPキャッシュモジュール
+
+URLごとに ETag と Last-Modified を記録し、条件付きリクエストのヘッダを組み立てます
+'''
+
+import json
+import os
+import threading
+from typing import Dict, List, Optional
+from urllib.parse import urlencode
+
+
+class ValidatorCache:
+    '''ETag と Last-Modified のキャッシュ
+
+    複数のスレッドから同時に利用できます
+    '''
+
+    def __init__(self):
+        self.__validators: Dict[str, Dict[str, str]] = {}
+        self.__lock = threading.Lock()
+        self.__modified = False
+
+    def __len__(self):
+        return len(self.__validators)
+
+    @staticmethod
+    def key(url: str, params: Optional[dict] = None) -> str:
+        '''URLとクエリパラメータからキャッシュのキーを作成します
+
+        :param url: URL
+        :param params: クエリパラメータ
+        :return: キー
+        '''
+        if not params:
+            return url
+        return url + '?' + urlencode(sorted(params.items()))
+
+    def keys(self) -> List[str]:
+        '''記録済みのキーのリストを返します
+
+        :return: キーのリスト
+        '''
+        with self.__lock:
+            return list(self.__validators)
+
+    def request_headers(self, key: str) -> dict:
+        '''条件付きリクエストのヘッダを作成します
+
+        :param key: キー
+        :return: If-None-Match, If-Modified-Since ヘッダ。記録が無い場合は空
+        '''
+        with self.__lock:
+            validators = self.__validators.get(key, {})
+
+        headers = {}
+        if 'etag' in validators:
+            headers['If-None-Match'] = validators['etag']
+        if 'last_modified' in validators:
+            headers['If-Modified-Since'] = validators['last_modified']
+        return headers
+
+    def update(self, key: str, response_headers) -> None:
+        '''レスポンスヘッダから ETag と Last-Modified を記録します
+
+        :param key: キー
+        :param response_headers: レスポンスヘッダ
+        '''
+        validators = {}
+        if response_headers.get('ETag'):
+            validators['etag'] = response_headers['ETag']
+        if response_headers.get('Last-Modified'):
+            validators['last_modified'] = response_headers['Last-Modified']
+
+        with self.__lock:
+            if self.__validators.get(key, {}) == validators:
+                return
+            if validators:
+                self.__validators[key] = validators
+            else:
+                self.__validators.pop(key, None)
+            self.__modified = True
+
+    def load(self, file_name: str) -> None:
+        '''キャッシュファイルを読み込みます
+
+        :param file_name: キャッシュファイル名
+        :raises OSError: ファイルの読み込みに失敗した場合
+        :raises ValueError: ファイルの内容が不正な場合
+        '''
+        if not os.path.exists(file_name):
+            return
+
+        with open(file_name, 'r', encoding='utf-8') as file:
+            validators = json.load(file)
+
+        with self.__lock:
+            self.__validators = validators
+            self.__modified = False
+
+    def save(self, file_name: str) -> None:
+        '''キャッシュファイルを保存します
+
+        記録が変更されていない場合は何もしません
+
+        :param file_name: キャッシュファイル名
+        :raises OSError: ファイルの書き込みに失敗した場合
+        '''
+        with self.__lock:
+            if not self.__modified:
+                return
+            validators = dict(self.__validators)
+            self.__modified = False
+
+        with open(file_name, 'w', encoding='utf-8') as file:
+            json.dump(validators, file, ensure_ascii=False, indent=2)
@@ -0,0 +1,208 @@
+'''画像情報モジュール
+
+画像ファイル先頭のバイト列(マジックナンバー)から画像の形式を判別します
+また画像をデコードせずにヘッダのみを読んで画像の大きさを取得します
+'''
+
+import json
+import os
+import struct
+import threading
+from typing import BinaryIO, Dict, Optional, Tuple
+
+SNIFF_SIZE = 16
+
+SIGNATURES = {
+    'image/jpeg': (b'\xff\xd8\xff',),
+    'image/png': (b'\x89PNG\r\n\x1a\n',),
+    'image/gif': (b'GIF87a', b'GIF89a'),
+    'image/bmp': (b'BM',),
+}
+
+CONTENT_TYPE_ALIASES = {
+    'image/jpg': 'image/jpeg',
+    'image/pjpeg': 'image/jpeg',
+    'image/x-png': 'image/png',
+    'image/x-ms-bmp': 'image/bmp',
+}
+
+
+def sniff_image_type(head: bytes) -> Optional[str]:
+    '''先頭のバイト列から画像の形式を判別します
+
+    :param head: 画像ファイル先頭のバイト列(SNIFF_SIZE バイト程度)
+    :return: 判別した形式の Content-Type もしくは None
+    '''
+    for content_type, signatures in SIGNATURES.items():
+        if head.startswith(signatures):
+            return content_type
+
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'image/webp'
+
+    return None
+
+
+def is_consistent(content_type: str, head: bytes) -> bool:
+    '''Content-Typeと先頭のバイト列が矛盾しないかを判定します
+
+    マジックナンバーを把握していない形式の Content-Type は常に矛盾しないものとします
+
+    :param content_type: レスポンスの Content-Type ヘッダの値
+    :param head: 画像ファイル先頭のバイト列
+    :return: 矛盾しない場合 True
+    '''
+    declared = content_type.split(';')[0].strip().lower()
+    declared = CONTENT_TYPE_ALIASES.get(declared, declared)
+
+    if declared not in SIGNATURES and declared != 'image/webp':
+        return True
+
+    return sniff_image_type(head) == declared
+
+
+def read_image_size(file_name: str) -> Optional[Tuple[int, int]]:
+    '''画像ファイルのヘッダから画像の大きさを取得します
+
+    JPEG, PNG, GIF, BMP に対応します。画像本体のデコードは行いません
+
+    :param file_name: 画像ファイル名
+    :return: (幅, 高さ) のタプル。形式が不明あるいはヘッダが不正な場合 None
+    :raises OSError: ファイルの読み込みに失敗した場合
+    '''
+    with open(file_name, 'rb') as file:
+        return read_image_size_from_stream(file)
+
+
+def read_image_size_from_stream(stream: BinaryIO) -> Optional[Tuple[int, int]]:
+    '''ストリームのヘッダから画像の大きさを取得します
+
+    :param stream: 画像の先頭に位置するバイナリストリーム
+    :return: (幅, 高さ) のタプル。形式が不明あるいはヘッダが不正な場合 None
+    '''
+    head = stream.read(26)
+    image_type = sniff_image_type(head)
+
+    try:
+        if image_type == 'image/png' and head[12:16] == b'IHDR':
+            return struct.unpack('>II', head[16:24])
+        if image_type == 'image/gif':
+            return struct.unpack('<HH', head[6:10])
+        if image_type == 'image/bmp':
+            width, height = struct.unpack('<ii', head[18:26])
+            return width, abs(height)
+        if image_type == 'image/jpeg':
+            stream.seek(2)
+            return _read_jpeg_size(stream)
+    except struct.error:
+        return None
+
+    return None
+
+
+def _read_jpeg_size(stream: BinaryIO) -> Optional[Tuple[int, int]]:
+    '''JPEGのマーカーを辿ってSOFセグメントから画像の大きさを取得します
+
+    :param stream: SOIマーカーの直後に位置するバイナリストリーム
+    :return: (幅, 高さ) のタプル もしくは None
+    '''
+    while True:
+        byte = stream.read(1)
+        if not byte:
+            return None
+        if byte != b'\xff':
+            continue
+
+        marker = stream.read(1)
+        while marker == b'\xff':
+            marker = stream.read(1)
+        if not marker:
+            return None
+
+        code = marker[0]
+        if code == 0xd8 or code == 0x01 or 0xd0 <= code <= 0xd7:
+            continue
+        if code == 0xd9 or code == 0xda:  # EOI, SOS
+            return None
+
+        length, = struct.unpack('>H', stream.read(2))
+        if 0xc0 <= code <= 0xcf and code not in (0xc4, 0xc8, 0xcc):
+            height, width = struct.unpack('>xHH', stream.read(5))
+            return width, height
+
+        stream.seek(length - 2, os.SEEK_CUR)
+
+
+class ImageSizeCache:
+    '''画像の大きさのキャッシュ
+
+    ファイル名をキーとして画像の大きさを保持し、JSONファイルへ永続化します
+    複数のスレッドから同時に利用できます
+    '''
+
+    def __init__(self, file_name: str):
+        '''
+        :param file_name: キャッシュファイル名
+        '''
+        self.__file_name = file_name
+        self.__sizes: Dict[str, Tuple[int, int]] = {}
+        self.__lock = threading.Lock()
+        self.__modified = False
+
+    def __len__(self):
+        return len(self.__sizes)
+
+    def get(self, name: str) -> Optional[Tuple[int, int]]:
+        '''画像の大きさを取得します
+
+        :param name: 画像のファイル名
+        :return: (幅, 高さ) のタプル もしくは None
+        '''
+        with self.__lock:
+            return self.__sizes.get(name)
+
+    def record(self, name: str, file_name: str) -> Optional[Tuple[int, int]]:
+        '''画像ファイルのヘッダを読んで大きさを記録します
+
+        :param name: 画像のファイル名
+        :param file_name: 画像ファイルのパス
+        :return: (幅, 高さ) のタプル。大きさを取得できなかった場合 None
+        :raises OSError: ファイルの読み込みに失敗した場合
+        '''
+        size = read_image_size(file_name)
+        if size is not None:
+            with self.__lock:
+                self.__sizes[name] = size
+                self.__modified = True
+        return size
+
+    def load(self) -> None:
+        '''キャッシュファイルを読み込みます
+
+        :raises OSError: ファイルの読み込みに失敗した場合
+        '''
+        if not os.path.exists(self.__file_name):
+            return
+
+        with open(self.__file_name, 'r', encoding='utf-8') as file:
+            sizes = json.load(file)
+
+        with self.__lock:
+            self.__sizes = {name: (size[0], size[1]) for name, size in sizes.items()}
+            self.__modified = False
+
+    def save(self) -> None:
+        '''キャッシュファイルを保存します
+
+        記録が変更されていない場合は何もしません
+
+        :raises OSError: ファイルの書き込みに失敗した場合
+        '''
+        with self.__lock:
+            if not self.__modified:
+                return
+            sizes = dict(self.__sizes)
+            self.__modified = False
+
+        with open(self.__file_name, 'w', encoding='utf-8') as file:
+            json.dump(sizes, file)
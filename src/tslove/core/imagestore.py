@@ -0,0 +1,166 @@
+'''画像ストアモジュール
+
+画像を内容のハッシュ値(SHA-256)をキーとして保管し、公開するファイル名からハードリンクを張ります
+同じ内容の画像は名前や出力先が異なっても一つだけ保管されます
+
+ストアは以下の構成です
+
+- objects/<ハッシュ値の先頭2文字>/<ハッシュ値>: 画像の実体
+- index.json: 取得元(img.php のファイル名など)からハッシュ値への索引
+'''
+
+import hashlib
+import json
+import os
+import threading
+from typing import Dict, Optional
+
+HASH_CHUNK_SIZE = 64 * 1024
+
+
+class ImageStore:
+    '''内容のハッシュ値をキーとする画像の保管場所
+
+    複数のスレッドから同時に利用できます
+    '''
+
+    def __init__(self, root: str):
+        '''
+        :param root: ストアのディレクトリ
+        '''
+        self.__root = root
+        self.__index: Dict[str, str] = {}
+        self.__lock = threading.Lock()
+        self.__modified = False
+
+    def __len__(self):
+        return len(self.__index)
+
+    @property
+    def root(self) -> str:
+        '''ストアのディレクトリ'''
+        return self.__root
+
+    def object_path(self, digest: str) -> str:
+        '''ハッシュ値に対応する実体のパス
+
+        :param digest: ハッシュ値
+        :return: 実体のパス
+        '''
+        return os.path.join(self.__root, 'objects', digest[:2], digest)
+
+    @staticmethod
+    def hash_file(file_name: str) -> str:
+        '''ファイルの内容のハッシュ値を求めます
+
+        :param file_name: ファイル名
+        :return: ハッシュ値(16進数)
+        :raises OSError: ファイルの読み込みに失敗した場合
+        '''
+        digest = hashlib.sha256()
+        with open(file_name, 'rb') as file:
+            for chunk in iter(lambda: file.read(HASH_CHUNK_SIZE), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def lookup(self, key: str) -> Optional[str]:
+        '''取得元に対応する保管済みの実体のハッシュ値を返します
+
+        :param key: 取得元
+        :return: ハッシュ値。索引に無いあるいは実体が存在しない場合は None
+        '''
+        with self.__lock:
+            digest = self.__index.get(key)
+        if digest is None or not os.path.exists(self.object_path(digest)):
+            return None
+        return digest
+
+    def link(self, key: str, file_name: str) -> bool:
+        '''保管済みの実体から file_name へハードリンクを張ります
+
+        ダウンロードの前に呼び出すことで、取得済みの画像の再取得を省略できます
+
+        :param key: 取得元
+        :param file_name: 公開するファイル名
+        :return: リンクを張った場合 True, 取得元が索引に無い場合 False
+        :raises OSError: リンクの作成に失敗した場合
+        '''
+        digest = self.lookup(key)
+        if digest is None:
+            return False
+
+        self.__replace_with_link(self.object_path(digest), file_name)
+        return True
+
+    def add(self, key: str, file_name: str) -> str:
+        '''取得したファイルをストアへ登録します
+
+        同じ内容の実体が既にある場合は file_name をその実体へのハードリンクに置き換えます
+        無い場合は file_name を新たな実体としてストアからハードリンクを張ります
+
+        :param key: 取得元
+        :param file_name: 取得したファイル名
+        :return: ハッシュ値
+        :raises OSError: ファイルの読み込みあるいはリンクの作成に失敗した場合
+        '''
+        digest = self.hash_file(file_name)
+        object_path = self.object_path(digest)
+
+        with self.__lock:
+            if not os.path.exists(object_path):
+                os.makedirs(os.path.dirname(object_path), exist_ok=True)
+                os.link(file_name, object_path)
+            elif not os.path.samefile(object_path, file_name):
+                self.__replace_with_link(object_path, file_name)
+
+            if self.__index.get(key) != digest:
+                self.__index[key] = digest
+                self.__modified = True
+
+        return digest
+
+    @staticmethod
+    def __replace_with_link(src: str, dst: str) -> None:
+        '''dst を src へのハードリンクに置き換えます'''
+        temp_file_name = dst + '.link'
+        if os.path.exists(temp_file_name):
+            os.remove(temp_file_name)
+        os.link(src, temp_file_name)
+        os.replace(temp_file_name, dst)
+
+    def load(self) -> None:
+        '''索引を読み込みます
+
+        :raises OSError: ファイルの読み込みに失敗した場合
+        :raises ValueError: ファイルの内容が不正な場合
+        '''
+        index_file_name = os.path.join(self.__root, 'index.json')
+        if not os.path.exists(index_file_name):
+            return
+
+        with open(index_file_name, 'r', encoding='utf-8') as file:
+            index = json.load(file)
+
+        with self.__lock:
+            self.__index = index
+            self.__modified = False
+
+    def save(self) -> None:
+        '''索引を保存します
+
+        索引が変更されていない場合は何もしません
+
+        :raises OSError: ファイルの書き込みに失敗した場合
+        '''
+        with self.__lock:
+            if not self.__modified:
+                return
+            index = dict(self.__index)
+            self.__modified = False
+
+        os.makedirs(self.__root, exist_ok=True)
+        index_file_name = os.path.join(self.__root, 'index.json')
+        temp_file_name = index_file_name + '.tmp'
+        with open(temp_file_name, 'w', encoding='utf-8') as file:
+            json.dump(index, file, ensure_ascii=False, indent=2)
+        os.replace(temp_file_name, index_file_name)
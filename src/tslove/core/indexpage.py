@@ -0,0 +1,171 @@
+'''インデックスページモジュール
+
+日記の一覧を年月ごとのページ(シャード)と、年月の一覧を示す小さな目次ページに分けて出力します
+行はDOMを組み立てずにテンプレートから直接書き込みます
+全文検索の索引を書き出した場合は、ブラウザから検索するためのページも出力します
+'''
+
+import html
+from typing import Iterable, List, TextIO, Tuple
+
+HEADER_TEMPLATE = '''<!DOCTYPE html>
+<html>
+<head>
+<title>{title}</title>
+<meta charset="utf-8"/>
+</head>
+<body>
+<h1>{title}</h1>
+'''
+
+FOOTER = '''</body>
+</html>
+'''
+
+SUMMARY_TITLE = 'Index of dialy'
+MONTH_TITLE_FORMAT = '{:04d}年{:02d}月'
+DATE_FORMAT = '%Y年%m月%d日%H:%M'
+
+MONTH_TABLE_HEADER = '<p><a href="./index.html">{}</a></p>\n<table>\n<tr><th>Date</th><th>Title</th></tr>\n'.format(SUMMARY_TITLE)
+MONTH_ROW_TEMPLATE = '<tr><td>{date}</td><td><a href="./{diary_id}.html">{title}</a></td></tr>\n'
+MONTH_TABLE_FOOTER = '</table>\n'
+
+SUMMARY_YEAR_TEMPLATE = '<h2>{:04d}年</h2>\n<ul>\n'
+SUMMARY_ROW_TEMPLATE = '<li><a href="./{file_name}">{title}</a> ({count})</li>\n'
+SUMMARY_YEAR_FOOTER = '</ul>\n'
+
+SEARCH_LINK = '<p><a href="./search.html">Search dialy</a></p>\n'
+SEARCH_DATA_PREFIX = 'var TSLOVE_SEARCH_INDEX = '
+SEARCH_DATA_SUFFIX = ';\n'
+
+SEARCH_PAGE = '''<!DOCTYPE html>
+<html>
+<head>
+<title>Search dialy</title>
+<meta charset="utf-8"/>
+<script src="./search-index.js"></script>
+</head>
+<body>
+<h1>Search dialy</h1>
+<p><a href="./index.html">Index of dialy</a></p>
+<form id="search"><input id="query" type="search"/> <input type="submit" value="Search"/></form>
+<p id="count"></p>
+<table id="result"></table>
+<script>
+(function () {
+  var index = TSLOVE_SEARCH_INDEX;
+
+  function normalize(text) {
+    return text.normalize('NFKC').toLowerCase().replace(/\\s+/g, ' ').trim();
+  }
+
+  function search(query) {
+    var found = null;
+    normalize(query).split(' ').forEach(function (term) {
+      for (var i = 0; i + 1 < term.length; i++) {
+        var positions = {};
+        (index.bigrams[term.substr(i, 2)] || []).forEach(function (position) { positions[position] = true; });
+        found = (found === null ? Object.keys(positions).map(Number) : found).filter(function (position) {
+          return positions[position];
+        });
+      }
+    });
+    return (found || []).sort(function (a, b) { return a - b; });
+  }
+
+  function cell(row, text, href) {
+    var td = row.insertCell(-1);
+    var node = td;
+    if (href) {
+      node = document.createElement('a');
+      node.href = href;
+      td.appendChild(node);
+    }
+    node.textContent = text;
+  }
+
+  document.getElementById('search').addEventListener('submit', function (event) {
+    event.preventDefault();
+    var table = document.getElementById('result');
+    var found = search(document.getElementById('query').value);
+    table.innerHTML = '';
+    found.forEach(function (position) {
+      var diary = index.diaries[position];
+      var row = table.insertRow(-1);
+      cell(row, diary[1]);
+      cell(row, diary[2], './' + diary[0] + '.html');
+    });
+    document.getElementById('count').textContent = found.length + ' diaries';
+  });
+})();
+</script>
+</body>
+</html>
+'''
+
+
+def month_file_name(year: int, month: int) -> str:
+    '''年月ごとのページのファイル名
+
+    :param year: 年
+    :param month: 月
+    :return: ファイル名
+    '''
+    return 'index-{:04d}-{:02d}.html'.format(year, month)
+
+
+def write_month_page(file: TextIO, year: int, month: int, page_infos: Iterable[dict]) -> None:
+    '''年月ごとのページを書き込みます
+
+    :param file: 書き込み先のファイル
+    :param year: 年
+    :param month: 月
+    :param page_infos: その年月の日記のページ情報(表示する順)
+    :raises OSError: ファイルの書き込みに失敗した場合
+    '''
+    file.write(HEADER_TEMPLATE.format(title=MONTH_TITLE_FORMAT.format(year, month)))
+    file.write(MONTH_TABLE_HEADER)
+    for page_info in page_infos:
+        file.write(MONTH_ROW_TEMPLATE.format(date=page_info['date'].strftime(DATE_FORMAT),
+                                             diary_id=html.escape(page_info['diary_id']),
+                                             title=html.escape(page_info['title'])))
+    file.write(MONTH_TABLE_FOOTER)
+    file.write(FOOTER)
+
+
+def write_summary_page(file: TextIO, months: List[Tuple[int, int, int]], search_page: bool = False) -> None:
+    '''年月の一覧を示す目次ページを書き込みます
+
+    :param file: 書き込み先のファイル
+    :param months: (年, 月, 日記の数) のリスト(表示する順)
+    :param search_page: 検索ページへのリンクを含める場合 True
+    :raises OSError: ファイルの書き込みに失敗した場合
+    '''
+    file.write(HEADER_TEMPLATE.format(title=SUMMARY_TITLE))
+    if search_page:
+        file.write(SEARCH_LINK)
+    current_year = None
+    for year, month, count in months:
+        if year != current_year:
+            if current_year is not None:
+                file.write(SUMMARY_YEAR_FOOTER)
+            file.write(SUMMARY_YEAR_TEMPLATE.format(year))
+            current_year = year
+        file.write(SUMMARY_ROW_TEMPLATE.format(file_name=month_file_name(year, month),
+                                               title=MONTH_TITLE_FORMAT.format(year, month),
+                                               count=count))
+    if current_year is not None:
+        file.write(SUMMARY_YEAR_FOOTER)
+    file.write(FOOTER)
+
+
+def write_search_page(file: TextIO) -> None:
+    '''ブラウザから検索するためのページを書き込みます
+
+    ページは同じディレクトリの search-index.js に書き出した索引を読み込みます
+    検索語に含まれるバイグラムをすべて含む日記を表示します。1文字の検索語は無視されます
+
+    :param file: 書き込み先のファイル
+    :raises OSError: ファイルの書き込みに失敗した場合
+    '''
+    file.write(SEARCH_PAGE)
@@ -0,0 +1,50 @@
+'''ジャーナルモジュール
+
+以前のバージョンが page_info.json と並べて書き出していた JSON Lines 形式のジャーナル(page_info.jsonl)を読み込みます
+ページ情報は索引(archive.sqlite3)へ記録するようになったため、ジャーナルは移行時に再生するのみで書き込みません
+'''
+
+import json
+import os
+from typing import Any, Callable, Iterator, Optional
+
+
+class Journal:
+    '''読み込み専用の JSON Lines ジャーナル
+
+    異常終了によって途中までしか書かれなかった最終行は再生時に無視します
+    '''
+
+    def __init__(self, file_name: str, object_hook: Optional[Callable[[dict], Any]] = None):
+        '''
+        :param file_name: ジャーナルファイル名
+        :param object_hook: json.loads の object_hook 引数
+        '''
+        self.__file_name = file_name
+        self.__object_hook = object_hook
+
+    @property
+    def file_name(self) -> str:
+        '''ジャーナルファイル名'''
+        return self.__file_name
+
+    def replay(self) -> Iterator[Any]:
+        '''ジャーナルファイルのレコードを先頭から順に返します
+
+        途中までしか書かれていない行以降は読み込みません
+
+        :return: レコードのイテレータ
+        :raises OSError: ファイルの読み込みに失敗した場合
+        '''
+        if not os.path.exists(self.__file_name):
+            return
+
+        with open(self.__file_name, 'rb') as file:
+            for line in file:
+                if not line.endswith(b'\n'):
+                    break
+                try:
+                    record = json.loads(line.decode('utf-8'), object_hook=self.__object_hook)
+                except ValueError:
+                    break
+                yield record
@@ -0,0 +1,191 @@
+'''リクエスト計測モジュール
+
+T'sLove へのリクエストをエンドポイントごとに集計します
+
+- リクエスト数(ステータス、Content-Type ごと)
+- 受信したバイト数
+- 再試行として発行したリクエスト数
+- 応答時間のヒストグラム
+
+集計結果はJSONもしくは Prometheus の textfile 形式で書き出せます
+'''
+
+import bisect
+import json
+import threading
+from typing import Dict, List, Optional, TextIO, Tuple
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+ERROR_STATUS = 'error'
+
+PROMETHEUS_PREFIX = 'tslove'
+
+
+def endpoint_name(path: str, params: Optional[dict] = None) -> str:
+    '''リクエストのエンドポイント名を決めます
+
+    クエリパラメータ a (アクション)があればその値を、無ければパスを利用します
+    ディレクトリを含むパス(skin, js など)はファイル名ごとに分けず先頭のディレクトリにまとめます
+
+    :param path: url path
+    :param params: クエリパラメータ
+    :return: エンドポイント名
+    '''
+    if params and 'a' in params:
+        return str(params['a'])
+
+    path = path.split('?', 1)[0]
+    while path.startswith(('./', '/')):
+        path = path[1:] if path.startswith('/') else path[2:]
+    if not path:
+        return '/'
+    if '/' in path:
+        return path.split('/', 1)[0] + '/*'
+    return path
+
+
+def escape_label(value: str) -> str:
+    '''Prometheus のラベルの値をエスケープします'''
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class EndpointMetrics:
+    '''エンドポイント1つ分の集計'''
+
+    def __init__(self):
+        self.requests = 0
+        self.retries = 0
+        self.bytes = 0
+        self.latency_sum = 0.0
+        self.latency_buckets = [0] * (len(LATENCY_BUCKETS) + 1)  # 最後は +Inf
+        self.statuses: Dict[str, int] = {}
+        self.content_types: Dict[str, int] = {}
+
+    def to_dict(self) -> dict:
+        '''JSONに変換できる辞書を作成します'''
+        return {
+            'requests': self.requests,
+            'retries': self.retries,
+            'bytes': self.bytes,
+            'latency_sum': self.latency_sum,
+            'latency_buckets': {str(bound): count for bound, count in zip(LATENCY_BUCKETS + ('+Inf',), self.latency_buckets)},
+            'statuses': dict(self.statuses),
+            'content_types': dict(self.content_types),
+        }
+
+
+class RequestMetrics:
+    '''リクエストの計測結果
+
+    複数のスレッドから同時に利用できます
+    '''
+
+    def __init__(self):
+        self.__endpoints: Dict[str, EndpointMetrics] = {}
+        self.__lock = threading.Lock()
+
+    def __len__(self):
+        with self.__lock:
+            return sum(metrics.requests for metrics in self.__endpoints.values())
+
+    def record(self, endpoint: str, status: Optional[int], content_type: str, size: int, latency: float,  # pylint: disable=R0913
+               retry: bool = False) -> None:
+        '''リクエスト1件の結果を記録します
+
+        :param endpoint: エンドポイント名
+        :param status: ステータスコード。通信に失敗した場合は None
+        :param content_type: Content-Type (パラメータは取り除きます)
+        :param size: 受信したバイト数
+        :param latency: 応答時間(秒)
+        :param retry: 再試行として発行したリクエストの場合 True
+        '''
+        status_name = str(status) if status is not None else ERROR_STATUS
+        content_type = content_type.split(';', 1)[0].strip().lower() or 'none'
+        bucket = bisect.bisect_left(LATENCY_BUCKETS, latency)
+
+        with self.__lock:
+            metrics = self.__endpoints.get(endpoint)
+            if metrics is None:
+                metrics = self.__endpoints[endpoint] = EndpointMetrics()
+            metrics.requests += 1
+            metrics.retries += 1 if retry else 0
+            metrics.bytes += size
+            metrics.latency_sum += latency
+            metrics.latency_buckets[bucket] += 1
+            metrics.statuses[status_name] = metrics.statuses.get(status_name, 0) + 1
+            metrics.content_types[content_type] = metrics.content_types.get(content_type, 0) + 1
+
+    def snapshot(self) -> Dict[str, dict]:
+        '''エンドポイントごとの集計結果
+
+        :return: エンドポイント名をキーとする辞書
+        '''
+        with self.__lock:
+            return {endpoint: metrics.to_dict() for endpoint, metrics in sorted(self.__endpoints.items())}
+
+    def summary(self) -> Tuple[int, int, int]:
+        '''全エンドポイントの合計
+
+        :return: (リクエスト数, 再試行の数, 受信したバイト数)
+        '''
+        with self.__lock:
+            endpoints = list(self.__endpoints.values())
+            return (sum(metrics.requests for metrics in endpoints),
+                    sum(metrics.retries for metrics in endpoints),
+                    sum(metrics.bytes for metrics in endpoints))
+
+    def write_json(self, file: TextIO) -> None:
+        '''集計結果をJSONで書き込みます
+
+        :param file: 書き込み先のファイル
+        :raises OSError: ファイルの書き込みに失敗した場合
+        '''
+        json.dump({'latency_buckets': list(LATENCY_BUCKETS), 'endpoints': self.snapshot()}, file, ensure_ascii=False, indent=2)
+
+    def write_prometheus(self, file: TextIO) -> None:
+        '''集計結果を Prometheus の textfile 形式で書き込みます
+
+        node_exporter の textfile collector で読み込めます
+
+        :param file: 書き込み先のファイル
+        :raises OSError: ファイルの書き込みに失敗した場合
+        '''
+        snapshot = self.snapshot()
+        lines: List[str] = []
+
+        def metric(name: str, kind: str, help_text: str) -> str:
+            full_name = '{}_{}'.format(PROMETHEUS_PREFIX, name)
+            lines.append('# HELP {} {}'.format(full_name, help_text))
+            lines.append('# TYPE {} {}'.format(full_name, kind))
+            return full_name
+
+        name = metric('requests_total', 'counter', 'Requests sent to T\'sLove.')
+        for endpoint, values in snapshot.items():
+            for status, count in sorted(values['statuses'].items()):
+                lines.append('{}{{endpoint="{}",status="{}"}} {}'.format(name, escape_label(endpoint), status, count))
+
+        name = metric('responses_by_content_type_total', 'counter', 'Responses by Content-Type.')
+        for endpoint, values in snapshot.items():
+            for content_type, count in sorted(values['content_types'].items()):
+                lines.append('{}{{endpoint="{}",content_type="{}"}} {}'.format(name, escape_label(endpoint),
+                                                                             escape_label(content_type), count))
+
+        name = metric('retries_total', 'counter', 'Requests sent as retries.')
+        for endpoint, values in snapshot.items():
+            lines.append('{}{{endpoint="{}"}} {}'.format(name, escape_label(endpoint), values['retries']))
+
+        name = metric('received_bytes_total', 'counter', 'Bytes received.')
+        for endpoint, values in snapshot.items():
+            lines.append('{}{{endpoint="{}"}} {}'.format(name, escape_label(endpoint), values['bytes']))
+
+        name = metric('request_duration_seconds', 'histogram', 'Time until the response headers arrive.')
+        for endpoint, values in snapshot.items():
+            label = escape_label(endpoint)
+            cumulative = 0
+            for bound, count in values['latency_buckets'].items():
+                cumulative += count
+                lines.append('{}_bucket{{endpoint="{}",le="{}"}} {}'.format(name, label, bound, cumulative))
+            lines.append('{}_sum{{endpoint="{}"}} {}'.format(name, label, repr(values['latency_sum'])))
+            lines.append('{}_count{{endpoint="{}"}} {}'.format(name, label, values['requests']))
+
+        file.write('\n'.join(lines) + '\n')
@@ -3,22 +3,25 @@
 T'sLoveのページを扱います
 '''
 
-from typing import List, Set
+from typing import List, Optional, Set
 
 from bs4 import BeautifulSoup  # type: ignore
 
 from tslove.core.web import TsLoveWeb
+from tslove.core.parser import make_soup
+from tslove.core.profiler import profiler, PARSE
 
 
 class Page:
     ''' T'sLoveのページの取得と操作を提供します'''
 
     @classmethod
-    def fetch_from_web(cls, *args, **kwargs):
+    def fetch_from_web(cls, web: TsLoveWeb, *args, **kwargs):
         '''webからページを取得します
 
         kwargsで指定したクエリパラメータのうち a は除外されます
 
+        :param web: ページの取得に利用するセッション
         :param args: args[0] クエリパラメータaの値
         :param kwargs: kwargs['param'] 追加のクエリパラメータ
         '''
@@ -30,7 +33,6 @@ class Page:
         if 'param' in kwargs:
             kwargs['param'].pop('a', '')
             param.update(kwargs['param'])
-        web = TsLoveWeb.get_instance()
         html = web.get_page(param)
 
         page = Page()
@@ -39,6 +41,7 @@ class Page:
 
     def __init__(self):
         self._html: List[str] = []
+        self._soup: List[Optional[BeautifulSoup]] = []
         self.__image_paths: Set[str] = set()
         self.__script_paths: Set[str] = set()
 
@@ -63,13 +66,44 @@ class Page:
     def append(self, html: str):
         '''ページを追加します
 
+        パースしたツリーは detach_soup で取り出すか release で解放するまで保持されます
+
         :param html_page: HTMLページ
         '''
-        self._html.append(html)
-        self._parse(BeautifulSoup(html, 'html.parser'))
+        with profiler().stage(PARSE):
+            soup = make_soup(html)
+            self._html.append(html)
+            self._soup.append(soup)
+            self._parse(soup)
+
+    def detach_soup(self, key: int = 0) -> BeautifulSoup:
+        '''パース済みのツリーを取り出します
+
+        取り出したツリーはPageから切り離されるので、呼び出し元で自由に書き換えることができます
+
+        :param key: htmlページの番号
+        :return: パース済みのツリー
+        :raises ValueError: ツリーが既に取り出されているか解放されている場合
+        '''
+        soup = self._soup[key]
+        if soup is None:
+            raise ValueError('Soup already detached or released.')
+
+        self._soup[key] = None
+        return soup
+
+    def release(self) -> None:
+        '''保持しているツリーを解放します'''
+        for key, soup in enumerate(self._soup):
+            if soup is not None:
+                soup.decompose()
+                self._soup[key] = None
 
     def _parse(self, soup: BeautifulSoup) -> None:
-        '''ページをパースしてプロパティをセットします'''
+        '''ページをパースしてプロパティをセットします
+
+        soupは後で書き換えに利用されるため変更してはいけません
+        '''
 
         for img_tag in soup.find_all('img'):
             self.__image_paths.add(img_tag['src'])
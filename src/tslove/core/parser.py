@@ -0,0 +1,41 @@
+'''パーサーモジュール
+
+BeautifulSoupで利用するHTMLパーサーを選択します
+
+既定では html.parser を利用します
+lxml は高速ですが不正な入れ子の解釈が html.parser と異なり出力が変わるため、set_html_parser で明示的に選択します
+'''
+
+from bs4 import BeautifulSoup  # type: ignore
+from bs4.builder import builder_registry  # type: ignore
+
+DEFAULT_PARSER = 'html.parser'
+
+_html_parser = DEFAULT_PARSER
+
+
+def html_parser() -> str:
+    '''現在のHTMLパーサーの名前'''
+    return _html_parser
+
+
+def set_html_parser(name: str) -> None:
+    '''HTMLパーサーを設定します
+
+    :param name: BeautifulSoupのパーサー名 (lxml, html.parser, html5lib など)
+    :raises ValueError: パーサーが利用できない場合
+    '''
+    global _html_parser  # pylint: disable=W0603
+
+    if builder_registry.lookup(name) is None:
+        raise ValueError('HTML parser {} is not available.'.format(name))
+    _html_parser = name
+
+
+def make_soup(markup: str) -> BeautifulSoup:
+    '''現在のHTMLパーサーでHTMLをパースします
+
+    :param markup: HTML
+    :return: パースしたツリー
+    '''
+    return BeautifulSoup(markup, _html_parser)
@@ -0,0 +1,156 @@
+'''ワーカープールモジュール
+
+画像やスクリプトなどのアセットの取得をバックグラウンドで並行して行います
+'''
+
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from typing import Callable, Deque, Dict, Iterable, Set, Tuple
+
+DEFAULT_WORKERS = 4
+DEFAULT_PER_HOST = 2
+
+
+class AssetPool:
+    '''ホストごとの同時接続数を制限したワーカープール
+
+    ジョブはホストごとの待ち行列に入れ、実行中のジョブが per_host 未満のときだけワーカーへ渡します
+    ワーカーが上限の空きを待って止まることはないため、workers の数だけ別のホストのジョブを並行して実行できます
+    '''
+
+    def __init__(self, workers: int = DEFAULT_WORKERS, per_host: int = DEFAULT_PER_HOST):
+        '''
+        :param workers: ワーカースレッドの数
+        :param per_host: ホストごとの同時実行数の上限
+        '''
+        if workers < 1 or per_host < 1:
+            raise ValueError('workers and per_host must be positive.')
+
+        self.__executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='tslove-asset')
+        self.__per_host = per_host
+        self.__queues: Dict[str, Deque[Tuple[Future, Callable, tuple]]] = {}
+        self.__running: Dict[str, int] = {}
+        self.__pending: Set[Future] = set()
+        self.__lock = threading.Lock()
+
+    def __track(self, future: Future) -> None:
+        '''完了を待つ対象としてFutureを登録します'''
+        with self.__lock:
+            self.__pending.add(future)
+
+        def discard(done: Future) -> None:
+            with self.__lock:
+                self.__pending.discard(done)
+
+        future.add_done_callback(discard)
+
+    def submit(self, host: str, job: Callable, *args) -> Future:
+        '''ジョブを投入します
+
+        同一ホストに対するジョブは per_host を超えて同時に実行されません
+        上限に達している間は待ち行列に入れ、投入した順に実行します。開始前であれば取り消せます
+
+        :param host: ジョブがアクセスするホスト
+        :param job: 実行する関数
+        :param args: jobに渡す引数
+        :return: ジョブのFuture
+        '''
+        future: Future = Future()
+        self.__track(future)
+        with self.__lock:
+            self.__queues.setdefault(host, deque()).append((future, job, args))
+        self.__dispatch(host)
+        return future
+
+    def __dispatch(self, host: str) -> None:
+        '''ホストの実行数に空きがある間、待ち行列のジョブをワーカーへ渡します'''
+        while True:
+            with self.__lock:
+                queue = self.__queues.get(host)
+                if not queue or self.__running.get(host, 0) >= self.__per_host:
+                    return
+                future, job, args = queue.popleft()
+                self.__running[host] = self.__running.get(host, 0) + 1
+
+            if future.set_running_or_notify_cancel():
+                self.__executor.submit(self.__run, host, future, job, args)
+            else:  # 取り消し済み
+                self.__release(host)
+
+    def __release(self, host: str) -> None:
+        '''ホストの実行数を一つ減らします'''
+        with self.__lock:
+            self.__running[host] -= 1
+
+    def __run(self, host: str, future: Future, job: Callable, args: tuple) -> None:
+        '''ジョブを実行して結果をFutureへ設定します
+
+        Futureのコールバックが長く掛かる場合に備えて、結果を設定する前に次のジョブを渡します
+        '''
+        try:
+            result = job(*args)
+        except BaseException as err:  # pylint: disable=W0703
+            self.__release(host)
+            self.__dispatch(host)
+            future.set_exception(err)
+        else:
+            self.__release(host)
+            self.__dispatch(host)
+            future.set_result(result)
+
+    def when_done(self, futures: Iterable[Future], callback: Callable[[], None]) -> Future:
+        '''指定したジョブがすべて完了した後にcallbackを実行します
+
+        callbackは最後に完了したジョブのスレッドで実行されます
+        futuresが空あるいはすべて完了済みの場合は呼び出し元のスレッドで直ちに実行されます
+
+        :param futures: 完了を待つFuture
+        :param callback: 実行する関数
+        :return: callbackの実行結果のFuture
+        '''
+        futures = list(futures)
+        group: Future = Future()
+        self.__track(group)
+
+        remaining = [len(futures)]
+        lock = threading.Lock()
+
+        def run_callback():
+            if not group.set_running_or_notify_cancel():
+                return
+            try:
+                group.set_result(callback())
+            except BaseException as err:  # pylint: disable=W0703
+                group.set_exception(err)
+
+        def count_down(_: Future) -> None:
+            with lock:
+                remaining[0] -= 1
+                if remaining[0] != 0:
+                    return
+            run_callback()
+
+        if not futures:
+            run_callback()
+        for future in futures:
+            future.add_done_callback(count_down)
+
+        return group
+
+    def join(self) -> None:
+        '''投入済みのジョブがすべて完了するまで待ちます
+
+        待機中に新たに投入されたジョブも待ちます
+        '''
+        while True:
+            with self.__lock:
+                pending = set(self.__pending)
+            if not pending:
+                return
+            wait(pending)
+
+    def shutdown(self) -> None:
+        '''すべてのジョブの完了を待ってからワーカーを停止します'''
+        self.join()
+        self.__executor.shutdown(wait=True)
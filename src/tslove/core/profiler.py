@@ -0,0 +1,289 @@
+'''プロファイラモジュール
+
+処理を段階(ステージ)に分けて、経過時間とCPU時間を日記ごとに集計します
+
+- fetch: 日記ページの取得
+- parse: 取得したページのパース (Page.append)
+- image: 画像の取得と保存
+- script: スクリプトの取得と保存
+- rewrite: スクリプトやリンクの書き換え
+- search: 全文検索用の文字列の抽出と索引への追加
+- serialize: HTMLの文字列化
+- write: ファイルへの書き込み
+- sleep: 流量制御と再試行のための待機
+
+ステージは入れ子にでき、外側のステージの時間には内側のステージの時間を含めません
+時間は処理を行ったスレッドごとに測るため、並行して処理した時間はそれぞれ加算されます
+
+cProfile を有効にした場合は、ステージを実行したスレッドごとにプロファイルを取り、
+まとめて pstats 形式のファイルに書き出せます
+'''
+
+import cProfile
+import functools
+import json
+import pstats
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, TextIO
+
+FETCH = 'fetch'
+PARSE = 'parse'
+IMAGE = 'image'
+SCRIPT = 'script'
+REWRITE = 'rewrite'
+SEARCH = 'search'
+SERIALIZE = 'serialize'
+WRITE = 'write'
+SLEEP = 'sleep'
+STAGES = (FETCH, PARSE, IMAGE, SCRIPT, REWRITE, SEARCH, SERIALIZE, WRITE, SLEEP)
+
+DEFAULT_TOP = 10
+
+
+class StageTime:
+    '''ステージ1つ分の集計'''
+
+    def __init__(self):
+        self.wall = 0.0
+        self.cpu = 0.0
+        self.calls = 0
+
+    def add(self, wall: float, cpu: float) -> None:
+        '''1回分の時間を加算します'''
+        self.wall += wall
+        self.cpu += cpu
+        self.calls += 1
+
+    def to_dict(self) -> dict:
+        '''JSONに変換できる辞書を作成します'''
+        return {'wall': self.wall, 'cpu': self.cpu, 'calls': self.calls}
+
+
+class StageProfiler:
+    '''ステージごとの時間を集計するプロファイラ
+
+    無効な場合は stage や bind は何もしません
+    複数のスレッドから同時に利用できます
+    '''
+
+    def __init__(self, enabled: bool = False, cprofile: bool = False):
+        '''
+        :param enabled: 集計を行う場合 True
+        :param cprofile: cProfile によるプロファイルも取る場合 True
+        '''
+        self.__enabled = enabled or cprofile
+        self.__cprofile = cprofile
+        self.__totals: Dict[str, StageTime] = {}
+        self.__diaries: Dict[str, Dict[str, StageTime]] = {}
+        self.__profiles: List[cProfile.Profile] = []
+        self.__lock = threading.Lock()
+        self.__state = threading.local()
+
+    @property
+    def enabled(self) -> bool:
+        '''集計を行う場合 True'''
+        return self.__enabled
+
+    @property
+    def current_diary(self) -> Optional[str]:
+        '''呼び出し元スレッドで処理中の日記ID'''
+        return getattr(self.__state, 'diary_id', None)
+
+    @contextmanager
+    def diary(self, diary_id: Optional[str]) -> Iterator[None]:
+        '''ブロック内のステージの時間を diary_id の日記の時間として集計します
+
+        :param diary_id: 日記ID。None の場合は全体の集計にだけ加えます
+        '''
+        previous = self.current_diary
+        self.__state.diary_id = diary_id
+        try:
+            yield
+        finally:
+            self.__state.diary_id = previous
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        '''ブロックの経過時間とCPU時間を name のステージの時間として集計します
+
+        :param name: ステージ名
+        '''
+        if not self.__enabled:
+            yield
+            return
+
+        stack = getattr(self.__state, 'stack', None)
+        if stack is None:
+            stack = self.__state.stack = []
+        profile = self.__start_cprofile() if not stack else None
+
+        stack.append([0.0, 0.0])  # 内側のステージの経過時間とCPU時間
+        wall_start = time.perf_counter()
+        cpu_start = time.thread_time()
+        try:
+            yield
+        finally:
+            wall = time.perf_counter() - wall_start
+            cpu = time.thread_time() - cpu_start
+            inner_wall, inner_cpu = stack.pop()
+            if stack:
+                stack[-1][0] += wall
+                stack[-1][1] += cpu
+            if profile is not None:
+                profile.disable()
+            self.__add(name, wall - inner_wall, cpu - inner_cpu)
+
+    def bind(self, func: Callable, name: Optional[str] = None) -> Callable:
+        '''呼び出し元スレッドで処理中の日記を引き継いで func を実行する関数を作成します
+
+        ワーカースレッドへ投入する処理に利用します
+
+        :param func: 実行する関数
+        :param name: ステージ名。指定した場合は func の実行をそのステージとして集計します
+        :return: func を包んだ関数。無効な場合は func そのもの
+        '''
+        if not self.__enabled:
+            return func
+
+        diary_id = self.current_diary
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with self.diary(diary_id):
+                if name is None:
+                    return func(*args, **kwargs)
+                with self.stage(name):
+                    return func(*args, **kwargs)
+
+        return wrapper
+
+    def __start_cprofile(self) -> Optional[cProfile.Profile]:
+        '''呼び出し元スレッドの cProfile を開始します'''
+        if not self.__cprofile:
+            return None
+
+        profile = getattr(self.__state, 'profile', None)
+        if profile is None:
+            profile = self.__state.profile = cProfile.Profile()
+            with self.__lock:
+                self.__profiles.append(profile)
+        try:
+            profile.enable()
+        except ValueError:  # Python 3.12 以降は同時に一つのプロファイラしか有効にできない
+            return None
+        return profile
+
+    def __add(self, name: str, wall: float, cpu: float) -> None:
+        '''集計に加えます'''
+        diary_id = self.current_diary
+        with self.__lock:
+            self.__totals.setdefault(name, StageTime()).add(wall, cpu)
+            if diary_id is not None:
+                self.__diaries.setdefault(diary_id, {}).setdefault(name, StageTime()).add(wall, cpu)
+
+    def totals(self) -> Dict[str, dict]:
+        '''ステージごとの合計
+
+        :return: ステージ名をキーとする辞書
+        '''
+        with self.__lock:
+            return {name: stage_time.to_dict() for name, stage_time in self.__totals.items()}
+
+    def diaries(self) -> Dict[str, Dict[str, dict]]:
+        '''日記ごと、ステージごとの合計
+
+        :return: 日記IDをキーとする辞書
+        '''
+        with self.__lock:
+            return {diary_id: {name: stage_time.to_dict() for name, stage_time in stages.items()}
+                    for diary_id, stages in self.__diaries.items()}
+
+    def report(self, top: int = DEFAULT_TOP) -> str:
+        '''集計結果の表を作成します
+
+        :param top: 表示する日記の数。経過時間の合計が長い順に表示します
+        :return: 表
+        '''
+        totals = self.totals()
+        names = [name for name in STAGES if name in totals] + sorted(set(totals) - set(STAGES))
+
+        lines = ['{:<10} {:>10} {:>10} {:>8}'.format('stage', 'wall(s)', 'cpu(s)', 'calls')]
+        for name in names:
+            lines.append('{:<10} {:>10.3f} {:>10.3f} {:>8}'.format(name, totals[name]['wall'], totals[name]['cpu'],
+                                                                   totals[name]['calls']))
+
+        diaries = self.diaries()
+        slowest = sorted(diaries.items(), key=lambda item: -sum(stage['wall'] for stage in item[1].values()))[:top]
+        if slowest:
+            lines.append('')
+            lines.append('{:<10} {:>8} '.format('diary_id', 'wall(s)') + ' '.join('{:>9}'.format(name) for name in names))
+            for diary_id, stages in slowest:
+                lines.append('{:<10} {:>8.3f} '.format(diary_id, sum(stage['wall'] for stage in stages.values())) +
+                             ' '.join('{:>9.3f}'.format(stages[name]['wall'] if name in stages else 0.0) for name in names))
+
+        return '\n'.join(lines)
+
+    def write_json(self, file: TextIO) -> None:
+        '''集計結果をJSONで書き込みます
+
+        :param file: 書き込み先のファイル
+        :raises OSError: ファイルの書き込みに失敗した場合
+        '''
+        json.dump({'totals': self.totals(), 'diaries': self.diaries()}, file, ensure_ascii=False, indent=2)
+
+    def dump_stats(self, file_name: str) -> bool:
+        '''cProfile のプロファイルをまとめて pstats 形式で書き出します
+
+        :param file_name: 出力先ファイル名
+        :return: 書き出した場合 True。プロファイルが無い場合は False
+        :raises OSError: ファイルの書き込みに失敗した場合
+        '''
+        with self.__lock:
+            profiles = list(self.__profiles)
+        if not profiles:
+            return False
+
+        stats = pstats.Stats(profiles[0])
+        for profile in profiles[1:]:
+            stats.add(profile)
+        stats.dump_stats(file_name)
+        return True
+
+
+class StageWriter:  # pylint: disable=R0903
+    '''ファイルへの書き込みをステージとして集計するためのラッパー'''
+
+    def __init__(self, file: TextIO, stage_profiler: StageProfiler, name: str = WRITE):
+        '''
+        :param file: 書き込み先のファイル
+        :param stage_profiler: プロファイラ
+        :param name: ステージ名
+        '''
+        self.__file = file
+        self.__profiler = stage_profiler
+        self.__name = name
+
+    def write(self, text: str) -> int:
+        '''書き込みます'''
+        with self.__profiler.stage(self.__name):
+            return self.__file.write(text)
+
+
+_profiler = StageProfiler()
+
+
+def profiler() -> StageProfiler:
+    '''現在のプロファイラ'''
+    return _profiler
+
+
+def set_profiler(new_profiler: StageProfiler) -> None:
+    '''プロファイラを設定します
+
+    :param new_profiler: プロファイラ
+    '''
+    global _profiler  # pylint: disable=W0603
+
+    _profiler = new_profiler
@@ -0,0 +1,174 @@
+'''流量制御モジュール
+
+T'sLove へのリクエストの間隔をトークンバケットで制御します
+
+補充速度(1分あたりのリクエスト数)はAIMDで調整します
+
+- 正常なレスポンスが返るたびに一定量ずつ増やします(上限まで)
+- 応答時間が普段より大幅に遅い場合は少し減らします
+- 再試行が発生した場合(エラーステータス、Content-Type の不一致、
+  ページが表示できませんでした)は半分に減らします
+'''
+
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+PAGE = 'page'
+IMAGE = 'image'
+
+DEFAULT_PAGE_RPM = 3
+DEFAULT_MAX_PAGE_RPM = 12
+DEFAULT_IMAGE_RPM = 60
+DEFAULT_MAX_IMAGE_RPM = 240
+
+FAILURE_DECREASE = 0.5
+SLOW_DECREASE = 0.8
+SLOW_FACTOR = 3.0
+LATENCY_SMOOTHING = 0.3
+
+
+class TokenBucket:
+    '''AIMDで補充速度を調整するトークンバケット
+
+    複数のスレッドから同時に利用できます
+    '''
+
+    def __init__(self, rpm: float, max_rpm: float, min_rpm: float = 1.0, increase: float = 1.0, burst: int = 1,  # pylint: disable=R0913
+                 clock: Callable[[], float] = time.monotonic, sleep: Callable[[float], None] = time.sleep):
+        '''
+        :param rpm: 初期の補充速度(1分あたりのリクエスト数)
+        :param max_rpm: 補充速度の上限
+        :param min_rpm: 補充速度の下限
+        :param increase: 正常なレスポンス1回あたりの補充速度の増加量
+        :param burst: 待たずに連続して発行できるリクエスト数(バケットの容量)
+        :param clock: 時刻を返す関数
+        :param sleep: 待機を行う関数
+        '''
+        if not 0 < min_rpm <= max_rpm:
+            raise ValueError('0 < min_rpm <= max_rpm is required.')
+        if burst < 1:
+            raise ValueError('burst must be positive.')
+
+        self.__max_rpm = max_rpm
+        self.__min_rpm = min_rpm
+        self.__rpm = min(max(rpm, min_rpm), max_rpm)
+        self.__increase = increase
+        self.__clock = clock
+        self.__sleep = sleep
+
+        self.__burst = float(burst)
+        self.__tokens = self.__burst  # 最初のリクエストは待たずに発行する
+        self.__updated = clock()
+        self.__latency: Optional[float] = None
+        self.__base_latency: Optional[float] = None
+        self.__lock = threading.Lock()
+
+    @property
+    def rpm(self) -> float:
+        '''現在の補充速度(1分あたりのリクエスト数)'''
+        return self.__rpm
+
+    @property
+    def max_rpm(self) -> float:
+        '''補充速度の上限'''
+        return self.__max_rpm
+
+    @max_rpm.setter
+    def max_rpm(self, value: float) -> None:
+        '''上限が下限を下回る場合は下限も合わせて下げます'''
+        if value <= 0:
+            raise ValueError('max_rpm must be positive.')
+        with self.__lock:
+            self.__max_rpm = value
+            self.__min_rpm = min(self.__min_rpm, value)
+            self.__rpm = min(self.__rpm, value)
+
+    def __refill(self) -> None:
+        '''経過時間に応じてトークンを補充します。ロックを取得した状態で呼び出します'''
+        now = self.__clock()
+        self.__tokens = min(self.__burst, self.__tokens + (now - self.__updated) * self.__rpm / 60)
+        self.__updated = now
+
+    def acquire(self) -> float:
+        '''トークンを一つ取得します
+
+        トークンが無い場合は補充されるまで待機します
+
+        :return: 待機した秒数
+        '''
+        with self.__lock:
+            self.__refill()
+            self.__tokens -= 1
+            wait = -self.__tokens * 60 / self.__rpm if self.__tokens < 0 else 0.0
+
+        if wait > 0:
+            self.__sleep(wait)
+        return wait
+
+    def success(self, latency: float) -> None:
+        '''正常なレスポンスを記録して補充速度を調整します
+
+        :param latency: 応答時間(秒)
+        '''
+        with self.__lock:
+            self.__refill()
+            if self.__latency is None:
+                self.__latency = latency
+            else:
+                self.__latency += (latency - self.__latency) * LATENCY_SMOOTHING
+            if self.__base_latency is None or self.__latency < self.__base_latency:
+                self.__base_latency = self.__latency
+
+            if latency > self.__base_latency * SLOW_FACTOR:
+                self.__rpm = max(self.__min_rpm, self.__rpm * SLOW_DECREASE)
+            else:
+                self.__rpm = min(self.__max_rpm, self.__rpm + self.__increase)
+
+    def failure(self) -> None:
+        '''再試行の発生を記録して補充速度を下げます'''
+        with self.__lock:
+            self.__refill()
+            self.__rpm = max(self.__min_rpm, self.__rpm * FAILURE_DECREASE)
+
+
+class RateController:
+    '''エンドポイントの種別(PAGE, IMAGE)ごとのトークンバケットを管理します'''
+
+    def __init__(self, buckets: Dict[str, TokenBucket] = None):
+        '''
+        :param buckets: 種別ごとのトークンバケット。省略した場合は既定値で作成します
+        '''
+        if buckets is None:
+            buckets = {
+                PAGE: TokenBucket(DEFAULT_PAGE_RPM, DEFAULT_MAX_PAGE_RPM, min_rpm=1.0, increase=1.0, burst=3),
+                IMAGE: TokenBucket(DEFAULT_IMAGE_RPM, DEFAULT_MAX_IMAGE_RPM, min_rpm=6.0, increase=10.0, burst=10),
+            }
+        self.__buckets = buckets
+
+    def __getitem__(self, kind: str) -> TokenBucket:
+        '''種別に対応するトークンバケット'''
+        return self.__buckets[kind]
+
+    def acquire(self, kind: str) -> float:
+        '''種別に対応するトークンを取得します
+
+        :param kind: PAGE もしくは IMAGE
+        :return: 待機した秒数
+        '''
+        return self.__buckets[kind].acquire()
+
+    def success(self, kind: str, latency: float) -> None:
+        '''正常なレスポンスを記録します
+
+        :param kind: PAGE もしくは IMAGE
+        :param latency: 応答時間(秒)
+        '''
+        self.__buckets[kind].success(latency)
+
+    def failure(self, kind: str) -> None:
+        '''再試行の発生を記録します
+
+        :param kind: PAGE もしくは IMAGE
+        '''
+        self.__buckets[kind].failure()
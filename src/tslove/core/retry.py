@@ -0,0 +1,227 @@
+'''再試行モジュール
+
+T'sLove へのリクエストの再試行の方針(RetryPolicy)を定めます
+
+- 待機時間は再試行のたびに指数的に延ばし、ゆらぎ(ジッター)を加えます
+- Retry-After ヘッダがある場合はその時間以上待機します
+- 再試行の対象とするステータスと例外を指定できます
+- 再試行の予算(RetryBudget)を共有すると、一定時間内の再試行の数をリクエストの数に応じて制限します
+
+再試行の回数は取得処理ごとの RetryState で数えるため、一つの RetryPolicy を複数のスレッドで共有できます
+'''
+
+import random
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Callable, Deque, FrozenSet, Optional, Tuple, Type
+
+import requests
+
+from tslove.core.exception import RequestError, RetryCountExceededError, RetryBudgetExceededError, UnexpectedStatusError
+
+DEFAULT_MAX_ATTEMPTS = 10
+DEFAULT_BASE_DELAY = 10.0
+DEFAULT_MULTIPLIER = 1.5
+DEFAULT_MAX_DELAY = 300.0
+DEFAULT_JITTER = 0.5
+
+RETRY_STATUSES = frozenset({408, 425, 429} | set(range(500, 600)))
+RETRY_EXCEPTIONS: Tuple[Type[BaseException], ...] = (requests.ConnectionError, requests.Timeout,
+                                                      requests.exceptions.ChunkedEncodingError)
+
+DEFAULT_BUDGET_RATIO = 0.5
+DEFAULT_BUDGET_MIN_RETRIES = 30
+DEFAULT_BUDGET_WINDOW = 600.0
+
+
+def parse_retry_after(value: Optional[str], now: Optional[datetime] = None) -> Optional[float]:
+    '''Retry-After ヘッダの値を秒数に変換します
+
+    :param value: ヘッダの値(秒数もしくは HTTP-date)
+    :param now: 現在時刻。省略した場合は現在のUTC時刻
+    :return: 待機する秒数。値が無いか解釈できない場合は None
+    '''
+    if not value:
+        return None
+
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - (now or datetime.now(timezone.utc))).total_seconds())
+
+
+class RetryBudget:
+    '''再試行の予算
+
+    直近 window 秒間の再試行の数を min_retries + ratio × リクエストの数 までに制限します
+    障害で多くのリクエストが失敗した際に再試行がリクエストを増やし続けるのを防ぎます
+
+    複数のスレッドから同時に利用できます
+    '''
+
+    def __init__(self, ratio: float = DEFAULT_BUDGET_RATIO, min_retries: int = DEFAULT_BUDGET_MIN_RETRIES,
+                 window: float = DEFAULT_BUDGET_WINDOW, clock: Callable[[], float] = time.monotonic):
+        '''
+        :param ratio: リクエスト1件あたりに認める再試行の数
+        :param min_retries: リクエストの数によらず認める再試行の数
+        :param window: 数える期間(秒)
+        :param clock: 時刻を返す関数
+        '''
+        if ratio < 0 or min_retries < 0 or window <= 0:
+            raise ValueError('ratio and min_retries must not be negative and window must be positive.')
+
+        self.__ratio = ratio
+        self.__min_retries = min_retries
+        self.__window = window
+        self.__clock = clock
+        self.__requests: Deque[float] = deque()
+        self.__retries: Deque[float] = deque()
+        self.__lock = threading.Lock()
+
+    def __expire(self, now: float) -> None:
+        '''期間外の記録を捨てます。ロックを取得した状態で呼び出します'''
+        for records in (self.__requests, self.__retries):
+            while records and records[0] <= now - self.__window:
+                records.popleft()
+
+    def record_request(self) -> None:
+        '''再試行ではないリクエストを記録します'''
+        now = self.__clock()
+        with self.__lock:
+            self.__expire(now)
+            self.__requests.append(now)
+
+    def try_retry(self) -> bool:
+        '''予算の範囲内であれば再試行を記録します
+
+        :return: 再試行してよい場合 True
+        '''
+        now = self.__clock()
+        with self.__lock:
+            self.__expire(now)
+            if len(self.__retries) >= self.__min_retries + self.__ratio * len(self.__requests):
+                return False
+            self.__retries.append(now)
+            return True
+
+
+@dataclass(frozen=True)
+class RetryPolicy:  # pylint: disable=R0902
+    '''再試行の方針
+
+    n 回目の再試行の前に base_delay × multiplier^(n-1) 秒(上限 max_delay)待機します
+    jitter が 0.5 の場合、待機時間はその 50%～100% の間でばらつきます
+    '''
+    max_attempts: int = DEFAULT_MAX_ATTEMPTS
+    base_delay: float = DEFAULT_BASE_DELAY
+    multiplier: float = DEFAULT_MULTIPLIER
+    max_delay: float = DEFAULT_MAX_DELAY
+    jitter: float = DEFAULT_JITTER
+    retry_statuses: FrozenSet[int] = RETRY_STATUSES
+    retry_exceptions: Tuple[Type[BaseException], ...] = RETRY_EXCEPTIONS
+    budget: Optional[RetryBudget] = None
+    random_source: Callable[[], float] = field(default=random.random, repr=False)
+
+    def __post_init__(self):
+        if self.max_attempts < 1:
+            raise ValueError('max_attempts must be positive.')
+        if self.base_delay < 0 or self.max_delay < 0 or self.multiplier < 1:
+            raise ValueError('delays must not be negative and multiplier must be 1 or more.')
+        if not 0 <= self.jitter <= 1:
+            raise ValueError('jitter must be between 0 and 1.')
+
+    def start(self) -> 'RetryState':
+        '''取得処理を一つ始めます
+
+        :return: 取得処理ごとの再試行の状態
+        '''
+        if self.budget is not None:
+            self.budget.record_request()
+        return RetryState(self)
+
+    def backoff(self, retry_number: int) -> float:
+        '''n 回目の再試行の前に待機する秒数
+
+        :param retry_number: 再試行の番号(1から)
+        :return: 秒数
+        '''
+        delay = min(self.max_delay, self.base_delay * self.multiplier ** (retry_number - 1))
+        return delay * (1 - self.jitter * self.random_source())
+
+    def is_retriable_status(self, status: int) -> bool:
+        '''再試行の対象とするステータスの場合 True'''
+        return status in self.retry_statuses
+
+    def is_retriable_error(self, error: BaseException) -> bool:
+        '''再試行の対象とする例外の場合 True'''
+        return isinstance(error, self.retry_exceptions)
+
+
+class RetryState:
+    '''取得処理一つ分の再試行の状態
+
+    RetryPolicy.start で作成します。複数のスレッドで共有しないでください
+    '''
+
+    def __init__(self, policy: RetryPolicy):
+        '''
+        :param policy: 再試行の方針
+        '''
+        self.__policy = policy
+        self.__failures = 0
+        self.__delay = 0.0
+
+    @property
+    def retries(self) -> int:
+        '''これまでに失敗した回数。次のリクエストが何回目の再試行にあたるか'''
+        return self.__failures
+
+    @property
+    def delay(self) -> float:
+        '''次のリクエストの前に待機する秒数'''
+        return self.__delay
+
+    def failed(self, status: Optional[int] = None, error: Optional[BaseException] = None,
+               retry_after: Optional[str] = None) -> float:
+        '''失敗を記録して次の再試行までの待機時間を決めます
+
+        status と error のどちらも指定しない場合は、内容の不正(Content-Type の不一致や
+        エラーページ)による失敗として常に再試行の対象とします
+
+        :param status: レスポンスのステータス
+        :param error: リクエストで発生した例外
+        :param retry_after: Retry-After ヘッダの値
+        :return: 待機する秒数
+        :raises UnexpectedStatusError: 再試行の対象でないステータスの場合
+        :raises RequestError: 再試行の対象でない例外の場合
+        :raises RetryCountExceededError: 再試行の回数が上限に達した場合
+        :raises RetryBudgetExceededError: 再試行の予算を使い切った場合
+        '''
+        if status is not None and not self.__policy.is_retriable_status(status):
+            raise UnexpectedStatusError(status)
+        if error is not None and not self.__policy.is_retriable_error(error):
+            raise RequestError from error
+
+        self.__failures += 1
+        if self.__failures >= self.__policy.max_attempts:
+            raise RetryCountExceededError() from error
+        if self.__policy.budget is not None and not self.__policy.budget.try_retry():
+            raise RetryBudgetExceededError() from error
+
+        delay = self.__policy.backoff(self.__failures)
+        wait = parse_retry_after(retry_after)
+        if wait is not None:
+            delay = min(self.__policy.max_delay, max(delay, wait))
+        self.__delay = delay
+        return delay
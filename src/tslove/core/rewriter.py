@@ -0,0 +1,79 @@
+'''書き換えモジュール
+
+パース済みのツリーを一度だけ走査して、タグ名ごとに登録されたルールを適用します
+'''
+
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from bs4 import BeautifulSoup, Tag  # type: ignore
+
+REMOVE = 'remove'
+UNWRAP = 'unwrap'
+
+Rule = Callable[[Tag], Optional[str]]
+
+
+class TreeRewriter:
+    '''ツリーを一度だけ走査してルールを適用する書き換えエンジン
+
+    ルールはタグを受け取り、タグを書き換えた上で以下のいずれかを返します
+
+    - None: タグを残して子孫の走査を続けます
+    - REMOVE: タグを子孫ごと取り除きます。子孫は走査されません
+    - UNWRAP: 子孫を走査した後でタグを取り除き、子孫をその位置に残します
+
+    同じタグに対するルールは登録順に適用され、REMOVEを返したルール以降は適用されません
+    '''
+
+    def __init__(self):
+        self.__rules: Dict[str, List[Rule]] = {}
+
+    def add_rule(self, name: str, rule: Rule) -> None:
+        '''ルールを登録します
+
+        :param name: ルールを適用するタグ名
+        :param rule: ルール
+        '''
+        self.__rules.setdefault(name, []).append(rule)
+
+    def __apply(self, tag: Tag) -> Optional[str]:
+        '''タグにルールを適用します
+
+        :param tag: タグ
+        :return: REMOVE, UNWRAP もしくは None
+        '''
+        result = None
+        for rule in self.__rules.get(tag.name, []):
+            action = rule(tag)
+            if action == REMOVE:
+                return REMOVE
+            if action == UNWRAP:
+                result = UNWRAP
+        return result
+
+    def rewrite(self, soup: BeautifulSoup) -> None:
+        '''ツリーを文書順に走査してルールを適用します
+
+        :param soup: 書き換えるツリー
+        '''
+        stack: List[Tuple[Iterator, Optional[Tag]]] = [(iter(list(soup.contents)), None)]
+
+        while stack:
+            children, unwrap_tag = stack[-1]
+            child = next(children, None)
+
+            if child is None:
+                stack.pop()
+                if unwrap_tag is not None:
+                    unwrap_tag.unwrap()
+                continue
+
+            if not isinstance(child, Tag):
+                continue
+
+            action = self.__apply(child)
+            if action == REMOVE:
+                child.decompose()
+                continue
+
+            stack.append((iter(list(child.contents)), child if action == UNWRAP else None))
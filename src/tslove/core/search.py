@@ -0,0 +1,252 @@
+'''全文検索モジュール
+
+日記の本文とコメントを文字のバイグラム(連続する2文字)で転置索引に登録し、SQLite に保存します
+形態素解析を使わないため、日本語の文章もそのまま検索できます
+
+検索語はすべてのバイグラムを含む日記を索引から絞り込んだ後、本文に検索語が含まれるかを確認します
+'''
+
+import datetime
+import json
+import re
+import sqlite3
+import unicodedata
+from typing import Dict, Iterable, List, Optional, Set, TextIO
+
+from bs4 import BeautifulSoup  # type: ignore
+
+SEARCH_INDEX_FILE_NAME = 'search.sqlite3'
+DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+SNIPPET_CONTEXT = 30
+SQL_BATCH_SIZE = 500
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS document (
+    diary_id INTEGER PRIMARY KEY,
+    title TEXT NOT NULL,
+    date TEXT NOT NULL,
+    text TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS posting (
+    gram TEXT NOT NULL,
+    diary_id INTEGER NOT NULL,
+    PRIMARY KEY (gram, diary_id)
+) WITHOUT ROWID;
+'''
+
+WHITESPACE_PATTERN = re.compile(r'\s+')
+
+
+def normalize(text: str) -> str:
+    '''検索用に文字列を正規化します
+
+    全角英数字を半角に、英字を小文字に揃え、連続する空白を一つの空白にまとめます
+
+    :param text: 文字列
+    :return: 正規化した文字列
+    '''
+    return WHITESPACE_PATTERN.sub(' ', unicodedata.normalize('NFKC', text).lower()).strip()
+
+
+def bigrams(text: str) -> Set[str]:
+    '''正規化した文字列のバイグラムを求めます
+
+    空白を含むバイグラムは除きます
+
+    :param text: 正規化した文字列
+    :return: バイグラムの集合
+    '''
+    return {text[i:i + 2] for i in range(len(text) - 1) if ' ' not in text[i:i + 2]}
+
+
+def extract_diary_text(soup: BeautifulSoup) -> str:
+    '''日記ページから検索の対象とする文字列を取り出します
+
+    日記のタイトルと本文、コメントの投稿者と本文が対象です。スクリプトは含みません
+    取得したページとダンプしたページのどちらからも取り出せます
+
+    :param soup: 日記ページのツリー
+    :return: 検索の対象とする文字列
+    '''
+    texts = []
+    detail_div_tag = soup.find('div', class_='diaryDetailBox')
+    if detail_div_tag and detail_div_tag.dl and detail_div_tag.dl.dd:
+        texts.append(detail_div_tag.dl.dd)
+
+    comment_div_tag = soup.find('div', id='commentList')
+    if comment_div_tag:
+        texts.extend(dl_tag.dd for dl_tag in comment_div_tag.find_all('dl') if dl_tag.dd)
+
+    strings = []
+    for tag in texts:
+        strings.extend(string for string in tag.find_all(string=True)
+                       if string.parent.name not in ('script', 'style') and string.strip())
+    return ' '.join(strings)
+
+
+class SearchIndex:
+    '''バイグラムによる全文検索の索引
+
+    日記は update するたびにコミットされ、登録済みの日記は置き換えられます
+    作成したスレッドからのみ利用できます
+    '''
+
+    def __init__(self, file_name: str):
+        '''
+        :param file_name: データベースファイル名。':memory:' も指定できます
+        :raises sqlite3.Error: データベースを開けない場合
+        '''
+        self.__connection = sqlite3.connect(file_name)
+        self.__connection.execute('PRAGMA journal_mode=WAL')
+        self.__connection.execute('PRAGMA synchronous=NORMAL')
+        self.__connection.executescript(SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self) -> int:
+        return self.__connection.execute('SELECT COUNT(*) FROM document').fetchone()[0]
+
+    def __contains__(self, diary_id: object) -> bool:
+        row = self.__connection.execute('SELECT 1 FROM document WHERE diary_id = ?', (int(str(diary_id)),)).fetchone()
+        return row is not None
+
+    def close(self) -> None:
+        '''データベースを閉じます'''
+        self.__connection.close()
+
+    def update(self, diary_id: str, title: str, date: datetime.datetime, text: str) -> None:
+        '''日記を索引に登録します。登録済みの場合は置き換えます
+
+        :param diary_id: 日記ID
+        :param title: タイトル
+        :param date: 日時
+        :param text: 検索の対象とする文字列 (extract_diary_text で取り出したもの)
+        '''
+        normalized = normalize(title + ' ' + text)
+        new_grams = bigrams(normalized)
+
+        with self.__connection:
+            row = self.__connection.execute('SELECT text FROM document WHERE diary_id = ?', (int(diary_id),)).fetchone()
+            old_grams = bigrams(row[0]) if row else set()
+
+            self.__connection.executemany('DELETE FROM posting WHERE gram = ? AND diary_id = ?',
+                                          ((gram, int(diary_id)) for gram in old_grams - new_grams))
+            self.__connection.executemany('INSERT OR IGNORE INTO posting (gram, diary_id) VALUES (?, ?)',
+                                          ((gram, int(diary_id)) for gram in new_grams - old_grams))
+            self.__connection.execute('INSERT OR REPLACE INTO document (diary_id, title, date, text) VALUES (?, ?, ?, ?)',
+                                      (int(diary_id), title, date.strftime(DATE_FORMAT), normalized))
+
+    def remove(self, diary_id: str) -> None:
+        '''日記を索引から取り除きます
+
+        :param diary_id: 日記ID
+        '''
+        with self.__connection:
+            row = self.__connection.execute('SELECT text FROM document WHERE diary_id = ?', (int(diary_id),)).fetchone()
+            if row is None:
+                return
+            self.__connection.executemany('DELETE FROM posting WHERE gram = ? AND diary_id = ?',
+                                          ((gram, int(diary_id)) for gram in bigrams(row[0])))
+            self.__connection.execute('DELETE FROM document WHERE diary_id = ?', (int(diary_id),))
+
+    def __candidates(self, terms: Iterable[str]) -> Optional[Set[int]]:
+        '''検索語のバイグラムをすべて含む日記IDを求めます
+
+        :return: 日記IDの集合。バイグラムを作れない検索語だけの場合は None
+        '''
+        candidates: Optional[Set[int]] = None
+        grams = set()
+        for term in terms:
+            grams |= bigrams(term)
+
+        for gram in sorted(grams, key=self.__frequency):
+            ids = {row[0] for row in self.__connection.execute('SELECT diary_id FROM posting WHERE gram = ?', (gram,))}
+            candidates = ids if candidates is None else candidates & ids
+            if not candidates:
+                break
+
+        return candidates
+
+    def __frequency(self, gram: str) -> int:
+        '''バイグラムを含む日記の数'''
+        return self.__connection.execute('SELECT COUNT(*) FROM posting WHERE gram = ?', (gram,)).fetchone()[0]
+
+    def search(self, query: str, limit: Optional[int] = None) -> List[dict]:
+        '''日記を検索します
+
+        空白で区切った検索語をすべて含む日記を新しい順に返します
+
+        :param query: 検索語
+        :param limit: 返す日記の最大数。None の場合はすべて
+        :return: diary_id, title, date (datetime), snippet をキーとする辞書のリスト
+        '''
+        terms = [term for term in normalize(query).split(' ') if term]
+        if not terms:
+            return []
+
+        candidates = self.__candidates(terms)
+        if candidates is not None and not candidates:
+            return []
+
+        columns = 'SELECT diary_id, title, date, text FROM document'
+        if candidates is None:
+            rows = self.__connection.execute(columns + ' ORDER BY date DESC, diary_id DESC').fetchall()
+        else:
+            ids = sorted(candidates)
+            rows = []
+            for start in range(0, len(ids), SQL_BATCH_SIZE):
+                batch = ids[start:start + SQL_BATCH_SIZE]
+                sql = columns + ' WHERE diary_id IN ({})'.format(', '.join('?' * len(batch)))
+                rows.extend(self.__connection.execute(sql, batch))
+            rows.sort(key=lambda row: (row[2], row[0]), reverse=True)
+
+        results = []
+        for diary_id, title, date, text in rows:
+            if not all(term in text for term in terms):
+                continue
+            results.append({
+                'diary_id': str(diary_id),
+                'title': title,
+                'date': datetime.datetime.strptime(date, DATE_FORMAT),
+                'snippet': self.__snippet(text, terms[0])
+            })
+            if limit is not None and len(results) >= limit:
+                break
+
+        return results
+
+    @staticmethod
+    def __snippet(text: str, term: str) -> str:
+        '''検索語の前後の文字列を切り出します'''
+        position = text.find(term)
+        start = max(position - SNIPPET_CONTEXT, 0)
+        end = min(position + len(term) + SNIPPET_CONTEXT, len(text))
+        return ('…' if start > 0 else '') + text[start:end] + ('…' if end < len(text) else '')
+
+    def export_json(self, file: TextIO) -> None:
+        '''ブラウザから検索するための索引をJSONで書き出します
+
+        diaries は [日記ID, 日付, タイトル] のリスト、bigrams はバイグラムから diaries の位置のリストへの辞書です
+        本文は含まないため、ブラウザでの検索はバイグラムによる絞り込みのみとなります
+
+        :param file: 書き込み先のファイル
+        :raises OSError: ファイルの書き込みに失敗した場合
+        '''
+        diaries = []
+        positions: Dict[int, int] = {}
+        for diary_id, title, date in self.__connection.execute('SELECT diary_id, title, date FROM document '
+                                                               'ORDER BY date DESC, diary_id DESC'):
+            positions[diary_id] = len(diaries)
+            diaries.append([str(diary_id), date[:10], title])
+
+        postings: Dict[str, List[int]] = {}
+        for gram, diary_id in self.__connection.execute('SELECT gram, diary_id FROM posting'):
+            postings.setdefault(gram, []).append(positions[diary_id])
+        for position_list in postings.values():
+            position_list.sort()
+
+        json.dump({'diaries': diaries, 'bigrams': postings}, file, ensure_ascii=False, separators=(',', ':'))
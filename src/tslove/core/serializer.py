@@ -0,0 +1,124 @@
+'''HTML出力モジュール
+
+パース済みのツリーを文書全体の文字列を組み立てずに少しずつファイルへ書き出します
+
+出力の形式は以下のいずれかです
+
+- COMPATIBLE: soup.prettify() と同じ出力です (字下げあり)
+- COMPACT: 字下げを行わずに出力します。str(soup) と同じ出力です
+'''
+
+from typing import Iterator, List, TextIO, Union
+
+from bs4 import Tag, NavigableString  # type: ignore
+from bs4.element import DEFAULT_OUTPUT_ENCODING  # type: ignore
+from bs4.formatter import Formatter  # type: ignore
+
+COMPATIBLE = 'compatible'
+COMPACT = 'compact'
+MODES = (COMPATIBLE, COMPACT)
+
+DEFAULT_CHUNK_SIZE = 64 * 1024
+
+
+def _can_stream(tag: Tag) -> bool:
+    '''ツリーを少しずつ出力できるか判定します
+
+    BeautifulSoup 4.13 以降の走査APIが無い場合とXML文書の場合は一度に出力します
+
+    走査APIと _format_tag, _should_pretty_print は BeautifulSoup の非公開APIです
+    setup.cfg の install_requires では動作を確認した範囲 (4.13 以上 4.16 未満) に固定しています
+    範囲を広げる場合は test_serializer.py で prettify() と同じ出力になることを確認してください
+    '''
+    return hasattr(tag, '_event_stream') and hasattr(tag, '_format_tag') and not getattr(tag, 'is_xml', False)
+
+
+def iterate_html(tag: Tag, mode: str = COMPATIBLE, formatter: Union[str, Formatter] = 'html') -> Iterator[str]:
+    '''ツリーを出力する文字列を先頭から順に返します
+
+    :param tag: 出力するツリー
+    :param mode: 出力の形式 (COMPATIBLE または COMPACT)
+    :param formatter: BeautifulSoupのフォーマッターあるいはその名前
+    :return: 出力する文字列のイテレータ
+    :raises ValueError: 出力の形式が不正な場合
+    '''
+    if mode not in MODES:
+        raise ValueError('Unknown output mode {}.'.format(mode))
+
+    if not _can_stream(tag):
+        if mode == COMPATIBLE:
+            yield tag.prettify(formatter=formatter)
+        else:
+            yield tag.decode(formatter=formatter)
+        return
+
+    if not isinstance(formatter, Formatter):
+        formatter = tag.formatter_for_name(formatter)
+
+    # Tag.decode と同じ規則で字下げします
+    # 字下げできないタグ(pre など)の内側では文字列をそのまま出力します
+    indent_level = 0 if mode == COMPATIBLE else None
+    literal_tag = None
+
+    for event, element in tag._event_stream():  # pylint: disable=W0212
+        if event is Tag.END_ELEMENT_EVENT:
+            piece = element._format_tag(DEFAULT_OUTPUT_ENCODING, formatter, opening=False)  # pylint: disable=W0212
+            if indent_level is not None:
+                indent_level -= 1
+        elif event is Tag.STRING_ELEMENT_EVENT:
+            piece = element.output_ready(formatter)
+        else:
+            piece = element._format_tag(DEFAULT_OUTPUT_ENCODING, formatter, opening=True)  # pylint: disable=W0212
+
+        if indent_level is None:
+            yield piece
+            continue
+
+        indent_before = indent_after = literal_tag is None
+        if event is Tag.START_ELEMENT_EVENT and literal_tag is None and not element._should_pretty_print():  # pylint: disable=W0212
+            indent_after = False
+            literal_tag = element
+        elif event is Tag.END_ELEMENT_EVENT and element is literal_tag:
+            indent_before = False
+            indent_after = True
+            literal_tag = None
+
+        if indent_before or indent_after:
+            if isinstance(element, NavigableString):
+                piece = piece.strip()
+            if piece:
+                space_before = formatter.indent * indent_level if indent_before and indent_level else ''
+                piece = space_before + piece + ('\n' if indent_after else '')
+
+        if event is Tag.START_ELEMENT_EVENT:
+            indent_level += 1
+
+        yield piece
+
+
+def write_html(tag: Tag, file: TextIO, mode: str = COMPATIBLE, formatter: Union[str, Formatter] = 'html',
+               chunk_size: int = DEFAULT_CHUNK_SIZE) -> None:
+    '''ツリーをファイルへ書き出します
+
+    出力する文字列は chunk_size 文字程度ずつまとめて書き込みます
+
+    :param tag: 出力するツリー
+    :param file: 書き込み先のファイル
+    :param mode: 出力の形式 (COMPATIBLE または COMPACT)
+    :param formatter: BeautifulSoupのフォーマッターあるいはその名前
+    :param chunk_size: 一度に書き込む文字数の目安
+    :raises ValueError: 出力の形式が不正な場合
+    :raises OSError: ファイルの書き込みに失敗した場合
+    '''
+    pieces: List[str] = []
+    size = 0
+    for piece in iterate_html(tag, mode, formatter):
+        pieces.append(piece)
+        size += len(piece)
+        if size >= chunk_size:
+            file.write(''.join(pieces))
+            pieces.clear()
+            size = 0
+
+    if pieces:
+        file.write(''.join(pieces))
@@ -0,0 +1,108 @@
+'''セッションプールモジュール
+
+アカウントごとにログインしたセッション(TsLoveWeb)を保持します
+
+すべてのセッションで次のものを共有します
+
+- 流量制御 (RateController)
+- 条件付きリクエストに用いる ETag と Last-Modified のキャッシュ (ValidatorCache)
+- リクエストの計測結果 (RequestMetrics)
+- 再試行の方針 (RetryPolicy)
+'''
+
+import threading
+from typing import Dict, List, Optional
+
+from tslove.core.httpcache import ValidatorCache
+from tslove.core.metrics import RequestMetrics
+from tslove.core.ratelimit import RateController
+from tslove.core.retry import RetryPolicy
+from tslove.core.web import TsLoveWeb, DEFAULT_URL, default_retry_policy
+
+DEFAULT_ACCOUNT = 'default'
+
+
+class SessionPool:
+    '''アカウントごとのセッションのプール
+
+    複数のスレッドから同時に利用できます
+    '''
+
+    def __init__(self, url: str = DEFAULT_URL, retry_policy: Optional[RetryPolicy] = None):
+        '''
+        :param url: T'sLove の起点URL
+        :param retry_policy: 再試行の方針。省略した場合は web.RETRY_COUNT, web.RETRY_INTERVAL に従います
+        '''
+        self.__url = url
+        self.__rate = RateController()
+        self.__validators = ValidatorCache()
+        self.__metrics = RequestMetrics()
+        self.__retry_policy = retry_policy if retry_policy is not None else default_retry_policy()
+        self.__clients: Dict[str, TsLoveWeb] = {}
+        self.__lock = threading.Lock()
+
+    def __len__(self):
+        with self.__lock:
+            return len(self.__clients)
+
+    def __contains__(self, account: str) -> bool:
+        with self.__lock:
+            return account in self.__clients
+
+    @property
+    def url(self) -> str:
+        '''T'sLove の起点URL'''
+        return self.__url
+
+    @property
+    def rate_controller(self) -> RateController:
+        '''共有する流量制御'''
+        return self.__rate
+
+    @property
+    def validator_cache(self) -> ValidatorCache:
+        '''共有する ETag と Last-Modified のキャッシュ'''
+        return self.__validators
+
+    @property
+    def metrics(self) -> RequestMetrics:
+        '''共有するリクエストの計測結果'''
+        return self.__metrics
+
+    @property
+    def accounts(self) -> List[str]:
+        '''セッションを作成済みのアカウント。作成順'''
+        with self.__lock:
+            return list(self.__clients)
+
+    @property
+    def total_retries(self) -> int:
+        '''すべてのセッションの再試行の合計'''
+        with self.__lock:
+            clients = list(self.__clients.values())
+        return sum(client.total_retries for client in clients)
+
+    def client(self, account: str = DEFAULT_ACCOUNT) -> TsLoveWeb:
+        '''アカウントのセッションを取得します
+
+        初めて指定されたアカウントの場合はセッションを作成します。ログインは呼び出し元で行います
+
+        :param account: アカウント名
+        :return: TsLoveWeb オブジェクト
+        '''
+        with self.__lock:
+            client = self.__clients.get(account)
+            if client is None:
+                client = self.__clients[account] = TsLoveWeb(self.__url, rate_controller=self.__rate,
+                                                             validator_cache=self.__validators,
+                                                             metrics=self.__metrics,
+                                                             retry_policy=self.__retry_policy)
+            return client
+
+    def close(self) -> None:
+        '''すべてのセッションを閉じます'''
+        with self.__lock:
+            clients = list(self.__clients.values())
+            self.__clients.clear()
+        for client in clients:
+            client.close()
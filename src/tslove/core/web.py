@@ -4,6 +4,8 @@ T'sLove へのログインとコンテンツの取得を行う
 '''
 
 import io
+import os
+import threading
 import warnings
 import time
 import re
@@ -12,53 +14,132 @@ from typing import Optional, Callable
 import requests
 from PIL import Image  # type: ignore
 
-from tslove.core.exception import RequestError, RetryCountExceededError
+from tslove.core.httpcache import ValidatorCache
+from tslove.core.imageinfo import SNIFF_SIZE, is_consistent
+from tslove.core.metrics import RequestMetrics, endpoint_name
+from tslove.core.profiler import profiler, SLEEP
+from tslove.core.ratelimit import PAGE, IMAGE, RateController
+from tslove.core.retry import RetryBudget, RetryPolicy, RetryState
 
 warnings.filterwarnings('ignore', 'Unverified HTTPS request is being made.')
 
+DEFAULT_URL = 'https://tslove.net/'
+
 RETRY_COUNT = 10
 RETRY_INTERVAL = 10
-RETRY_ADDITIONAL = 5
 
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+
+NOT_MODIFIED = 304
+
+USER_AGENT = 'tslove-tools written by T.Kyoko (tslove member_id=45642)'
+
+SESSION_ID_PATTERN = re.compile(r'a=do_inc_page_header_logout&amp;sessid=(?P<session_id>.+)"')
+TITLE_PATTERN = re.compile(r'<title>(?P<title>.+)</title>')
+ERROR_PAGE_TITLE = 'ページが表示できませんでした'
+
+
+def is_valid_page(html: str) -> bool:
+    '''取得したページが正常に表示されたものかを判定します
+
+    タイトルが無いページとエラーページ(ページが表示できませんでした)は不正とします
+
+    :param html: ページの内容
+    :return: 正常なページの場合 True
+    '''
+    result = TITLE_PATTERN.search(html)
+    return bool(result) and result.group('title') != ERROR_PAGE_TITLE
+
+
+def default_retry_policy() -> RetryPolicy:
+    '''RETRY_COUNT, RETRY_INTERVAL の値に従った再試行の方針を作成します
 
-class TsLoveWeb:
-    '''T'sLove webアクセスクラス'''
+    :return: 再試行の予算を持つ RetryPolicy
+    '''
+    return RetryPolicy(max_attempts=RETRY_COUNT, base_delay=RETRY_INTERVAL, budget=RetryBudget())
 
-    __instance = None
-    __instance_initialized = False
 
-    @classmethod
-    def get_instance(cls):
-        '''TsLoveWebのインスタンスを取得する'''
-        if cls.__instance:
-            return cls.__instance
+def find_sns_session_id(html: str) -> Optional[str]:
+    '''ページのログアウトのリンクから session_id を取得します
 
-        return cls()
+    :param html: ページの内容
+    :return: session_id もしくは None
+    '''
+    result = SESSION_ID_PATTERN.search(html)
+    if result:
+        return result.group('session_id')
 
-    def __new__(cls, url: str = ''):  # pylint: disable=W0613
-        if cls.__instance is None:
-            cls.__instance = super(TsLoveWeb, cls).__new__(cls)
-        return cls.__instance
+    return None
 
-    def __init__(self, url: str = 'https://tslove.net/'):
+
+class TsLoveWeb:  # pylint: disable=R0902
+    '''T'sLove webアクセスクラス
+
+    インスタンスごとにセッション(Cookie)を持つため、アカウントごとに作成します
+    流量制御、条件付きリクエストのキャッシュ、計測結果、再試行の方針は
+    引数で渡すことで複数のインスタンスで共有できます。省略した場合はインスタンスごとに作成します
+    '''
+
+    def __init__(self, url: str = DEFAULT_URL, rate_controller: Optional[RateController] = None,  # pylint: disable=R0913
+                 validator_cache: Optional[ValidatorCache] = None, metrics: Optional[RequestMetrics] = None,
+                 retry_policy: Optional[RetryPolicy] = None):
         '''
         :param url: T'sLove の起点URL
+        :param rate_controller: 流量制御
+        :param validator_cache: 条件付きリクエストに用いる ETag と Last-Modified のキャッシュ
+        :param metrics: リクエストの計測結果
+        :param retry_policy: 再試行の方針
         '''
-        if not self.__instance_initialized:
-            self.__url = url
-            self.__session = requests.Session()
-            self.__session.headers.update({
-                'User-Agent': 'tslove-tools written by T.Kyoko (tslove member_id=45642)'})
-            self.__php_session_id: Optional[str] = None
-            self.__sns_session_id: Optional[str] = None
-
-            self.__retry_count = 0
-            self.__total_retries = 0
-            self.__instance_initialized = True
+        self.__url = url
+        self.__session = requests.Session()
+        self.__session.headers.update({'User-Agent': USER_AGENT})
+        self.__php_session_id: Optional[str] = None
+        self.__sns_session_id: Optional[str] = None
+
+        self.__state = threading.local()
+        self.__rate = rate_controller if rate_controller is not None else RateController()
+        self.__validators = validator_cache if validator_cache is not None else ValidatorCache()
+        self.__metrics = metrics if metrics is not None else RequestMetrics()
+        self.__retry_policy = retry_policy if retry_policy is not None else default_retry_policy()
+        self.__total_retries = 0
+        self.__total_retries_lock = threading.Lock()
 
     def __del__(self):
+        self.close()
+
+    def close(self) -> None:
+        '''セッションを閉じます'''
         self.__session.close()
 
+    @property
+    def url(self) -> str:
+        '''T'sLove の起点URL'''
+        return self.__url
+
+    @property
+    def rate_controller(self) -> RateController:
+        '''リクエストの流量制御'''
+        return self.__rate
+
+    @property
+    def validator_cache(self) -> ValidatorCache:
+        '''条件付きリクエストに用いる ETag と Last-Modified のキャッシュ'''
+        return self.__validators
+
+    @property
+    def metrics(self) -> RequestMetrics:
+        '''リクエストの計測結果'''
+        return self.__metrics
+
+    @property
+    def retry_policy(self) -> RetryPolicy:
+        '''再試行の方針'''
+        return self.__retry_policy
+
+    @retry_policy.setter
+    def retry_policy(self, policy: RetryPolicy) -> None:
+        self.__retry_policy = policy
+
     @property
     def php_session_id(self) -> Optional[str]:
         '''PHPSESSID'''
@@ -69,72 +150,138 @@ class TsLoveWeb:
         '''sns_session_id'''
         return self.__sns_session_id
 
+    @property
+    def logged_in(self) -> bool:
+        '''ログイン済みの場合 True'''
+        return self.__sns_session_id is not None
+
     @property
     def total_retries(self) -> int:
         '''total_retries'''
         return self.__total_retries
 
-    def __request(self, request: Callable, message: Callable = None) -> requests.Response:
+    def __request(self, request: Callable, retry: RetryState, message: Callable = None,  # pylint: disable=R0913
+                  kind: str = PAGE, endpoint: str = '', stream: bool = False) -> requests.Response:
         '''T'sLoveへリクエストを発行します
 
-        RETRY_COUNT, RETRY_INTERVAL, RETRY_ADDITIONAL の値に従って
-        再試行を行いながら T'sLove へのリクエストを発行します
+        retry の方針に従って再試行を行いながら T'sLove へのリクエストを発行します
+        retry が既に失敗を記録している場合は、最初のリクエストの前に待機します
+        すべてのリクエストは kind に対応する流量制御のトークンを取得してから発行されます
+        発行したリクエストは endpoint ごとに計測結果へ記録されます
 
         実際のリクエストは引数 request で指定します
         messageが与えられた場合、リトライの発生時にmessageの戻り値をprintします
 
         :param request: リクエストを発行する関数
+        :param retry: 取得処理の再試行の状態
         :param message: リトライメッセージを生成する関数
+        :param kind: 流量制御の種別 PAGE もしくは IMAGE
+        :param endpoint: 計測結果に記録するエンドポイント名
+        :param stream: request がレスポンスボディを逐次読み出す設定の場合 True
         :returns: request.Respose オブジェクト
-        :raises RecuestError: requetsの処理に失敗した場合
+        :raises RecuestError: requetsの処理に失敗し、再試行の対象でない場合
+        :raises UnexpectedStatusError: 再試行の対象でないステータスを受け取った場合
         :raises RetryCountExceededError: リトライ回数が基準を超過した場合
+        :raises RetryBudgetExceededError: 再試行の予算を使い切った場合
 
         '''
-        while self.__retry_count < RETRY_COUNT:
-            if self.__retry_count != 0:
-                interval = RETRY_INTERVAL + (self.__retry_count - 1) * RETRY_ADDITIONAL
+        while True:
+            if retry.retries != 0:
                 if message:
-                    print(message(interval))
-                time.sleep(interval)
-                self.__total_retries += 1
+                    print(message(retry.delay))
+                with profiler().stage(SLEEP):
+                    time.sleep(retry.delay)
+                with self.__total_retries_lock:
+                    self.__total_retries += 1
+            with profiler().stage(SLEEP):
+                self.__rate.acquire(kind)
+            start = time.monotonic()
+            is_retry = retry.retries != 0
             try:
                 response = request()
             except requests.RequestException as err:
-                raise RequestError from err
+                self.__metrics.record(endpoint, None, '', 0, time.monotonic() - start, is_retry)
+                self.__rate.failure(kind)
+                retry.failed(error=err)
+                continue
+            self.__state.latency = time.monotonic() - start
+            self.__metrics.record(endpoint, response.status_code, response.headers.get('Content-Type', ''),
+                                  self.__response_size(response, stream), self.__state.latency, is_retry)
             if response.ok:
                 return response
 
-            self.__retry_count += 1
+            response.close()
+            self.__rate.failure(kind)
+            retry.failed(status=response.status_code, retry_after=response.headers.get('Retry-After'))
+
+    @staticmethod
+    def __response_size(response: requests.Response, stream: bool) -> int:
+        '''レスポンスボディのバイト数
+
+        Content-Length の値を利用します。無い場合はボディの長さを数えますが、
+        stream=True で取得したレスポンスはボディを読み出さないため 0 とします
+
+        :param response: レスポンス
+        :param stream: レスポンスボディを逐次読み出す場合 True
+        :return: バイト数
+        '''
+        content_length = response.headers.get('Content-Length', '')
+        if content_length.isdigit():
+            return int(content_length)
+        return 0 if stream else len(response.content)
+
+    def __retry(self, retry: RetryState, kind: str) -> None:
+        '''取得した内容が不正だったことを記録します
+
+        :param retry: 取得処理の再試行の状態
+        :param kind: 流量制御の種別
+        :raises RetryCountExceededError: リトライ回数が基準を超過した場合
+        :raises RetryBudgetExceededError: 再試行の予算を使い切った場合
+        '''
+        self.__rate.failure(kind)
+        retry.failed()
+
+    def __succeeded(self, kind: str) -> None:
+        '''直前のリクエストの成功を流量制御に通知します
 
-        raise RetryCountExceededError()
+        :param kind: 流量制御の種別
+        '''
+        self.__rate.success(kind, getattr(self.__state, 'latency', 0.0))
 
-    def __get(self, path: str, params: dict = None) -> requests.Response:
+    def __get(self, retry: RetryState, path: str, params: dict = None,  # pylint: disable=R0913
+              stream: bool = False, kind: str = PAGE, headers: dict = None) -> requests.Response:
         '''T'sLoveからデータをGETします
 
+        :param retry: 取得処理の再試行の状態
         :param path: url path
         :param params: クエリパラメータ
+        :param stream: レスポンスボディを逐次読み出す場合 True
+        :param kind: 流量制御の種別 PAGE もしくは IMAGE
+        :param headers: 追加のリクエストヘッダ
         :returns: requests.Response オブジェクト
         :raises RecuestError: requetsの処理に失敗した場合
         :raises RetryCountExceededError: リトライ回数が基準を超過した場合
         '''
         def request() -> requests.Response:
             url = self.__url + path if path else self.__url
-            return self.__session.get(url, params=params, verify=False, allow_redirects=False, timeout=15)
+            return self.__session.get(url, params=params, headers=headers, verify=False, allow_redirects=False,
+                                      timeout=15, stream=stream)
 
-        def message(interval: int) -> str:
+        def message(interval: float) -> str:
             msg = 'Retry GET'
             msg += ' path:{}'.format(path) if path else ''
             if params:
                 msg += ' action:{}'.format(params['a']) if 'a' in params else ''
                 msg += ' file:{}'.format(params['filename']) if 'filename' in params else ''
-            msg += ' after {} sec.'.format(interval)
+            msg += ' after {:.1f} sec.'.format(interval)
             return msg
 
-        return self.__request(request, message)
+        return self.__request(request, retry, message, kind, endpoint_name(path, params), stream)
 
-    def __post(self, path: str, payload: dict = None) -> requests.Response:
+    def __post(self, retry: RetryState, path: str, payload: dict = None) -> requests.Response:
         '''T'sLoveへデータをPOSTします
 
+        :param retry: 取得処理の再試行の状態
         :param path: url path
         :param payload: POSTデータ
         :returns: requests.Response オブジェクト
@@ -145,15 +292,35 @@ class TsLoveWeb:
             url = self.__url + path if path else self.__url
             return self.__session.post(url, data=payload, verify=False, allow_redirects=False, timeout=15)
 
-        def message(interval: int) -> str:
+        def message(interval: float) -> str:
             msg = 'Retry POST'
             msg += ' path:{}'.format(path) if path else ''
             if payload:
                 msg += ' action:{}'.format(payload['a']) if 'a' in payload else ''
-            msg += ' after {} sec.'.format(interval)
+            msg += ' after {:.1f} sec.'.format(interval)
             return msg
 
-        return self.__request(request, message)
+        return self.__request(request, retry, message, endpoint=endpoint_name(path, payload))
+
+    def __validator_key(self, path: str, params: dict = None) -> str:
+        '''ETag と Last-Modified のキャッシュのキーを作成します'''
+        return ValidatorCache.key(self.__url + path, params)
+
+    def __conditional_get(self, retry: RetryState, path: str, params: dict = None,  # pylint: disable=R0913
+                          stream: bool = False, revalidate: bool = False) -> requests.Response:
+        '''記録済みの ETag と Last-Modified を添えてGETします
+
+        :param retry: 取得処理の再試行の状態
+        :param path: url path
+        :param params: クエリパラメータ
+        :param stream: レスポンスボディを逐次読み出す場合 True
+        :param revalidate: 記録済みの ETag と Last-Modified を送る場合 True
+        :returns: requests.Response オブジェクト。変更が無い場合はステータス 304
+        :raises RecuestError: requetsの処理に失敗した場合
+        :raises RetryCountExceededError: リトライ回数が基準を超過した場合
+        '''
+        headers = self.__validators.request_headers(self.__validator_key(path, params)) if revalidate else None
+        return self.__get(retry, path, params, stream=stream, kind=IMAGE, headers=headers)
 
     def login(self, username: Optional[str], password: Optional[str], php_session_id: Optional[str] = None) -> bool:
         '''T'sLoveへのログインをおこないます
@@ -204,17 +371,18 @@ class TsLoveWeb:
                    'is_save': '1',
                    }
 
-        self.__retry_count = 0
+        retry = self.__retry_policy.start()
 
         while True:
-            response = self.__post('', payload)
+            response = self.__post(retry, '', payload)
 
             if 'PHPSESSID' in response.cookies:
+                self.__succeeded(PAGE)
                 return response.cookies['PHPSESSID']
             if response.status_code == 302:  # 認証失敗
                 return None
 
-            self.__retry_count += 1
+            self.__retry(retry, PAGE)
 
     def __get_sns_session_id(self) -> Optional[str]:
         '''T'sLove session_id を取得します
@@ -225,18 +393,12 @@ class TsLoveWeb:
         :raises RecuestError: requetsの処理に失敗した場合
         :raises RetryCountExceededError: リトライ回数が基準を超過した場合
         '''
-        session_id_pattern = re.compile(r'a=do_inc_page_header_logout&amp;sessid=(?P<session_id>.+)"')
-
         params = {'m': 'pc',
                   'a': 'page_h_prof',
                   }
         page = self.get_page(params)
 
-        result = session_id_pattern.search(page)
-        if result:
-            return result.group('session_id')
-
-        return None
+        return find_sns_session_id(page)
 
     def get_page(self, params: dict) -> str:
         '''ページを取得します
@@ -246,38 +408,46 @@ class TsLoveWeb:
         :raises RecuestError: requetsの処理に失敗した場合
         :raises RetryCountExceededError: リトライ回数が基準を超過した場合
         '''
-        self.__retry_count = 0
+        retry = self.__retry_policy.start()
 
-        title_pattern = re.compile(r'<title>(?P<title>.+)</title>')
         while True:
-            response = self.__get('', params)
+            response = self.__get(retry, '', params)
 
             if not response.headers['Content-Type'].startswith('text/html'):
-                self.__retry_count += 1
+                self.__retry(retry, PAGE)
                 continue
 
-            result = title_pattern.search(response.text)
-            if result and not result.group('title') == 'ページが表示できませんでした':
+            if is_valid_page(response.text):
+                self.__succeeded(PAGE)
                 return response.text
 
-            self.__retry_count += 1
+            self.__retry(retry, PAGE)
 
-    def get_stylesheet(self) -> str:
+    def get_stylesheet(self, revalidate: bool = False) -> Optional[str]:
         '''スタイルシートを取得します
 
-        :return: スタイルシートの内容
+        取得したレスポンスの ETag と Last-Modified を記録します
+
+        :param revalidate: 手元に保存済みの内容があり、変更が無ければ取得を省略する場合 True
+        :return: スタイルシートの内容。revalidate が True で変更が無い場合は None
         :raises RecuestError: requetsの処理に失敗した場合
         :raises RetryCountExceededError: リトライ回数が基準を超過した場合
         '''
-        self.__retry_count = 0
+        retry = self.__retry_policy.start()
 
         while True:
-            response = self.__get('xhtml_style.php', None)
+            response = self.__conditional_get(retry, 'xhtml_style.php', revalidate=revalidate)
 
-            if response.headers['Content-Type'].startswith('text/css'):
+            if response.status_code == NOT_MODIFIED:
+                self.__succeeded(IMAGE)
+                return None
+
+            if response.headers.get('Content-Type', '').startswith('text/css'):
+                self.__succeeded(IMAGE)
+                self.__validators.update(self.__validator_key('xhtml_style.php'), response.headers)
                 return response.text
 
-            self.__retry_count += 1
+            self.__retry(retry, IMAGE)
 
     def get_image(self, path: str, params: dict = None) -> Image:
         '''画像を取得します
@@ -291,33 +461,133 @@ class TsLoveWeb:
         :raises RequestError: requetsの処理に失敗した場合
         :raises RetryCountExceededError: リトライ回数が基準を超過した場合
         '''
-        self.__retry_count = 0
+        retry = self.__retry_policy.start()
 
         while True:
-            response = self.__get(path, params)
+            response = self.__get(retry, path, params, kind=IMAGE)
 
             if response.headers['Content-Type'].startswith('image/'):
+                self.__succeeded(IMAGE)
                 return Image.open(io.BytesIO(response.content))
 
             if response.headers['Content-Type'].startswith('text/html') and response.headers['Content-Length'] == '0':
+                self.__succeeded(IMAGE)
                 return Image.new("1", (1, 1), 1)
 
-            self.__retry_count += 1
+            self.__retry(retry, IMAGE)
 
-    def get_javascript(self, path: str) -> str:
+    def get_javascript(self, path: str, revalidate: bool = False) -> Optional[str]:
         '''JavaScriptを取得します
 
+        取得したレスポンスの ETag と Last-Modified を記録します
+
         :param path: url path
-        :return: JavaScriptファイルの内容
+        :param revalidate: 手元に保存済みの内容があり、変更が無ければ取得を省略する場合 True
+        :return: JavaScriptファイルの内容。revalidate が True で変更が無い場合は None
         :raises RequestError: requetsの処理に失敗した場合
         :raises RetryCountExceededError: リトライ回数が基準を超過した場合
         '''
-        self.__retry_count = 0
+        retry = self.__retry_policy.start()
 
         while True:
-            response = self.__get(path, None)
+            response = self.__conditional_get(retry, path, revalidate=revalidate)
+
+            if response.status_code == NOT_MODIFIED:
+                self.__succeeded(IMAGE)
+                return None
 
-            if response.headers['Content-Type'].startswith('text/javascript'):
+            if response.headers.get('Content-Type', '').startswith('text/javascript'):
+                self.__succeeded(IMAGE)
+                self.__validators.update(self.__validator_key(path), response.headers)
                 return response.text
 
-            self.__retry_count += 1
+            self.__retry(retry, IMAGE)
+
+    def download_image(self, path: str, file_name: str, params: dict = None, revalidate: bool = False) -> bool:
+        '''画像を取得してファイルへ保存します
+
+        レスポンスボディをデコードせずにチャンク単位でそのままファイルへ書き込みます
+        Content-Type ヘッダと先頭のバイト列が矛盾する場合は再試行します
+        画像が不正(Content-Type が text/html かつContent-Length 0)なものについては
+        ダミーのイメージを生成して保存します
+
+        書き込みは一時ファイルに対して行い、完了後に file_name へ置き換えます
+        レスポンスボディの読み出し中に接続が切れた場合も再試行の方針に従って再試行します
+
+        revalidate が True の場合はレスポンスの ETag と Last-Modified を記録し、
+        file_name が既に存在すれば記録済みの値を添えて条件付きで取得します
+
+        :param path: url path
+        :param file_name: 保存先のファイル名
+        :param params: クエリパラメータ
+        :param revalidate: 条件付きリクエストを利用する場合 True
+        :return: 保存した場合 True, 変更が無く取得を省略した場合 False
+        :raises RequestError: requetsの処理に失敗した場合
+        :raises RetryCountExceededError: リトライ回数が基準を超過した場合
+        :raises OSError: ファイルの書き込みに失敗した場合
+        '''
+        retry = self.__retry_policy.start()
+
+        while True:
+            conditional = revalidate and os.path.exists(file_name)
+            with self.__conditional_get(retry, path, params, stream=True, revalidate=conditional) as response:
+                content_type = response.headers.get('Content-Type', '')
+
+                if response.status_code == NOT_MODIFIED:
+                    self.__succeeded(IMAGE)
+                    return False
+
+                if content_type.startswith('image/'):
+                    try:
+                        saved = self.__save_response_body(response, content_type, file_name)
+                    except requests.RequestException as err:
+                        self.__rate.failure(IMAGE)
+                        retry.failed(error=err)
+                        continue
+                    if saved:
+                        self.__succeeded(IMAGE)
+                        if revalidate:
+                            self.__validators.update(self.__validator_key(path, params), response.headers)
+                        return True
+
+                elif content_type.startswith('text/html') and response.headers.get('Content-Length') == '0':
+                    self.__succeeded(IMAGE)
+                    Image.new("1", (1, 1), 1).save(file_name)
+                    return True
+
+            self.__retry(retry, IMAGE)
+
+    @staticmethod
+    def __save_response_body(response: requests.Response, content_type: str, file_name: str) -> bool:
+        '''レスポンスボディをファイルへ保存します
+
+        :param response: stream=True で取得したレスポンス
+        :param content_type: レスポンスの Content-Type
+        :param file_name: 保存先のファイル名
+        :return: 保存した場合 True, 先頭のバイト列が Content-Type と矛盾した場合 False
+        :raises requests.RequestException: レスポンスボディの読み出しに失敗した場合
+        :raises OSError: ファイルの書き込みに失敗した場合
+        '''
+        temp_file_name = file_name + '.part'
+        try:
+            chunks = response.iter_content(DOWNLOAD_CHUNK_SIZE)
+            head = b''
+            for chunk in chunks:
+                head += chunk
+                if len(head) >= SNIFF_SIZE:
+                    break
+
+            if not is_consistent(content_type, head):
+                return False
+
+            with open(temp_file_name, 'wb') as file:
+                file.write(head)
+                for chunk in chunks:
+                    file.write(chunk)
+            os.replace(temp_file_name, file_name)
+
+        finally:
+            if os.path.exists(temp_file_name):
+                os.remove(temp_file_name)
+
+        return True
@@ -1,20 +1,46 @@
 '''T's LOVEの日記を一括してダウンロードするプログラム'''
 
 import argparse
+import datetime
+import hashlib
+import html
 import os
 import re
+import sqlite3
 import sys
-import time
-from dataclasses import dataclass
-from typing import Optional, TypedDict, Set, List, Tuple
+from collections import deque
+from dataclasses import dataclass, field, replace
+from itertools import repeat
+from concurrent.futures import Future, as_completed
+from typing import Dict, Iterable, Iterator, Optional, TypedDict, Set, List, Tuple, TypeVar
+from urllib.parse import urlparse
 
-from bs4 import BeautifulSoup  # type: ignore
-from PIL import Image  # type: ignore
+from bs4 import BeautifulSoup, Tag  # type: ignore
 
 from tslove.core.page import Page
 from tslove.core.diary import DiaryPage
 from tslove.core.exception import WebAccessError
-from tslove.dumpapp import DumpApp
+from tslove.core.indexpage import month_file_name, write_month_page, write_summary_page, write_search_page
+from tslove.core.indexpage import SEARCH_DATA_PREFIX, SEARCH_DATA_SUFFIX
+from tslove.core.search import SearchIndex, extract_diary_text, SEARCH_INDEX_FILE_NAME
+from tslove.core.pool import AssetPool, DEFAULT_WORKERS, DEFAULT_PER_HOST
+from tslove.core.profiler import StageProfiler, profiler, set_profiler, FETCH, PARSE, REWRITE, SEARCH
+from tslove.core.parser import make_soup, set_html_parser, DEFAULT_PARSER
+from tslove.core.rewriter import TreeRewriter, REMOVE, UNWRAP
+from tslove.core.ratelimit import PAGE, IMAGE, DEFAULT_MAX_PAGE_RPM, DEFAULT_MAX_IMAGE_RPM
+from tslove.core.session import SessionPool, DEFAULT_ACCOUNT
+from tslove.dumpapp import DumpApp, DEFAULT_URL
+
+DEFAULT_DIARY_WORKERS = 2
+FINGERPRINT_LENGTH = 16
+
+PAGE_INFO_META_PREFIX = 'tslove:'
+PAGE_INFO_READ_SIZE = 4096
+PAGE_INFO_DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+TARGET_PATTERN = re.compile(r'^(?P<account>[A-Za-z0-9_.-]+)(:(?P<member_id>[0-9]+))?$')
+
+T = TypeVar('T')
 
 
 class OutputPath(TypedDict):
@@ -26,6 +52,64 @@ class OutputPath(TypedDict):
     tools: str
 
 
+@dataclass(frozen=True)
+class Target:
+    '''ダンプの対象'''
+    account: str
+    member_id: Optional[str] = None
+
+    @property
+    def name(self) -> str:
+        '''出力先のディレクトリ名'''
+        return self.account if self.member_id is None else '{}-{}'.format(self.account, self.member_id)
+
+
+def parse_target(spec: str) -> Target:
+    '''--target の値を解釈します
+
+    ACCOUNT もしくは ACCOUNT:MEMBER_ID の形式で指定します
+    MEMBER_ID を省略した場合はアカウント自身の日記を対象とします
+
+    :param spec: --target の値
+    :return: Targetオブジェクト
+    :raises ValueError: 形式が不正な場合
+    '''
+    result = TARGET_PATTERN.match(spec)
+    if result is None or result.group('account') in ('.', '..'):
+        raise ValueError('Invalid target {}. (ACCOUNT or ACCOUNT:MEMBER_ID)'.format(spec))
+    return Target(result.group('account'), result.group('member_id'))
+
+
+def make_output_path(base: str) -> OutputPath:
+    '''出力先のディレクトリを決めます
+
+    :param base: 出力先のディレクトリ
+    :return: OutputPath
+    '''
+    return {
+        'base': base,
+        'stylesheet': os.path.join(base, 'stylesheet'),
+        'image': os.path.join(base, 'images'),
+        'script': os.path.join(base, 'scripts'),
+        'tools': os.path.join(base, 'tslove-tools')
+    }
+
+
+def round_robin(iterators: Iterable[Iterator[T]]) -> Iterator[T]:
+    '''複数のイテレータから一つずつ順番に取り出します
+
+    :param iterators: イテレータ
+    :return: 取り出した値のイテレータ。終わったイテレータは飛ばします
+    '''
+    queue = deque(iterators)
+    while queue:
+        iterator = queue.popleft()
+        for value in iterator:
+            yield value
+            queue.append(iterator)
+            break
+
+
 @dataclass
 class Config:
     '''コンフィグ'''
@@ -35,20 +119,66 @@ class Config:
     echo_password: bool
     show_session_id: bool
     php_session_id: Optional[str] = None
+    asset_workers: int = DEFAULT_WORKERS
+    per_host_connections: int = DEFAULT_PER_HOST
+    html_parser: str = DEFAULT_PARSER
+    max_page_rpm: float = DEFAULT_MAX_PAGE_RPM
+    max_image_rpm: float = DEFAULT_MAX_IMAGE_RPM
+    diary_workers: int = DEFAULT_DIARY_WORKERS
+    sync: bool = False
+    image_store: Optional[str] = None
+    refresh_assets: bool = False
+    compact_html: bool = False
+    search_index: bool = True
+    search_json: bool = False
+    url: str = DEFAULT_URL
+    stats_json: Optional[str] = None
+    stats_prometheus: Optional[str] = None
+    profile: bool = False
+    profile_stats: Optional[str] = None
+    member_id: Optional[str] = None
+    targets: List[Target] = field(default_factory=list)
 
 
 class DiaryDumpApp(DumpApp):  # pylint: disable=R0903
     '''diarydump のアプリケーションクラス'''
 
-    INTERVAL_SHORT = 10
-    INTERVAL_LONG = 20
-    INTERVAL_CHANGE_TIMING = 5
-
     DIARY_ID_PATTERN = re.compile(r'\./\?m=pc&a=page_fh_diary&target_c_diary_id=(?P<id>[0-9]+)')
-
-    def __init__(self) -> None:
-        super().__init__()
-        self._config = self._setup_config()
+    DIARY_LIST_LINK_PATTERN = re.compile(r'^(\./)?\?m=pc&a=page_fh_diary_list.*')
+    DIARY_LINK_PATTERN = re.compile(r'^(\./)?\?m=pc&a=page_fh_diary.*')
+    ACTION_LINK_PATTERN = re.compile(r'^(\./)?\?m=pc&a=.+')
+    IMAGE_LINK_PATTERN = re.compile(r'^(\./)?img.php.+')
+    META_TAG_PATTERN = re.compile(r'<meta\s[^>]*>')
+    META_ATTRIBUTE_PATTERN = re.compile(r'([\w:-]+)=(?:"([^"]*)"|\'([^\']*)\')')
+
+    def __init__(self, config: Optional[Config] = None, sessions: Optional[SessionPool] = None,
+                 account: str = DEFAULT_ACCOUNT) -> None:
+        '''
+        :param config: コンフィグ。省略した場合はコマンドライン引数から作成し、プロファイラを設定します
+        :param sessions: セッションプール。省略した場合は作成します
+        :param account: 利用するセッションのアカウント名
+        '''
+        if config is None:
+            config = self._setup_config()
+            set_profiler(StageProfiler(enabled=config.profile, cprofile=config.profile_stats is not None))
+        super().__init__(url=config.url, sessions=sessions, account=account)
+        self._config = config
+        self._web.rate_controller[PAGE].max_rpm = self._config.max_page_rpm
+        self._web.rate_controller[IMAGE].max_rpm = self._config.max_image_rpm
+        self._diary_pool: Optional[AssetPool] = None
+        self._search_index: Optional[SearchIndex] = None
+        self.__diary_jobs: Dict[Future, str] = {}
+        self.__fingerprints: Dict[str, str] = {}
+        self.__diary_ids: List[str] = []
+        self.__dump_process = {
+            'page_info': 0,
+            'local': 0,
+            'remote': 0,
+            'sync': 0
+        }
+        self.__changed: Set[str] = set()
+        self.__touched_months: Set[Tuple[int, int]] = set()
+        self.__failures = 0
 
     @staticmethod
     def _setup_config() -> Config:
@@ -57,13 +187,60 @@ class DiaryDumpApp(DumpApp):  # pylint: disable=R0903
         :return: Configオブジェクト
         '''
         parser = argparse.ArgumentParser()
-        parser.add_argument('-f', '--from', help='diary_id to start', metavar='<id>', type=int, default=None)
-        parser.add_argument('-t', '--to', help='diary_id to end', metavar='<id>', type=int, default=None)
+        parser.add_argument('-f', '--from', help='newest diary_id to dump', metavar='<id>', type=int, default=None)
+        parser.add_argument('-t', '--to', help='oldest diary_id to dump', metavar='<id>', type=int, default=None)
         parser.add_argument('-o', '--output', help='destination to dump. (default ./dump)', metavar='<PATH>', default='./dump')
         parser.add_argument('--echo-password', help='display password on screen(DANGER)', action='store_true')
         parser.add_argument('--show-session-id', help='for debug', action='store_true')
+        parser.add_argument('--diary-workers', help='number of workers to fetch diary pages. (default {})'.format(DEFAULT_DIARY_WORKERS),
+                            metavar='<n>', type=int, default=DEFAULT_DIARY_WORKERS)
+        parser.add_argument('--asset-workers', help='number of workers to fetch images and scripts. (default {})'.format(DEFAULT_WORKERS),
+                            metavar='<n>', type=int, default=DEFAULT_WORKERS)
+        parser.add_argument('--per-host', help='concurrent connections per host. (default {})'.format(DEFAULT_PER_HOST),
+                            metavar='<n>', type=int, default=DEFAULT_PER_HOST)
+        parser.add_argument('--html-parser', help='parser for BeautifulSoup. lxml is faster but changes the output '
+                            'of malformed markup. (default {})'.format(DEFAULT_PARSER),
+                            metavar='<name>', default=DEFAULT_PARSER)
+        parser.add_argument('--max-rpm', help='max diary page requests per minute. (default {})'.format(DEFAULT_MAX_PAGE_RPM),
+                            metavar='<n>', type=float, default=DEFAULT_MAX_PAGE_RPM)
+        parser.add_argument('--max-image-rpm', help='max image requests per minute. (default {})'.format(DEFAULT_MAX_IMAGE_RPM),
+                            metavar='<n>', type=float, default=DEFAULT_MAX_IMAGE_RPM)
+        parser.add_argument('--image-store', help='directory to share image files between dumps. (default <PATH>/tslove-tools/images)',
+                            metavar='<DIR>', default=None)
+        parser.add_argument('--sync', help='re-dump diaries whose title or comments changed', action='store_true')
+        parser.add_argument('--refresh-assets', help='revalidate dumped stylesheet, skin images and scripts', action='store_true')
+        parser.add_argument('--compact-html', help='write HTML files without indentation', action='store_true')
+        parser.add_argument('--no-search-index', help='do not build the full-text search index', dest='search_index',
+                            action='store_false')
+        parser.add_argument('--search-json', help='write the search index and search.html for browsers', action='store_true')
+        parser.add_argument('--stats-json', help='save request metrics as JSON', metavar='<FILE>', default=None)
+        parser.add_argument('--stats-prometheus', help='save request metrics as a Prometheus textfile', metavar='<FILE>',
+                            default=None)
+        parser.add_argument('--profile', help='show time spent in each stage per diary', action='store_true')
+        parser.add_argument('--profile-stats', help='save cProfile stats to FILE. (implies --profile)', metavar='<FILE>',
+                            default=None)
+        parser.add_argument('--url', help='base URL of T\'sLove. (default {})'.format(DEFAULT_URL), metavar='<URL>',
+                            default=DEFAULT_URL)
+        parser.add_argument('--target', help='dump diaries of ACCOUNT (or of MEMBER_ID as ACCOUNT) into <PATH>/<name>. '
+                            '(repeatable)', metavar='<ACCOUNT[:MEMBER_ID]>', action='append', default=[])
         args = parser.parse_args()
 
+        if args.asset_workers < 1 or args.per_host < 1 or args.diary_workers < 1:
+            parser.error('--asset-workers, --per-host and --diary-workers must be positive.')
+        if args.max_rpm <= 0 or args.max_image_rpm <= 0:
+            parser.error('--max-rpm and --max-image-rpm must be positive.')
+        try:
+            set_html_parser(args.html_parser)
+        except ValueError as err:
+            parser.error(str(err))
+
+        try:
+            targets = [parse_target(spec) for spec in args.target]
+        except ValueError as err:
+            parser.error(str(err))
+        if len(set(targets)) != len(targets):
+            parser.error('--target must not be duplicated.')
+
         diary_id_from, diary_id_to = vars(args)['from'], args.to  # from is keyword
         if diary_id_from and diary_id_to and diary_id_from < diary_id_to:
             diary_id_from, diary_id_to = diary_id_to, diary_id_from
@@ -72,117 +249,249 @@ class DiaryDumpApp(DumpApp):  # pylint: disable=R0903
         config = Config(
             echo_password=args.echo_password,
             show_session_id=args.show_session_id,
+            asset_workers=args.asset_workers,
+            diary_workers=args.diary_workers,
+            per_host_connections=args.per_host,
+            html_parser=args.html_parser,
+            max_page_rpm=args.max_rpm,
+            max_image_rpm=args.max_image_rpm,
+            refresh_assets=args.refresh_assets,
+            compact_html=args.compact_html,
+            search_index=args.search_index,
+            search_json=args.search_json and args.search_index,
+            url=args.url if args.url.endswith('/') else args.url + '/',
+            stats_json=args.stats_json,
+            stats_prometheus=args.stats_prometheus,
+            profile=args.profile or args.profile_stats is not None,
+            profile_stats=args.profile_stats,
+            sync=args.sync,
+            image_store=args.image_store,
             diary_id_from=str(diary_id_from) if diary_id_from else None,
             diary_id_to=str(diary_id_to) if diary_id_to else None,
-            output_path={
-                'base': base,
-                'stylesheet': os.path.join(base, 'stylesheet'),
-                'image': os.path.join(base, 'images'),
-                'script': os.path.join(base, 'scripts'),
-                'tools': os.path.join(base, 'tslove-tools')
-            }
+            targets=targets,
+            output_path=make_output_path(base)
         )
         return config
 
-    @staticmethod
-    def _check_first_diary_id() -> str:
-        '''最初にダウンロードする日記を取得します
+    def _discover_diaries(self) -> List[Tuple[str, str, str]]:
+        '''日記の一覧ページを順に取得して日記ID、タイトル、フィンガープリントを集めます
 
-        :return: diary_id or None
-        :raises: WebAccessError プロフィールページの取得に失敗した場合
-        :raises: ValueError diary_idの取得に失敗した場合
+        self._config の member_id 属性を利用します。None の場合はログインしたアカウント自身の日記を対象とします
+        新しい日記IDが見つからないページに到達した時点で終了します
+        フィンガープリントは一覧ページ中の日記の項目(リンクの親要素)のテキストのハッシュ値で、
+        タイトルやコメント数が変わると変化します
+
+        :return: 日記ID、タイトル、フィンガープリントのタプルのリスト。日記IDの降順
+        :raises: WebAccessError 一覧ページの取得に失敗した場合
+        :raises: ValueError 日記が一つも見つからなかった場合
         '''
+        diaries: Dict[str, str] = {}
+        entries: Dict[str, str] = {}
+
+        param: Dict[str, object] = {}
+        if self._config.member_id is not None:
+            param['target_c_member_id'] = self._config.member_id
+
         try:
-            profile_page = BeautifulSoup(Page.fetch_from_web('page_h_prof')[0], 'html.parser')
-            diary_list = profile_page.find('ul', class_='articleList')
-            result = DiaryDumpApp.DIARY_ID_PATTERN.match(diary_list.a['href'])
-            if result:
-                return result.group('id')
+            page = 1
+            while True:
+                param['page'] = page
+                soup = Page.fetch_from_web(self._web, 'page_fh_diary_list', param=dict(param)).detach_soup()
+
+                found = False
+                for a_tag in soup.find_all('a', href=True):
+                    result = DiaryDumpApp.DIARY_ID_PATTERN.match(a_tag['href'])
+                    if result is None:
+                        continue
+                    diary_id = result.group('id')
+                    if diary_id not in diaries:
+                        diaries[diary_id] = ''
+                        found = True
+                    if not diaries[diary_id]:
+                        diaries[diary_id] = a_tag.get_text(strip=True)
+                    entry = a_tag.parent.get_text(' ', strip=True)
+                    if len(entry) > len(entries.get(diary_id, '')):  # 最近の日記などの短い項目よりも一覧の項目を優先する
+                        entries[diary_id] = entry
+                soup.decompose()
+
+                if not found:
+                    break
+                page += 1
+
         except WebAccessError as err:
-            print('Can not get first diary id. {}'.format(err))
+            print('Can not get diary list. {}'.format(err))
             raise err
 
-        raise ValueError('Diary id not match.')
+        if not diaries:
+            raise ValueError('No diary found in diary list.')
+
+        return sorted(((diary_id, title, DiaryDumpApp._fingerprint(entries.get(diary_id, '')))
+                       for diary_id, title in diaries.items()),
+                      key=lambda diary: int(diary[0]), reverse=True)
+
+    @staticmethod
+    def _fingerprint(text: str) -> str:
+        '''変更の検出に用いるフィンガープリントを求めます
+
+        :param text: 日記の一覧ページ中の項目のテキスト
+        :return: フィンガープリント
+        '''
+        return hashlib.sha1(text.encode('utf-8')).hexdigest()[:FINGERPRINT_LENGTH]
+
+    def _filter_diary_ids(self, diary_ids: List[str]) -> List[str]:
+        '''--from, --to で指定した範囲の日記IDを選びます
+
+        self._config の diary_id_from, diary_id_to 属性を利用します
+
+        :param diary_ids: 日記IDのリスト
+        :return: 範囲内の日記IDのリスト
+        '''
+        upper = int(self._config.diary_id_from) if self._config.diary_id_from else None
+        lower = int(self._config.diary_id_to) if self._config.diary_id_to else None
+
+        return [diary_id for diary_id in diary_ids
+                if (upper is None or int(diary_id) <= upper) and (lower is None or int(diary_id) >= lower)]
 
-    def _output_index(self) -> None:
+    def _output_index(self, touched_months: Set[Tuple[int, int]]) -> None:
         '''インデックスファイルを出力します
 
+        日記の一覧は年月ごとのファイルに分けて出力し、index.html には年月の一覧を出力します
+        年月ごとのファイルは touched_months に含まれるものと、まだ出力していないものだけを作り直します
+
+        :param touched_months: 今回の実行で日記を記録した (年, 月) の集合
         :rises: OSError ファイルの書き込みに失敗した場合
         '''
-        template = '''
-        <!DOCTYPE html>
-        <html>
-        <head>
-        <title>Index of dialy</title>
-        <meta charset="utf-8"/>
-        </head>
-        <body>
-        <h1>Index of dialy</h1>
-        <table>
-        <tr><th>Date</th><th>Title</th></tr>
-        </table>
-        </body>
-        </html>
-        '''
-
-        soup = BeautifulSoup(template, 'html.parser')
-        table_tag = soup.table
-
-        for diary_id in sorted(self._page_info.keys(), key=int, reverse=True):
-            tr_tag = soup.new_tag('tr')
-            date_td_tag = soup.new_tag('td')
-            date_td_tag.string = self._page_info[diary_id]['date'].strftime('%Y年%m月%d日%H:%M')
-            tr_tag.append(date_td_tag)
-            title_td_tag = soup.new_tag('td')
-            title_a_tag = soup.new_tag('a')
-            title_a_tag['href'] = './{}.html'.format(self._page_info[diary_id]['diary_id'])
-            title_a_tag.string = self._page_info[diary_id]['title']
-            title_td_tag.append(title_a_tag)
-            tr_tag.append(title_td_tag)
-            table_tag.append(tr_tag)
-
-        file_name = os.path.join(self._config.output_path['base'], 'index.html')
-        with open(file_name, 'w', encoding='utf-8') as file:
-            file.write(soup.prettify(formatter='html'))
+        assert self._archive is not None
+
+        base = self._config.output_path['base']
+        months = self._archive.months()
+
+        for year, month, _ in months:
+            file_name = os.path.join(base, month_file_name(year, month))
+            if (year, month) not in touched_months and os.path.exists(file_name):
+                continue
+            with open(file_name, 'w', encoding='utf-8') as file:
+                write_month_page(file, year, month, self._archive.iterate_month(year, month, reverse=True))
+
+        with open(os.path.join(base, 'index.html'), 'w', encoding='utf-8') as file:
+            write_summary_page(file, months, search_page=self._config.search_json)
 
     def _dump_diary(self, diary_id: str, file_name: str) -> dict:
         '''日記をダンプします
 
+        画像とスクリプトの取得はワーカープールへ投入され、完了を待たずに戻ります
+        HTMLファイルは大きさの調整に必要なサムネイル画像の取得が完了した時点で書き込まれます
+        書き込みの結果は output に含むFutureで確認できます。失敗した場合は書きかけのファイルを削除し、結果は False です
+
         :param diary_id: diary_id
         :param filename: 出力先ファイル名
-        :return: ページ情報
+        :return: ページ情報。全文検索の索引を作る場合は検索の対象とする文字列を text に含みます
         :rises: WebAccessError 日記の取得に失敗した場合
-        :rises: OSError ファイルの書き込みに失敗した場合
         '''
-        diary_page = DiaryPage.fetch_from_web(diary_id)
+        stage_profiler = profiler()
+        with stage_profiler.diary(diary_id):
+            with stage_profiler.stage(FETCH):
+                diary_page = DiaryPage.fetch_from_web(self._web, diary_id)
+
+            thumbnail_jobs = []
+            for src, dst in self.__create_diary_image_path_list(diary_page.image_paths):
+                job = self._dump_image_in_background(src, dst)
+                if 'w=120&h=120' in src:
+                    thumbnail_jobs.append(job)
+
+            script_paths = diary_page.script_paths
+            self._fetch_scripts(script_paths, overwrite=self._config.refresh_assets)
+
+            with stage_profiler.stage(PARSE):
+                soup = diary_page.detach_merged_soup()
+                diary_page.release()
+
+            page_info = {
+                'title': diary_page.title,
+                'date': diary_page.date,
+                'prev_diary_id': diary_page.prev_diary_id,
+                'diary_id': diary_id
+            }
+            if self._config.search_index:
+                with stage_profiler.stage(SEARCH):
+                    page_info['text'] = extract_diary_text(soup)
+
+            def output_diary() -> bool:
+                try:
+                    with stage_profiler.stage(REWRITE):
+                        self._rewrite_diary(soup)
+                        self._embed_page_info(soup, page_info)
+                    self._output_html(soup, file_name)
+                    return True
+                except Exception as err:  # pylint: disable=W0703
+                    print('Can not save diary id {}. {}'.format(diary_id, err))
+                    return False
+                finally:
+                    soup.decompose()
+
+            assert self._asset_pool is not None
+            page_info['output'] = self._asset_pool.when_done(thumbnail_jobs, stage_profiler.bind(output_diary))
 
-        for src, dst in self.__create_diary_image_path_list(diary_page.image_paths):
-            try:
-                self._dump_image(src, dst)
-            except (WebAccessError, OSError, ValueError) as err:
-                print('Can not dump image {} -> {}. {}'.format(src, dst, err))
-                continue
+        return page_info
+
+    @staticmethod
+    def _embed_page_info(soup: BeautifulSoup, page_info: dict) -> None:
+        '''ページ情報を meta タグとして head の先頭に埋め込みます
 
-        script_paths = diary_page.script_paths
-        self._fetch_scripts(script_paths)
+        ダンプ済みのファイルから先頭部分だけを読んでページ情報を復元できるようにします
 
-        soup = BeautifulSoup(diary_page[0], 'html.parser')
+        :param soup: 日記ページのツリー
+        :param page_info: ページ情報
+        '''
+        values = {
+            'diary_id': page_info['diary_id'],
+            'title': page_info['title'],
+            'date': page_info['date'].strftime(PAGE_INFO_DATE_FORMAT),
+            'prev_diary_id': page_info['prev_diary_id'] or '',
+        }
 
-        self.__remove_script(soup)
-        self.__remove_form_items(soup)
-        self.__fix_link(soup)
+        parent = soup.head if soup.head else soup
+        position = 0
+        content_type_tag = parent.find('meta', attrs={'http-equiv': 'Content-Type'}, recursive=False)
+        if content_type_tag:  # 文字コードの指定より前には置かない
+            position = parent.index(content_type_tag) + 1
 
-        with open(file_name, 'w', encoding='utf-8') as file:
-            file.write(soup.prettify(formatter='html'))
+        for name, value in reversed(list(values.items())):
+            parent.insert(position, soup.new_tag('meta', attrs={'name': PAGE_INFO_META_PREFIX + name, 'content': value}))
 
-        page_info = {
-            'title': diary_page.title,
-            'date': diary_page.date,
-            'prev_diary_id': diary_page.prev_diary_id,
-            'diary_id': diary_id
-        }
+    @staticmethod
+    def _read_embedded_page_info(file_name: str) -> Optional[dict]:
+        '''ダンプ済みのファイルの先頭部分からページ情報を読み出します
 
-        return page_info
+        :param file_name: ダンプ済みのファイル名
+        :return: ページ情報。埋め込まれていない場合(以前のバージョンで出力したファイル)は None
+        :raises: OSError ファイルの読み込みに失敗した場合
+        '''
+        with open(file_name, 'r', encoding='utf-8') as file:
+            head = file.read(PAGE_INFO_READ_SIZE)
+
+        values = {}
+        for meta_tag in DiaryDumpApp.META_TAG_PATTERN.findall(head):
+            attrs = {name: html.unescape(double or single)
+                     for name, double, single in DiaryDumpApp.META_ATTRIBUTE_PATTERN.findall(meta_tag)}
+            name = attrs.get('name', '')
+            if name.startswith(PAGE_INFO_META_PREFIX) and 'content' in attrs:
+                values[name[len(PAGE_INFO_META_PREFIX):]] = attrs['content']
+
+        if not {'diary_id', 'title', 'date', 'prev_diary_id'} <= values.keys():
+            return None
+
+        try:
+            date = datetime.datetime.strptime(values['date'], PAGE_INFO_DATE_FORMAT)
+        except ValueError:
+            return None
+
+        return {
+            'title': values['title'],
+            'date': date,
+            'prev_diary_id': values['prev_diary_id'] or None,
+            'diary_id': values['diary_id']
+        }
 
     def __create_diary_image_path_list(self, src_paths: Set[str]) -> List[Tuple[str, str]]:
         '''画像の取得元・保存先のリストを作成します
@@ -202,117 +511,516 @@ class DiaryDumpApp(DumpApp):  # pylint: disable=R0903
 
         return path_list
 
-    @staticmethod
-    def __remove_script(soup: BeautifulSoup) -> None:
-        '''ページからスクリプトを除去します
+    def _rewrite_diary(self, soup: BeautifulSoup) -> None:
+        '''日記ページを出力用に書き換えます
+
+        スクリプトとフォームアイテムの除去、リンクの修正をツリーの一度の走査で行います
 
         :param soup: ページ
         '''
-        script_tags = soup.find_all('script')
-        for script_tag in script_tags:
-            if script_tag.has_attr('src'):
-                src = script_tag['src']
-                if src.startswith('./js/prototype.js') or src.startswith('./js/Selection.js') or src == './js/comment.js':
-                    script_tag.decompose()
+        self.__create_rewriter().rewrite(soup)
+
+    def __create_rewriter(self) -> TreeRewriter:
+        '''日記ページ用の書き換えエンジンを作成します
+
+        最初に現れたタグのみを対象とするルールがあるため、ページごとに作成します
+
+        :return: TreeRewriterオブジェクト
+        '''
+        found: Set[str] = set()
+
+        def first(key: str) -> bool:
+            if key in found:
+                return False
+            found.add(key)
+            return True
+
+        def div_rule(div_tag: Tag) -> Optional[str]:
+            if div_tag.get('id') == 'commentForm' and first('commentForm'):
+                return REMOVE
+            if 'operation' in div_tag.get('class', ()):
+                return REMOVE
+            return None
+
+        def form_rule(_: Tag) -> Optional[str]:
+            return UNWRAP if first('form') else None
+
+        def link_rule(link_tag: Tag) -> Optional[str]:
+            if 'stylesheet' in link_tag.get('rel', ()) and first('stylesheet'):
+                link_tag['href'] = './stylesheet/tslove.css'
+            return None
+
+        rewriter = TreeRewriter()
+        rewriter.add_rule('script', self.__script_rule)
+        rewriter.add_rule('div', div_rule)
+        rewriter.add_rule('form', form_rule)
+        rewriter.add_rule('input', lambda _: REMOVE)
+        rewriter.add_rule('link', link_rule)
+        rewriter.add_rule('a', self.__a_rule)
+        rewriter.add_rule('img', self.__img_rule)
+        return rewriter
+
+    def __script_rule(self, script_tag: Tag) -> Optional[str]:
+        '''スクリプトを除去し、残すスクリプトのパスを修正します
+
+        :param script_tag: scriptタグ
+        :return: 除去する場合 REMOVE
+        '''
+        if script_tag.has_attr('src'):
+            src = script_tag['src']
+            if self._is_ignored_script(src):
+                return REMOVE
+            script_tag['src'] = 'scripts/' + os.path.basename(src)
+            return None
+
+        if 'url2cmd' not in (script_tag.string or ''):
+            return REMOVE
+        return None
+
+    def __a_rule(self, a_tag: Tag) -> Optional[str]:
+        '''スクリプトを持つリンクを除去し、リンク先を修正します
+
+        :param a_tag: aタグ
+        :return: 除去する場合 REMOVE
+        '''
+        if a_tag.has_attr('onclick'):
+            return REMOVE
+
+        href = a_tag.get('href')
+        if href is None:
+            return None
+
+        if DiaryDumpApp.DIARY_LIST_LINK_PATTERN.search(href):
+            a_tag['href'] = './index.html'
+        elif DiaryDumpApp.DIARY_LINK_PATTERN.search(href):
+            result = DiaryDumpApp.DIARY_ID_PATTERN.match(href)
+            a_tag['href'] = './{}.html'.format(result.group('id')) if result else '#'
+        elif href == './':
+            a_tag['href'] = './index.html'
+        elif DiaryDumpApp.ACTION_LINK_PATTERN.search(href):
+            a_tag['href'] = '#'
+        else:
+            if DiaryDumpApp.IMAGE_LINK_PATTERN.search(href):
+                a_tag['href'] = './images/' + self._find_filename_from_src_path(href)
+            return None
+
+        del a_tag['rel']
+        del a_tag['target']
+        return None
+
+    def __img_rule(self, img_tag: Tag) -> Optional[str]:
+        '''画像のパスを修正し、サムネイルの大きさを設定します
+
+        :param img_tag: imgタグ
+        :return: None
+        '''
+        src = img_tag.get('src')
+        if src is None:
+            return None
+
+        path = os.path.join('./images/', self._find_filename_from_src_path(src))
+        if 'w=120&h=120' in src:
+            size = self.__thumbnail_target_size(path)
+            if size is None or size[0] == size[1]:
+                img_tag['width'] = 120
+                img_tag['height'] = 120
+            elif size[0] > size[1]:
+                img_tag['width'] = 120
             else:
-                if 'url2cmd' not in script_tag.string:
-                    script_tag.decompose()
+                img_tag['height'] = 120
+        img_tag['src'] = path
+        return None
 
-        a_tags_with_script = soup.find_all('a', onclick=True)
-        for a_tag in a_tags_with_script:
-            a_tag.decompose()
+    def __thumbnail_target_size(self, path: str) -> Optional[Tuple[int, int]]:
+        '''サムネイルの元画像の大きさを取得します
 
-    @staticmethod
-    def __remove_form_items(soup):
-        '''ページからフォームアイテムを除去します'''
-        div_tag = soup.find('div', id='commentForm')
-        if div_tag:
-            div_tag.decompose()
+        画像の大きさのキャッシュに無い場合はファイルのヘッダを読んでキャッシュに記録します
 
-        div_tags = soup.find_all('div', class_='operation')
-        for div_tag in div_tags:
-            div_tag.decompose()
+        :param path: 出力先ディレクトリからの画像のパス
+        :return: (幅, 高さ) のタプル。画像が存在しないあるいは大きさが不明な場合 None
+        '''
+        name = os.path.basename(path)
+        size = self._image_sizes.get(name)
+        if size is not None:
+            return size
 
-        form_tag = soup.find('form')
-        if form_tag:
-            form_tag.unwrap()
+        target_file = os.path.join(self._config.output_path['base'], path)
+        if not os.path.exists(target_file):
+            return None
 
-        input_tags = soup.find_all('input')
-        for input_tag in input_tags:
-            input_tag.decompose()
+        try:
+            return self._image_sizes.record(name, target_file)
+        except OSError:
+            return None
 
-    def __fix_link(self, soup: BeautifulSoup) -> None:
-        '''ページのリンクを修正します
+    def _load_local_page_info(self, diary_id: str, file_name: str) -> dict:
+        '''ダンプ済みのファイルからページ情報を読み出します
 
-        :param soup: ページ
+        埋め込まれたページ情報が無い場合はファイル全体をパースします
+
+        :param diary_id: 日記ID
+        :param file_name: ダンプ済みのファイル名
+        :return: ページ情報
+        :raises: OSError ファイルの読み込みに失敗した場合
         '''
-        link_tag = soup.find('link', rel='stylesheet')
-        if link_tag:
-            link_tag['href'] = './stylesheet/tslove.css'
-
-        a_tags_to_diary_list = soup.find_all('a', href=re.compile(r'^(\./)?\?m=pc&a=page_fh_diary_list.*'))
-        for a_tag_to_diary_list in a_tags_to_diary_list:
-            a_tag_to_diary_list['href'] = './index.html'
-            del a_tag_to_diary_list['rel']
-            del a_tag_to_diary_list['target']
-
-        a_tags_to_dialy = soup.find_all('a', href=re.compile(r'^(\./)?\?m=pc&a=page_fh_diary.*'))
-        for a_tag_to_dialy in a_tags_to_dialy:
-            result = DiaryDumpApp.DIARY_ID_PATTERN.match(a_tag_to_dialy['href'])
-            if result:
-                diary_id = result.group('id')
-                a_tag_to_dialy['href'] = './{}.html'.format(diary_id)
+        page_info = self._read_embedded_page_info(file_name)
+        if page_info is not None:
+            return page_info
+
+        re_pattern = {
+            'prev_diary_id': re.compile(r'\./(?P<id>[0-9]+).html')
+        }
+        diary_page = DiaryPage(re_pattern)  # type: ignore
+        with open(file_name, 'r', encoding='utf-8') as file:
+            diary_page.append(file.read())
+        diary_page.release()
+
+        return {
+            'title': diary_page.title,
+            'date': diary_page.date,
+            'prev_diary_id': diary_page.prev_diary_id,
+            'diary_id': diary_id
+        }
+
+    def _open_search_index(self) -> None:
+        '''全文検索の索引(search.sqlite3)を開きます
+
+        self._config の search_index が False の場合は何もしません
+        索引を開けない場合はメッセージを出力し、索引を作らずに処理を続けます
+        '''
+        if not self._config.search_index:
+            return
+
+        file_name = os.path.join(self._config.output_path['tools'], SEARCH_INDEX_FILE_NAME)
+        try:
+            self._search_index = SearchIndex(file_name)
+        except sqlite3.Error as err:
+            print('Disable search index. {}'.format(err))
+
+    def _index_diary(self, page_info: dict, text: str) -> None:
+        '''日記を全文検索の索引へ登録します
+
+        索引への書き込みに失敗した場合はメッセージを出力し、以降の登録を行いません
+
+        :param page_info: ページ情報
+        :param text: 検索の対象とする文字列
+        '''
+        if self._search_index is None:
+            return
+
+        try:
+            with profiler().diary(page_info['diary_id']), profiler().stage(SEARCH):
+                self._search_index.update(page_info['diary_id'], page_info['title'], page_info['date'], text)
+        except sqlite3.Error as err:
+            print('Disable search index. {}'.format(err))
+            self._close_search_index()
+
+    def _index_local_diary(self, diary_id: str, file_name: str, page_info: dict) -> None:
+        '''ダンプ済みのファイルを全文検索の索引へ登録します
+
+        索引に登録済みの日記は読み込みません
+
+        :param diary_id: 日記ID
+        :param file_name: ダンプ済みのファイル名
+        :param page_info: ページ情報
+        :raises: OSError ファイルの読み込みに失敗した場合
+        :raises: ValueError ファイルが UTF-8 として読めない場合
+        '''
+        if self._search_index is None or diary_id in self._search_index:
+            return
+
+        with profiler().diary(diary_id), profiler().stage(SEARCH):
+            with open(file_name, 'r', encoding='utf-8') as file:
+                soup = make_soup(file.read())
+            try:
+                text = extract_diary_text(soup)
+            finally:
+                soup.decompose()
+
+        self._index_diary(page_info, text)
+
+    def _output_search_json(self) -> None:
+        '''ブラウザから検索するための索引(search-index.js)と検索ページ(search.html)を出力します
+
+        self._config の search_json が False の場合は何もしません
+
+        :raises: OSError ファイルの書き込みに失敗した場合
+        '''
+        if not self._config.search_json or self._search_index is None:
+            return
+
+        base = self._config.output_path['base']
+        with open(os.path.join(base, 'search-index.js'), 'w', encoding='utf-8') as file:
+            file.write(SEARCH_DATA_PREFIX)
+            self._search_index.export_json(file)
+            file.write(SEARCH_DATA_SUFFIX)
+
+        with open(os.path.join(base, 'search.html'), 'w', encoding='utf-8') as file:
+            write_search_page(file)
+
+    def _close_search_index(self) -> None:
+        '''全文検索の索引を閉じます'''
+        if self._search_index is not None:
+            self._search_index.close()
+            self._search_index = None
+
+    def _start_diary_pool(self) -> None:
+        '''日記取得用のワーカープールを開始します
+
+        self._config の diary_workers 属性を利用します
+        '''
+        self._diary_pool = AssetPool(self._config.diary_workers, self._config.diary_workers)
+
+    def _finish_diary_pool(self, cancel=False) -> None:
+        '''日記取得用のワーカープールを停止します
+
+        :param cancel: 開始前の取得を取り消す場合 True
+        '''
+        if self._diary_pool:
+            if cancel:
+                self._cancel_diary_jobs()
+            self._diary_pool.shutdown()
+            self._diary_pool = None
+        self.__diary_jobs.clear()
+
+    def _cancel_diary_jobs(self) -> None:
+        '''投入済みの日記の取得のうち開始前のものを取り消します'''
+        for future in self.__diary_jobs:
+            future.cancel()
+
+    def _dump_diary_in_background(self, diary_id: str, file_name: str) -> Future:
+        '''日記のダンプをワーカープールへ投入します
+
+        :param diary_id: 日記ID
+        :param file_name: 出力先ファイル名
+        :return: ページ情報を結果とするFuture
+        '''
+        assert self._diary_pool is not None
+
+        host = urlparse(self._web.url).netloc
+        future = self._diary_pool.submit(host, self._dump_diary, diary_id, file_name)
+        self.__diary_jobs[future] = diary_id
+        return future
+
+    def _output_profile(self) -> None:
+        '''プロファイラの集計結果を表示してファイルへ書き出します
+
+        self._config の output_path, profile_stats 属性を利用します
+        日記ごとの集計結果は tools/profile.json に、cProfile の結果は profile_stats に書き出します
+        プロファイラが無効な場合は何もしません
+        '''
+        assert hasattr(self._config, 'output_path')
+        assert hasattr(self._config, 'profile_stats')
+
+        stage_profiler = profiler()
+        if not stage_profiler.enabled:
+            return
+
+        print('\n' + stage_profiler.report() + '\n')
+
+        file_name = os.path.join(self._config.output_path['tools'], 'profile.json')
+        try:
+            with open(file_name, 'w', encoding='utf-8') as file:
+                stage_profiler.write_json(file)
+            if self._config.profile_stats and stage_profiler.dump_stats(self._config.profile_stats):
+                print('cProfile stats saved to {}.'.format(self._config.profile_stats))
+        except OSError as err:
+            print('Can not save profile. {}'.format(err))
+
+    def __report(self, page_info: dict, source: str) -> None:
+        '''日記の処理結果を表示します
+
+        長時間の実行中も状況を確認できるように、リクエストの計測結果を一定時間ごとに書き出します
+        '''
+        print('diary id {} ({}:{}) processed. ({})'.format(page_info['diary_id'],
+                                                           page_info['date'].strftime('%Y-%m-%d'),
+                                                           page_info['title'],
+                                                           source))
+        try:
+            self._save_metrics(force=False)
+        except OSError:
+            pass
+
+    def _open_shared_assets(self) -> None:
+        '''対象の間で共有するキャッシュと画像ストアを開き、アセット取得用のワーカープールを開始します
+
+        :raises: OSError ファイルの読み込みに失敗した場合
+        '''
+        self._load_http_cache()
+        self._open_image_store()
+        self._start_asset_pool()
+
+    def _close_shared_assets(self) -> None:
+        '''対象の間で共有するキャッシュと画像ストア、リクエストの計測結果を保存します
+
+        保存の失敗はメッセージの出力のみで処理を継続します
+        '''
+        for save in (self._save_http_cache, self._save_image_store, self._save_metrics):
+            try:
+                save()
+            except OSError:
+                pass
+
+    def _share_pools(self, owner: 'DiaryDumpApp') -> None:
+        '''owner のワーカープールと画像ストアを利用するようにします
+
+        :param owner: ワーカープールと画像ストアを開始したアプリケーション
+        '''
+        self._asset_pool = owner._asset_pool
+        self._diary_pool = owner._diary_pool
+        self._image_store = owner._image_store
+
+    def _prepare_target(self) -> None:
+        '''スタイルシートをダンプし、索引を開いてダンプの対象の日記を調べます
+
+        :raises: WebAccessError スタイルシートや日記の一覧の取得に失敗した場合
+        :raises: OSError ファイルの入出力に失敗した場合
+        :raises: ValueError 日記が一つも見つからなかった場合
+        '''
+        print('Dump stylesheet', end='.....', flush=True)
+        self._dump_stylesheet(self._config.refresh_assets)
+        print('done.')
+        print('Open archive index', end='.....', flush=True)
+        self._open_archive()
+        self._open_search_index()
+        print('done.')
+        print('Discover diaries', end='.....', flush=True)
+        self.__fingerprints = {diary_id: fingerprint for diary_id, _, fingerprint in self._discover_diaries()}
+        self.__diary_ids = self._filter_diary_ids(list(self.__fingerprints))
+        print('{} diaries.\n'.format(len(self.__diary_ids)))
+
+    def _schedule_diaries(self) -> Iterator[Future]:
+        '''ダンプ済みの日記を処理しながら、取得が必要な日記をワーカープールへ投入します
+
+        日記を一つ投入するたびにそのFutureを返すので、呼び出し元は複数の対象の投入を交互に進められます
+
+        :return: 投入した取得処理のFutureのイテレータ
+        '''
+        assert self._archive is not None
+
+        for diary_id in self.__diary_ids:
+            file_name = os.path.join(self._config.output_path['base'], '{}.html'.format(diary_id))
+            if not os.path.exists(file_name):
+                yield self._dump_diary_in_background(diary_id, file_name)
+                continue
+
+            page_info = self._archive.get(diary_id)
+            if self._config.sync and (page_info is None or page_info['fingerprint'] != self.__fingerprints[diary_id]):
+                self.__changed.add(diary_id)
+                yield self._dump_diary_in_background(diary_id, file_name)
+                continue
+
+            if page_info is not None:
+                source = 'page_info'
             else:
-                a_tag_to_dialy['href'] = '#'
-            del a_tag_to_dialy['rel']
-            del a_tag_to_dialy['target']
-
-        a_tags_to_top = soup.find_all('a', href='./')
-        for a_tag_to_top in a_tags_to_top:
-            a_tag_to_top['href'] = './index.html'
-            del a_tag_to_top['rel']
-            del a_tag_to_top['target']
-
-        a_tags_to_action = soup.find_all('a', href=re.compile(r'^(\./)?\?m=pc&a=.+'))
-        for a_tag_to_action in a_tags_to_action:
-            a_tag_to_action['href'] = '#'
-            del a_tag_to_action['rel']
-            del a_tag_to_action['target']
-
-        a_tags_to_img = soup.find_all('a', href=re.compile(r'^(\./)?img.php.+'))
-        for a_tag_to_img in a_tags_to_img:
-            a_tag_to_img['href'] = './images/' + self._find_filename_from_src_path(a_tag_to_img['href'])
-
-        img_tags = soup.find_all('img')
-        for img_tag in img_tags:
-            path = os.path.join('./images/', self._find_filename_from_src_path(img_tag['src']))
-            if 'w=120&h=120' in img_tag['src']:
-                target_file = os.path.join(self._config.output_path['base'], path)
-
-                if os.path.exists(target_file):
-                    image = Image.open(target_file)
-                    if image.size[0] == image.size[1]:
-                        img_tag['width'] = 120
-                        img_tag['height'] = 120
-                    elif image.size[0] > image.size[1]:
-                        img_tag['width'] = 120
-                    else:
-                        img_tag['height'] = 120
-                else:
-                    img_tag['width'] = 120
-                    img_tag['height'] = 120
-            img_tag['src'] = path
-
-        for script_tag in soup.find_all('script', src=True):
-            script_tag['src'] = 'scripts/' + os.path.basename(script_tag['src'])
+                source = 'local'
+                try:
+                    page_info = self._load_local_page_info(diary_id, file_name)
+                    self._record_page_info(page_info)
+                    self.__touched_months.add((page_info['date'].year, page_info['date'].month))
+                except Exception as err:  # pylint: disable=W0703
+                    print('Processing diary id {} failed. (local) {}'.format(diary_id, err))
+                    self.__failures += 1
+                    continue
+
+            try:
+                self._index_local_diary(diary_id, file_name, page_info)
+            except (OSError, ValueError) as err:
+                print('Can not index diary id {}. {}'.format(diary_id, err))
+
+            self.__dump_process[source] += 1
+            self.__report(page_info, source)
+
+    def _collect_diary(self, future: Future) -> None:
+        '''取得が完了した日記のページ情報を索引へ登録します
+
+        取得中に発生した例外は種類を問わず失敗として数え、残りの日記の処理を続けます
+
+        :param future: _schedule_diaries が返したFuture
+        '''
+        diary_id = self.__diary_jobs[future]
+        try:
+            page_info = future.result()
+            if not page_info.pop('output').result():
+                self.__failures += 1
+                return
+            page_info['fingerprint'] = self.__fingerprints[diary_id]
+            text = page_info.pop('text', None)
+            self._record_page_info(page_info)
+            self.__touched_months.add((page_info['date'].year, page_info['date'].month))
+        except Exception as err:  # pylint: disable=W0703
+            print('Processing diary id {} failed. {}'.format(diary_id, err))
+            self.__failures += 1
+            return
+
+        if text is not None:
+            self._index_diary(page_info, text)
+
+        source = 'sync' if diary_id in self.__changed else 'remote'
+        self.__dump_process[source] += 1
+        self.__report(page_info, source)
+
+    def _finish_target(self) -> None:
+        '''画像の大きさのキャッシュと全文検索の索引を保存し、インデックスファイルを出力します
+
+        索引はいずれの場合も閉じます
+
+        :raises: OSError インデックスファイルの書き込みに失敗した場合
+        '''
+        try:
+            self._save_image_sizes()
+        except OSError:
+            pass
+
+        try:
+            self._output_search_json()
+        except OSError as err:
+            print('Can not save search index file. {}'.format(err))
+
+        try:
+            self._output_index(self.__touched_months)
+        except OSError as err:
+            print('Can not save index file. {}'.format(err))
+            raise err
+        finally:
+            self._close_search_index()
+            self._close_archive()
+
+    def _summary(self) -> Tuple[int, int]:
+        '''処理結果
+
+        :return: (処理した日記の数, 失敗した日記の数)
+        '''
+        return sum(self.__dump_process.values()), self.__failures
+
+    def __print_summary(self, total: int, failures: int) -> int:
+        '''処理結果を表示します
+
+        :param total: 処理した日記の数
+        :param failures: 失敗した数
+        :return: 終了コード
+        '''
+        print('done. Total {} diaries.'.format(total))
+        requests, retries, received = self._sessions.metrics.summary()
+        print('{} requests ({} retries), {:.1f} MB received.'.format(requests, retries, received / 1024 / 1024))
+        if failures:
+            print('{} diaries failed.'.format(failures))
+            return 1
+
+        return 0
 
     def run(self) -> int:
         '''アプリケーション処理本体
 
+        self._config の targets が空でない場合は _run_targets で複数の対象をダンプします
+
         :return: 正常終了時 0
         '''
         print('dumpdiary copyright (c) 2018\n')
 
+        if self._config.targets:
+            return self._run_targets()
+
         if not self._login():
             print('\nLogin failed.')
             return 1
@@ -321,118 +1029,148 @@ class DiaryDumpApp(DumpApp):  # pylint: disable=R0903
         try:
             print('Prepare directories', end='.....', flush=True)
             self._prepare_directories()
+            self._load_image_sizes()
+            self._open_shared_assets()
             print('done.')
-            print('Dump stylesheet', end='.....', flush=True)
-            self._dump_stylesheet()
-            print('done.')
-            print('Load page_info file', end='.....', flush=True)
-            self._load_page_info()
-            print('done.')
-            print('Check first diary id ', end='.....', flush=True)
-            if self._config.diary_id_from:
-                diary_id = self._config.diary_id_from
-            else:
-                diary_id = self._check_first_diary_id()
-            print('{}\n'.format(diary_id))
+            self._prepare_target()
         except (WebAccessError, OSError, ValueError):
+            self._finish_asset_pool()
+            self._close_search_index()
+            self._close_archive()
             return 1
 
-        interval = 0  # 初回のダンプではインターバルを取らない
-        without_retry = 0
-        dump_process = {
-            'page_info': 0,
-            'local': 0,
-            'remote': 0
-        }
-        re_pattern = {
-            'prev_diary_id': re.compile(r'\./(?P<id>[0-9]+).html')
-        }
-
-        while diary_id:
+        self._start_diary_pool()
+        completed = False
+        try:
             try:  # KeyBoardinterrupt
-                file_name = os.path.join(self._config.output_path['base'], '{}.html'.format(diary_id))
-                if os.path.exists(file_name):
-                    if diary_id in self._page_info:
-                        source = 'page_info'
-                        page_info = self._page_info[diary_id]
-                        dump_process[source] += 1
-                    else:
-                        source = 'local'
-                        diary_page = DiaryPage(re_pattern)  # type: ignore
-
-                        try:
-                            with open(file_name, 'r', encoding='utf-8') as file:
-                                diary_page.append(file.read())
-                        except OSError as err:
-                            print('Processing diary id {} failed. (local) {}'.format(diary_id, err))
-                            return 1
-
-                        page_info = {
-                            'title': diary_page.title,
-                            'date': diary_page.date,
-                            'prev_diary_id': diary_page.prev_diary_id,
-                            'diary_id': diary_id
-                        }
-                        dump_process[source] += 1
-                else:
-                    source = 'remote'
-
-                    time.sleep(interval)
-                    if interval < DiaryDumpApp.INTERVAL_SHORT:
-                        interval = DiaryDumpApp.INTERVAL_LONG
-
-                    retry_count = self._web.total_retries
-
-                    try:
-                        page_info = self._dump_diary(diary_id, file_name)
-                    except (WebAccessError, OSError) as err:
-                        print('Processing diary id {} failed. {}'.format(diary_id, err))
-                        return 1
-
-                    dump_process[source] += 1
-
-                    if self._web.total_retries == retry_count:
-                        without_retry += 1
-                    else:
-                        without_retry = 0
-
-                    if interval != DiaryDumpApp.INTERVAL_SHORT and without_retry > DiaryDumpApp.INTERVAL_CHANGE_TIMING:
-                        print('Interval changes to {} sec.'.format(DiaryDumpApp.INTERVAL_SHORT))
-                        interval = DiaryDumpApp.INTERVAL_SHORT
-                    if interval != DiaryDumpApp.INTERVAL_LONG and without_retry <= DiaryDumpApp.INTERVAL_CHANGE_TIMING:
-                        print('Interval changes to {} sec.'.format(DiaryDumpApp.INTERVAL_LONG))
-                        interval = DiaryDumpApp.INTERVAL_LONG
-
-                print('diary id {} ({}:{}) processed. ({})'.format(diary_id,
-                                                                   page_info['date'].strftime('%Y-%m-%d'),
-                                                                   page_info['title'],
-                                                                   source))
-
-                if source != 'page_info':
-                    self._page_info[diary_id] = page_info
-
-                if diary_id == self._config.diary_id_to or page_info['prev_diary_id'] is None:
-                    break
+                for _ in self._schedule_diaries():
+                    pass
 
-                diary_id = page_info['prev_diary_id']
+                for future in as_completed(list(self.__diary_jobs)):
+                    self._collect_diary(future)
+
+                completed = True
 
             except KeyboardInterrupt:
                 print('abort loop.')
-                break
-        try:
-            self._save_page_info()
-        except OSError:
-            pass
+
+            finally:
+                self._finish_diary_pool(cancel=not completed)
+                print('Wait for images and scripts', end='.....', flush=True)
+                self._finish_asset_pool()
+                print('done.')
+                self._close_shared_assets()
+
+            try:
+                self._finish_target()
+            except OSError:
+                return 1
+
+        finally:
+            self._close_search_index()
+            self._close_archive()
+            self._output_profile()
+
+        total, failures = self._summary()
+        return self.__print_summary(total, failures)
+
+    def _run_targets(self) -> int:
+        '''self._config の targets で指定した複数の対象をダンプします
+
+        アカウントごとに一度ログインし、対象ごとに output_path の下の Target.name のディレクトリへダンプします
+        ワーカープール、画像ストア、条件付きリクエストのキャッシュ、流量制御は対象の間で共有します
+        日記の取得は各対象から一つずつ順番にワーカープールへ投入し、対象の間で公平に進めます
+
+        :return: 正常終了時 0
+        '''
+        failures = 0
+        logins: Dict[str, bool] = {}
+        apps: List[DiaryDumpApp] = []
+        for target in self._config.targets:
+            app = DiaryDumpApp(replace(self._config, targets=[], member_id=target.member_id,
+                                       output_path=make_output_path(os.path.join(self._config.output_path['base'],
+                                                                                 target.name))),
+                               self._sessions, target.account)
+            if target.account not in logins:
+                logins[target.account] = app._login()
+                print('\nLogin {} for {}.'.format('success' if logins[target.account] else 'failed', target.account))
+            if logins[target.account]:
+                apps.append(app)
+            else:
+                failures += 1
+
+        if not apps:
+            return 1
 
         try:
-            self._output_index()
+            print('Prepare directories', end='.....', flush=True)
+            os.makedirs(self._config.output_path['tools'], exist_ok=True)
+            self._open_shared_assets()
+            print('done.')
         except OSError as err:
-            print('Can not save index file. {}'.format(err))
+            print('Can not prepare directories. {}'.format(err))
+            self._finish_asset_pool()
             return 1
 
-        print('done. Total {} diaries.'.format(sum(dump_process.values())))
+        self._start_diary_pool()
+        ready: List[DiaryDumpApp] = []
+        for target, app in zip(self._config.targets, apps):
+            print('\n[{}]'.format(target.name))
+            app._share_pools(self)
+            try:
+                print('Prepare directories', end='.....', flush=True)
+                app._prepare_directories()
+                app._load_image_sizes()
+                print('done.')
+                app._prepare_target()
+                ready.append(app)
+            except (WebAccessError, OSError, ValueError):
+                app._close_search_index()
+                app._close_archive()
+                failures += 1
+
+        jobs: Dict[Future, DiaryDumpApp] = {}
+        completed = False
+        total = 0
+        try:
+            try:  # KeyBoardinterrupt
+                for app, future in round_robin([zip(repeat(app), app._schedule_diaries()) for app in ready]):
+                    jobs[future] = app
+
+                for future in as_completed(list(jobs)):
+                    jobs[future]._collect_diary(future)
 
-        return 0
+                completed = True
+
+            except KeyboardInterrupt:
+                print('abort loop.')
+
+            finally:
+                if not completed:
+                    for app in ready:
+                        app._cancel_diary_jobs()
+                self._finish_diary_pool()
+                print('Wait for images and scripts', end='.....', flush=True)
+                self._finish_asset_pool()
+                print('done.')
+                self._close_shared_assets()
+
+            for app in ready:
+                try:
+                    app._finish_target()
+                except OSError:
+                    failures += 1
+                processed, failed = app._summary()
+                total += processed
+                failures += failed
+
+        finally:
+            for app in ready:
+                app._close_search_index()
+                app._close_archive()
+            self._output_profile()
+
+        return self.__print_summary(total, failures)
 
 
 def main():
@@ -0,0 +1,47 @@
+'''diarydump でダンプした日記を全文検索するプログラム'''
+
+import argparse
+import os
+import sqlite3
+import sys
+import time
+
+from tslove.core.search import SearchIndex, SEARCH_INDEX_FILE_NAME
+
+DEFAULT_LIMIT = 20
+
+
+def main():
+    '''エントリポイント'''
+    parser = argparse.ArgumentParser(prog='diarysearch')
+    parser.add_argument('query', help='words to search. diaries containing all words are shown', metavar='<word>', nargs='+')
+    parser.add_argument('-o', '--output', help='dumped directory. (default ./dump)', metavar='<PATH>', default='./dump')
+    parser.add_argument('-n', '--limit', help='max diaries to show. (default {})'.format(DEFAULT_LIMIT),
+                        metavar='<n>', type=int, default=DEFAULT_LIMIT)
+    args = parser.parse_args()
+
+    file_name = os.path.join(args.output, 'tslove-tools', SEARCH_INDEX_FILE_NAME)
+    if not os.path.exists(file_name):
+        print('Search index {} not found. Run diarydump first.'.format(file_name))
+        sys.exit(1)
+
+    try:
+        with SearchIndex(file_name) as search_index:
+            start = time.perf_counter()
+            results = search_index.search(' '.join(args.query), limit=args.limit if args.limit > 0 else None)
+            elapsed = time.perf_counter() - start
+    except sqlite3.Error as err:
+        print('Can not search {}. {}'.format(file_name, err))
+        sys.exit(1)
+
+    for result in results:
+        print('{} {} {}'.format(result['date'].strftime('%Y-%m-%d'), result['diary_id'], result['title']))
+        print('    {}'.format(result['snippet']))
+        print('    {}'.format(os.path.join(args.output, '{}.html'.format(result['diary_id']))))
+
+    print('{} diaries found. ({:.1f} ms)'.format(len(results), elapsed * 1000))
+    sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
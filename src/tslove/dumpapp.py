@@ -1,29 +1,62 @@
 '''ダンプアプリケーションの基本的な機能を提供します'''
 
-import datetime
 import getpass
-import json
 import os
 import re
-from typing import Any, List, Tuple
-
-from tslove.core.web import TsLoveWeb
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urljoin, urlparse
+
+from bs4 import BeautifulSoup  # type: ignore
+
+from tslove.core.web import DEFAULT_URL
+from tslove.core.session import SessionPool, DEFAULT_ACCOUNT
+from tslove.core.pool import AssetPool
+from tslove.core.imageinfo import ImageSizeCache
+from tslove.core.imagestore import ImageStore
+from tslove.core.archive import ArchiveIndex
+from tslove.core.serializer import write_html, COMPACT, COMPATIBLE
 from tslove.core.exception import WebAccessError
+from tslove.core.profiler import profiler, StageWriter, IMAGE, SCRIPT, SERIALIZE
+
+METRICS_INTERVAL = 60
 
 
 class DumpApp():  # pylint: disable=R0903
     '''ダンプアプリケーションの基底クラス'''
     STYLESHEET_URL_PATTERN = re.compile(r'url\((?P<path>.+)\)')
+    IMG_FILENAME_PATTERN = re.compile(r'filename=(?P<filename>[^&;?]+)')
+    IMG_PATH_PATTERN = re.compile(r'./img\.php.+filename=(?P<filename>[^&;?]+)')
+    IMG_SKIN_PATH_PATTERN = re.compile(r'./img_skin\.php.+image_filename=(?P<filename>[^&;?]+)')
 
-    def __init__(self) -> None:
+    def __init__(self, url: str = DEFAULT_URL, sessions: Optional[SessionPool] = None,
+                 account: str = DEFAULT_ACCOUNT) -> None:
+        '''
+        :param url: T'sLove の起点URL。sessions を指定した場合は sessions の起点URLを利用します
+        :param sessions: セッションプール。省略した場合は作成します
+        :param account: 利用するセッションのアカウント名
+        '''
         self._config: Any = None
-        self._web = TsLoveWeb(url='https://tslove.net/')
-        self._page_info: dict = {}
+        self._sessions = sessions if sessions is not None else SessionPool(url)
+        self._account = account
+        self._web = self._sessions.client(account)
+        self._archive: Optional[ArchiveIndex] = None
+        self._image_sizes = ImageSizeCache('')
+        self._image_store: Optional[ImageStore] = None
+        self._asset_pool: Optional[AssetPool] = None
+        self.__asset_jobs: Dict[str, Future] = {}
+        self.__asset_jobs_lock = threading.Lock()
+        self.__refreshed_assets: set = set()
+        self.__metrics_saved = time.monotonic()
 
     def _login(self) -> bool:
         '''ログイン処理を行います
 
         self._config の show_session_id, php_session_id, echo_password 属性を利用します
+        セッションが既にログイン済みの場合は何もしません
 
         :return: ログインに成功した場合 True
         '''
@@ -31,12 +64,18 @@ class DumpApp():  # pylint: disable=R0903
         assert hasattr(self._config, 'php_session_id')
         assert hasattr(self._config, 'echo_password')
 
+        if self._web.logged_in:
+            return True
+
         try:
             if self._config.php_session_id is not None:
                 if self._web.login(None, None, self._config.php_session_id):
                     return True
 
-            print('Enter username and password')
+            if self._account == DEFAULT_ACCOUNT:
+                print('Enter username and password')
+            else:
+                print('Enter username and password for {}'.format(self._account))
             username = input('user: ')
             if not self._config.echo_password:
                 password = getpass.getpass(prompt='pass: ')
@@ -71,36 +110,152 @@ class DumpApp():  # pylint: disable=R0903
             print('Can not create directory. {}'.format(err))
             raise err
 
-    def _dump_image(self, src_path: str, dst_path: str, overwrite=False) -> None:
+    def _start_asset_pool(self) -> None:
+        '''アセット取得用のワーカープールを開始します
+
+        self._config の asset_workers, per_host_connections 属性を利用します
+        '''
+        assert hasattr(self._config, 'asset_workers')
+        assert hasattr(self._config, 'per_host_connections')
+
+        self._asset_pool = AssetPool(self._config.asset_workers, self._config.per_host_connections)
+
+    def _finish_asset_pool(self) -> None:
+        '''投入済みのアセットの取得が完了するのを待ってワーカープールを停止します'''
+        if self._asset_pool:
+            self._asset_pool.shutdown()
+            self._asset_pool = None
+
+    def __submit_asset_job(self, src_path: str, dst_path: str, job) -> Future:
+        '''アセットの取得をワーカープールへ投入します
+
+        同じ保存先への取得が実行中の場合は新たに投入せず実行中のFutureを返します
+
+        :param src_path: 取得元のパス
+        :param dst_path: 保存先のパス
+        :param job: 取得を行う関数
+        :return: 取得処理のFuture
+        '''
+        assert self._asset_pool is not None
+
+        with self.__asset_jobs_lock:
+            future = self.__asset_jobs.get(dst_path)
+            if future is not None and not future.done():
+                return future
+
+            host = urlparse(urljoin(self._web.url, src_path)).netloc
+            future = self._asset_pool.submit(host, job)
+            self.__asset_jobs[dst_path] = future
+
+        def forget(done: Future) -> None:
+            with self.__asset_jobs_lock:
+                if self.__asset_jobs.get(dst_path) is done:
+                    del self.__asset_jobs[dst_path]
+
+        future.add_done_callback(forget)
+        return future
+
+    def _dump_image_in_background(self, src_path: str, dst_path: str, overwrite=False, revalidate=False) -> Future:
+        '''画像の取得をワーカープールへ投入します
+
+        取得の失敗はメッセージの出力のみで処理を継続します。Futureが例外を持つことはありません
+
+        :param src_path: 取得元のパス
+        :param dst_path: 保存先のパス
+        :param overwrite: 画像を上書きする場合 True
+        :param revalidate: 条件付きリクエストを利用する場合 True
+        :return: 取得処理のFuture
+        '''
+        def job() -> None:
+            try:
+                self._dump_image(src_path, dst_path, overwrite, revalidate)
+            except (WebAccessError, OSError, ValueError) as err:
+                print('Can not dump image {} -> {}. {}'.format(src_path, dst_path, err))
+
+        return self.__submit_asset_job(src_path, dst_path, profiler().bind(job, IMAGE))
+
+    def _dump_image(self, src_path: str, dst_path: str, overwrite=False, revalidate=False) -> None:
         '''画像を取得します
 
         img.phpを利用する場合オリジナルの画像サイズで取得するためにパラメータを組み立て直しています
+        取得した画像はデコードせずにそのまま保存し、ヘッダから読んだ大きさを記録します
+
+        revalidate が True の場合は ETag と Last-Modified を記録し、上書き時は変更が無ければ取得を省略します
+
+        画像ストアを利用している場合、取得済みの取得元はストアからリンクを張って取得を省略し、
+        取得した画像はストアへ登録して同じ内容の画像と実体を共有します
 
         :param src_path: 取得元のパス
         :param dst_path: 保存先のパス
         :param overwrite: 画像を上書きする場合 True
+        :param revalidate: 条件付きリクエストを利用する場合 True
         :raise: WebAccessError 画像の取得に失敗した場合
         :raise: OSError 画像の保存に失敗した場合
         :raise: ValueError 取得元のパスからファイル名を取得出来なかった場合
         '''
-        pattern = re.compile(r'filename=(?P<filename>[^&;?]+)')
-
         if os.path.exists(dst_path) and overwrite is False:
             return
 
         if 'img.php' in src_path:
-            result = pattern.search(src_path)
-            if result:
-                params = {'m': 'pc',
-                          'filename': result.group('filename')
-                          }
-                image = self._web.get_image('img.php', params)
-            else:
+            result = DumpApp.IMG_FILENAME_PATTERN.search(src_path)
+            if not result:
                 raise ValueError('Src filename not match')
+            store_key = 'img.php?filename=' + result.group('filename')
+        else:
+            store_key = src_path
+
+        if overwrite is False and self.__link_from_image_store(store_key, dst_path):
+            self._image_sizes.record(os.path.basename(dst_path), dst_path)
+            return
+
+        if 'img.php' in src_path:
+            params = {'m': 'pc',
+                      'filename': result.group('filename')
+                      }
+            self._web.download_image('img.php', dst_path, params, revalidate)
         else:
-            image = self._web.get_image(src_path)
+            self._web.download_image(src_path, dst_path, revalidate=revalidate)
+
+        self.__add_to_image_store(store_key, dst_path)
+        self._image_sizes.record(os.path.basename(dst_path), dst_path)
 
-        image.save(dst_path)
+    def __link_from_image_store(self, key: str, dst_path: str) -> bool:
+        '''画像ストアに取得済みの画像があれば保存先へリンクを張ります
+
+        :param key: 取得元
+        :param dst_path: 保存先のパス
+        :return: リンクを張った場合 True
+        '''
+        image_store = self._image_store
+        if image_store is None:
+            return False
+
+        try:
+            return image_store.link(key, dst_path)
+        except OSError as err:
+            self.__disable_image_store(err)
+            return False
+
+    def __add_to_image_store(self, key: str, dst_path: str) -> None:
+        '''取得した画像を画像ストアへ登録します
+
+        :param key: 取得元
+        :param dst_path: 保存先のパス
+        '''
+        image_store = self._image_store
+        if image_store is None:
+            return
+
+        try:
+            image_store.add(key, dst_path)
+        except OSError as err:
+            self.__disable_image_store(err)
+
+    def __disable_image_store(self, err: OSError) -> None:
+        '''リンクを張れないなどの理由で画像ストアの利用を中止します'''
+        if self._image_store is not None:
+            print('Disable image store {}. {}'.format(self._image_store.root, err))
+            self._image_store = None
 
     @staticmethod
     def _find_filename_from_src_path(path: str) -> str:
@@ -113,41 +268,44 @@ class DumpApp():  # pylint: disable=R0903
         :param path: パス
         :return: ファイル名
         '''
-        img_pattern = re.compile(r'./img\.php.+filename=(?P<filename>[^&;?]+)')
-        img_skin_pattern = re.compile(r'./img_skin\.php.+image_filename=(?P<filename>[^&;?]+)')
-
-        result = img_pattern.search(path)
+        result = DumpApp.IMG_PATH_PATTERN.search(path)
         if result:
             return result.group('filename')
 
-        result = img_skin_pattern.search(path)
+        result = DumpApp.IMG_SKIN_PATH_PATTERN.search(path)
         if result:
             return result.group('filename')
 
         return os.path.basename(path)
 
-    def _dump_stylesheet(self) -> None:
+    def _dump_stylesheet(self, refresh=False) -> None:
         '''スタイルシートをダンプします
 
         self._config の output_path 属性を利用します
 
+        refresh が True の場合はダンプ済みのスタイルシートと画像を条件付きリクエストで更新します
+        スタイルシートに変更が無い場合も、ダンプ済みの画像は条件付きリクエストで確認します
+
+        :param refresh: ダンプ済みの場合も更新を確認する場合 True
         :raises: WebAccessError スタイルシート本文の取得に失敗した場合
         :raises: OSError ファイルの出力に失敗した場合
         '''
         assert hasattr(self._config, 'output_path')
 
         file_name = os.path.join(self._config.output_path['stylesheet'], 'tslove.css')
-        if os.path.exists(file_name):
+        exists = os.path.exists(file_name)
+        if exists and refresh is False:
             return
 
         try:
-            stylesheet = self._web.get_stylesheet()
+            stylesheet = self._web.get_stylesheet(revalidate=exists)
+            if stylesheet is None:
+                for src, dst in self.__create_dumped_stylesheet_image_path_list():
+                    self._dump_image_in_background(src, dst, overwrite=True, revalidate=True)
+                return
+
             for src, dst in self.__create_stylesheet_image_path_list(stylesheet):
-                try:
-                    self._dump_image(src, dst)
-                except (WebAccessError, OSError, ValueError) as err:
-                    print('Can not dump image {} -> {}. {}'.format(src, dst, err))
-                    continue
+                self._dump_image_in_background(src, dst, overwrite=refresh, revalidate=True)
 
             with open(file_name, 'w', encoding='utf-8') as file:
                 for line in stylesheet.splitlines():
@@ -186,12 +344,49 @@ class DumpApp():  # pylint: disable=R0903
 
         return path_list
 
+    def __create_dumped_stylesheet_image_path_list(self) -> List[Tuple[str, str]]:
+        '''ダンプ済みのスタイルシート中の画像の取得元・保存先のリストを作成します
+
+        self._config の output_path 属性を利用します
+
+        保存したスタイルシートは画像のパスを書き換えているため、取得元は条件付きリクエストのキャッシュのキーから求めます
+        保存先が存在しない画像は含みません
+
+        :return: 画像の取得元・保存先のタプルのリスト
+        '''
+        assert hasattr(self._config, 'output_path')
+
+        output_path = self._config.output_path['stylesheet']
+        prefix = self._web.url
+
+        path_list = []
+        for key in self._web.validator_cache.keys():
+            if not key.startswith(prefix):
+                continue
+            src_path = key[len(prefix):]
+            if DumpApp.IMG_SKIN_PATH_PATTERN.match(src_path) or src_path.startswith('./skin/'):
+                dst_path = os.path.join(output_path, self._find_filename_from_src_path(src_path))
+                if os.path.exists(dst_path):
+                    path_list.append((src_path, dst_path))
+
+        return path_list
+
+    @staticmethod
+    def _is_ignored_script(path: str) -> bool:
+        '''ダンプの対象としないスクリプトかを判定します
+
+        :param path: スクリプトのパス
+        :return: 対象としない場合 True
+        '''
+        return path.startswith('./js/prototype.js') or path.startswith('./js/Selection.js') or path == './js/comment.js'
+
     def _fetch_scripts(self, script_paths: set, overwrite=False) -> None:
-        '''スクリプトを取得します
+        '''スクリプトの取得をワーカープールへ投入します
 
         self._config の output_path 属性を利用します
 
         スクリプトの取得の失敗はメッセージの出力のみで処理を継続します。例外の送出はありません
+        保存済みのスクリプトの上書きは条件付きリクエストで行い、一度の実行につき一回だけ確認します
 
         :params script_paths: 取得するスクリプトのパスの集合
         :param overwrite: スクリプトを上書きする場合 True
@@ -202,62 +397,240 @@ class DumpApp():  # pylint: disable=R0903
 
         for path in script_paths:
 
-            if path.startswith('./js/prototype.js') or path.startswith('./js/Selection.js') or path == './js/comment.js':
+            if self._is_ignored_script(path):
                 continue
 
             filename = os.path.join(output_path, os.path.basename(path))
-            if os.path.exists(filename) and overwrite is False:
+            if os.path.exists(filename) and (overwrite is False or filename in self.__refreshed_assets):
                 continue
 
+            if overwrite:
+                self.__refreshed_assets.add(filename)
+            self.__submit_asset_job(path, filename, profiler().bind(self.__create_script_job(path, filename), SCRIPT))
+
+    def __create_script_job(self, path: str, filename: str):
+        '''スクリプトを取得して保存する関数を作成します
+
+        :param path: 取得元のパス
+        :param filename: 保存先のファイル名
+        :return: 取得を行う関数
+        '''
+        def job() -> None:
             try:
-                script = self._web.get_javascript(path)
+                script = self._web.get_javascript(path, revalidate=os.path.exists(filename))
+                if script is None:
+                    return
                 with open(filename, 'w', encoding='utf-8') as file:
                     file.write(script)
 
             except (WebAccessError, OSError) as err:
                 print('Can not get script {}. {}'.format(path, err))
-                continue
 
-    def _load_page_info(self) -> None:
-        '''ページ情報ファイルを読み込みます
+        return job
+
+    def _output_html(self, soup: BeautifulSoup, file_name: str) -> None:
+        '''HTMLファイルを出力します
+
+        self._config の compact_html 属性を利用します
+        ツリーは文書全体の文字列を作らずに少しずつ書き込みます
+        プロファイラが有効な場合は文字列化と書き込みの時間を分けて集計します
+
+        書き込みは一時ファイルに対して行い、完了後に file_name へ置き換えます
+        失敗した場合は一時ファイルのみを削除するため、既存の file_name はそのまま残ります
+
+        :param soup: 出力するツリー
+        :param file_name: 出力先ファイル名
+        :raises: OSError ファイルの書き込みに失敗した場合
+        '''
+        assert hasattr(self._config, 'compact_html')
+
+        mode = COMPACT if self._config.compact_html else COMPATIBLE
+        stage_profiler = profiler()
+        temp_file_name = file_name + '.part'
+        try:
+            with open(temp_file_name, 'w', encoding='utf-8') as file, stage_profiler.stage(SERIALIZE):
+                write_html(soup, StageWriter(file, stage_profiler) if stage_profiler.enabled else file, mode)  # type: ignore
+            os.replace(temp_file_name, file_name)
+        finally:
+            if os.path.exists(temp_file_name):
+                os.remove(temp_file_name)
+
+    def _open_archive(self) -> None:
+        '''ページ情報の索引(archive.sqlite3)を開きます
 
         self._config の output_path 属性を利用します
 
-        :raises: OSError ファイルの読み込みに失敗した場合
+        従来のページ情報ファイル(page_info.json)とそのジャーナルがある場合は索引へ取り込みます
+
+        :raises: OSError 索引を開けない場合、ページ情報ファイルの読み込みに失敗した場合
         '''
         assert hasattr(self._config, 'output_path')
 
-        def convert_datetime(dct):
-            if 'date' in dct:
-                dct['date'] = datetime.datetime.strptime(dct['date'], '%Y-%m-%d %H:%M:%S')
-            return dct
+        tools_path = self._config.output_path['tools']
+        archive_path = os.path.join(tools_path, 'archive.sqlite3')
+        page_info_path = os.path.join(tools_path, 'page_info.json')
+        journal_path = os.path.join(tools_path, 'page_info.jsonl')
 
-        page_info_path = os.path.join(self._config.output_path['tools'], 'page_info.json')
-        if os.path.exists(page_info_path):
+        try:
+            self._archive = ArchiveIndex(archive_path)
+        except sqlite3.Error as err:
+            print('Can not open archive index {}. {}'.format(archive_path, err))
+            raise OSError(err) from err
+
+        if os.path.exists(page_info_path) or os.path.exists(journal_path):
             try:
-                with open(page_info_path, 'r', encoding='utf-8') as file:
-                    self._page_info = json.load(file, object_hook=convert_datetime)
+                count = self._archive.migrate_json(page_info_path, journal_path)
+                print('{} page info migrated'.format(count), end='.....', flush=True)
+            except (OSError, ValueError) as err:
+                print('Can not migrate page info {}. {}'.format(page_info_path, err))
+                raise OSError(err) from err
 
-            except OSError as err:
-                print('Can not load page info {}. {}'.format(page_info_path, err))
-                raise err
-        else:
-            self._page_info = {}
+    def _record_page_info(self, page_info: dict) -> None:
+        '''ページ情報を索引へ登録します
 
-    def _save_page_info(self) -> None:
-        '''ページ情報ファイルを保存します
+        :param page_info: ページ情報
+        :raises: OSError 索引への書き込みに失敗した場合
+        '''
+        assert self._archive is not None
+
+        try:
+            self._archive.put(page_info)
+        except sqlite3.Error as err:
+            print('Can not record page info. {}'.format(err))
+            raise OSError(err) from err
+
+    def _close_archive(self) -> None:
+        '''ページ情報の索引を閉じます'''
+        if self._archive is not None:
+            self._archive.close()
+            self._archive = None
+
+    def _load_image_sizes(self) -> None:
+        '''画像の大きさのキャッシュファイルを読み込みます
 
         self._config の output_path 属性を利用します
 
+        :raises: OSError ファイルの読み込みに失敗した場合
+        '''
+        assert hasattr(self._config, 'output_path')
+
+        cache_path = os.path.join(self._config.output_path['tools'], 'image_size.json')
+        self._image_sizes = ImageSizeCache(cache_path)
+        try:
+            self._image_sizes.load()
+        except ValueError as err:
+            print('Ignore broken image size cache {}. {}'.format(cache_path, err))
+        except OSError as err:
+            print('Can not load image size cache {}. {}'.format(cache_path, err))
+            raise err
+
+    def _save_image_sizes(self) -> None:
+        '''画像の大きさのキャッシュファイルを保存します
+
         :raises: OSError ファイルの書き込みに失敗した場合
         '''
+        try:
+            self._image_sizes.save()
+        except OSError as err:
+            print('Can not save image size cache. {}'.format(err))
+            raise err
+
+    def _open_image_store(self) -> None:
+        '''画像ストアを開きます
+
+        self._config の output_path, image_store 属性を利用します
+        image_store が None の場合は output_path['tools'] の images ディレクトリを利用します
+
+        :raises: OSError 索引の読み込みに失敗した場合
+        '''
         assert hasattr(self._config, 'output_path')
+        assert hasattr(self._config, 'image_store')
 
-        page_info_path = os.path.join(self._config.output_path['tools'], 'page_info.json')
+        root = self._config.image_store or os.path.join(self._config.output_path['tools'], 'images')
+        self._image_store = ImageStore(root)
+        try:
+            self._image_store.load()
+        except ValueError as err:
+            print('Ignore broken image store index {}. {}'.format(root, err))
+        except OSError as err:
+            print('Can not load image store index {}. {}'.format(root, err))
+            raise err
+
+    def _save_image_store(self) -> None:
+        '''画像ストアの索引を保存します
+
+        :raises: OSError ファイルの書き込みに失敗した場合
+        '''
+        if self._image_store is None:
+            return
+
+        try:
+            self._image_store.save()
+        except OSError as err:
+            print('Can not save image store index. {}'.format(err))
+            raise err
+
+    def _load_http_cache(self) -> None:
+        '''条件付きリクエストのキャッシュファイルを読み込みます
+
+        self._config の output_path 属性を利用します
+
+        :raises: OSError ファイルの読み込みに失敗した場合
+        '''
+        assert hasattr(self._config, 'output_path')
+
+        cache_path = os.path.join(self._config.output_path['tools'], 'http_cache.json')
+        try:
+            self._web.validator_cache.load(cache_path)
+        except ValueError as err:
+            print('Ignore broken http cache {}. {}'.format(cache_path, err))
+        except OSError as err:
+            print('Can not load http cache {}. {}'.format(cache_path, err))
+            raise err
+
+    def _save_http_cache(self) -> None:
+        '''条件付きリクエストのキャッシュファイルを保存します
+
+        self._config の output_path 属性を利用します
+
+        :raises: OSError ファイルの書き込みに失敗した場合
+        '''
+        assert hasattr(self._config, 'output_path')
 
+        cache_path = os.path.join(self._config.output_path['tools'], 'http_cache.json')
         try:
-            with open(page_info_path, 'w', encoding='utf-8') as file:
-                json.dump(self._page_info, file, ensure_ascii=False, indent=2, default=str)
+            self._web.validator_cache.save(cache_path)
         except OSError as err:
-            print('Can not save page info {}. {}'.format(page_info_path, err))
+            print('Can not save http cache {}. {}'.format(cache_path, err))
             raise err
+
+    def _save_metrics(self, force: bool = True) -> None:
+        '''リクエストの計測結果をファイルへ書き出します
+
+        self._config の stats_json, stats_prometheus 属性を利用します。指定が無い形式は書き出しません
+        force が False の場合は前回の書き出しから METRICS_INTERVAL 秒以上経過しているときだけ書き出します
+        書き込みは一時ファイルに対して行い、完了後に置き換えます
+
+        :param force: 経過時間によらず書き出す場合 True
+        :raises: OSError ファイルの書き込みに失敗した場合
+        '''
+        assert hasattr(self._config, 'stats_json')
+        assert hasattr(self._config, 'stats_prometheus')
+
+        now = time.monotonic()
+        if not force and now - self.__metrics_saved < METRICS_INTERVAL:
+            return
+        self.__metrics_saved = now
+
+        metrics = self._web.metrics
+        for file_name, write in ((self._config.stats_json, metrics.write_json),
+                                 (self._config.stats_prometheus, metrics.write_prometheus)):
+            if not file_name:
+                continue
+            try:
+                with open(file_name + '.tmp', 'w', encoding='utf-8') as file:
+                    write(file)
+                os.replace(file_name + '.tmp', file_name)
+            except OSError as err:
+                print('Can not save stats {}. {}'.format(file_name, err))
+                raise err
@@ -0,0 +1,104 @@
+import datetime
+import json
+import os
+import sqlite3
+
+from tslove.core.archive import ArchiveIndex
+
+
+def make_page_info(diary_id, prev_diary_id=None, day=1, fingerprint=None):
+    return {'title': 'diary {}'.format(diary_id),
+            'date': datetime.datetime(2018, 1, day, 12, 34, 56),
+            'prev_diary_id': prev_diary_id,
+            'diary_id': diary_id,
+            'fingerprint': fingerprint}
+
+
+def test_put_and_get():
+    with ArchiveIndex(':memory:') as archive:
+        assert archive.get('100') is None
+        assert '100' not in archive
+
+        archive.put(make_page_info('100', '99'))
+        assert archive.get('100') == make_page_info('100', '99')
+        assert '100' in archive
+        assert len(archive) == 1
+
+        archive.put(make_page_info('100', None, day=2))
+        assert archive.get('100') == make_page_info('100', None, day=2)
+        assert len(archive) == 1
+
+
+def test_fingerprint_is_optional():
+    with ArchiveIndex(':memory:') as archive:
+        page_info = make_page_info('1')
+        del page_info['fingerprint']
+        archive.put(page_info)
+        assert archive.get('1')['fingerprint'] is None
+
+        archive.put(make_page_info('1', fingerprint='0123456789abcdef'))
+        assert archive.get('1')['fingerprint'] == '0123456789abcdef'
+
+
+def test_upgrade_adds_fingerprint_column(tmpdir):
+    file_name = os.path.join(tmpdir, 'archive.sqlite3')
+    connection = sqlite3.connect(file_name)
+    with connection:
+        connection.execute('CREATE TABLE diary (diary_id INTEGER PRIMARY KEY, title TEXT NOT NULL, '
+                           'date TEXT NOT NULL, prev_diary_id INTEGER)')
+        connection.execute("INSERT INTO diary VALUES (1, 'diary 1', '2018-01-01 12:34:56', NULL)")
+    connection.close()
+
+    with ArchiveIndex(file_name) as archive:
+        assert archive.get('1') == make_page_info('1')
+
+
+def test_iterate_by_numeric_id():
+    with ArchiveIndex(':memory:') as archive:
+        archive.put_many(make_page_info(diary_id) for diary_id in ['9', '100', '10'])
+
+        assert [page_info['diary_id'] for page_info in archive.iterate()] == ['9', '10', '100']
+        assert [page_info['diary_id'] for page_info in archive.iterate(reverse=True)] == ['100', '10', '9']
+
+
+def test_persistence(tmpdir):
+    file_name = os.path.join(tmpdir, 'archive.sqlite3')
+    with ArchiveIndex(file_name) as archive:
+        archive.put(make_page_info('1'))
+
+    with ArchiveIndex(file_name) as archive:
+        assert archive.get('1') == make_page_info('1')
+
+
+def test_migrate_json(tmpdir):
+    json_file_name = os.path.join(tmpdir, 'page_info.json')
+    journal_file_name = os.path.join(tmpdir, 'page_info.jsonl')
+    with open(json_file_name, 'w', encoding='utf-8') as file:
+        json.dump({'1': make_page_info('1'), '2': make_page_info('2', '1')}, file, default=str)
+
+    with open(journal_file_name, 'w', encoding='utf-8') as file:
+        for record in ({'id': '2', 'page_info': make_page_info('2', '1', day=3)},
+                       {'id': '3', 'page_info': make_page_info('3', '2')}):
+            file.write(json.dumps(record, default=str) + '\n')
+
+    with ArchiveIndex(':memory:') as archive:
+        assert archive.migrate_json(json_file_name, journal_file_name) == 3
+        assert archive.get('2') == make_page_info('2', '1', day=3)
+        assert archive.get('3') == make_page_info('3', '2')
+
+    assert not os.path.exists(json_file_name)
+    assert not os.path.exists(journal_file_name)
+    assert os.path.exists(json_file_name + '.migrated')
+
+
+def test_months_and_iterate_month():
+    with ArchiveIndex(':memory:') as archive:
+        archive.put(make_page_info('1'))
+        archive.put(make_page_info('2', day=31))
+        archive.put({**make_page_info('3'), 'date': datetime.datetime(2018, 2, 1)})
+        archive.put({**make_page_info('4'), 'date': datetime.datetime(2017, 12, 31, 23, 59, 59)})
+
+        assert archive.months() == [(2018, 2, 1), (2018, 1, 2), (2017, 12, 1)]
+        assert [page_info['diary_id'] for page_info in archive.iterate_month(2018, 1, reverse=True)] == ['2', '1']
+        assert [page_info['diary_id'] for page_info in archive.iterate_month(2017, 12)] == ['4']
+        assert list(archive.iterate_month(2018, 3)) == []
@@ -0,0 +1,166 @@
+import asyncio
+import os
+
+import pytest
+
+aiohttp_web = pytest.importorskip('aiohttp.web')
+
+from tslove.core import web as tslove_web  # noqa: E402
+from tslove.core.asyncweb import AsyncTsLoveWeb  # noqa: E402
+from tslove.core.exception import RetryCountExceededError, UnexpectedStatusError  # noqa: E402
+from tslove.core.retry import RetryPolicy  # noqa: E402
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'diarydump', 'data')
+
+PROFILE_PAGE = '<html><head><title>マイページ</title></head><body>' \
+    '<a href="./?m=pc&amp;a=do_inc_page_header_logout&amp;sessid=abc123">logout</a></body></html>'
+ERROR_PAGE = '<html><head><title>ページが表示できませんでした</title></head></html>'
+
+
+@pytest.fixture(autouse=True)
+def no_wait(monkeypatch):
+    monkeypatch.setattr(tslove_web, 'RETRY_INTERVAL', 0)
+
+
+def run_with_server(handler, scenario, retry_policy=None):
+    async def main():
+        app = aiohttp_web.Application()
+        app.router.add_route('*', '/{tail:.*}', handler)
+        runner = aiohttp_web.AppRunner(app)
+        await runner.setup()
+        site = aiohttp_web.TCPSite(runner, '127.0.0.1', 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        try:
+            async with AsyncTsLoveWeb('http://127.0.0.1:{}/'.format(port), concurrency=2,
+                                      retry_policy=retry_policy) as web:
+                return await scenario(web)
+        finally:
+            await runner.cleanup()
+
+    return asyncio.run(main())
+
+
+def test_login_and_retry_error_page():
+    requests = []
+
+    async def handler(request):
+        requests.append(request.query.get('a'))
+        if request.method == 'POST':
+            response = aiohttp_web.Response(status=200)
+            response.set_cookie('PHPSESSID', 'php-session')
+            return response
+        if len(requests) == 2:
+            return aiohttp_web.Response(text=ERROR_PAGE, content_type='text/html')
+        assert request.cookies.get('PHPSESSID') == 'php-session'
+        return aiohttp_web.Response(text=PROFILE_PAGE, content_type='text/html')
+
+    async def scenario(web):
+        return await web.login('user', 'pass'), web
+
+    result, web = run_with_server(handler, scenario)
+
+    assert result is True
+    assert web.php_session_id == 'php-session'
+    assert web.sns_session_id == 'abc123'
+    assert web.total_retries == 1
+
+
+def test_retry_count_exceeded():
+    async def handler(_):
+        return aiohttp_web.Response(text='body {}', content_type='text/plain')
+
+    async def scenario(web):
+        with pytest.raises(RetryCountExceededError):
+            await web.get_stylesheet()
+        return web.total_retries
+
+    assert run_with_server(handler, scenario) == tslove_web.RETRY_COUNT - 1
+
+
+def test_download_image(tmpdir):
+    with open(os.path.join(DATA_DIR, 'dummy_image1.jpg'), 'rb') as file:
+        image = file.read()
+
+    async def handler(request):
+        if request.query.get('filename') == 'empty.jpg':
+            return aiohttp_web.Response(body=b'', content_type='text/html')
+        return aiohttp_web.Response(body=image, content_type='image/jpeg')
+
+    async def scenario(web):
+        await web.download_image('img.php', os.path.join(tmpdir, 'a.jpg'), {'m': 'pc', 'filename': 'a.jpg'})
+        placeholder = await web.get_image('img.php', {'m': 'pc', 'filename': 'empty.jpg'})
+        return placeholder.size
+
+    assert run_with_server(handler, scenario) == (1, 1)
+    with open(os.path.join(tmpdir, 'a.jpg'), 'rb') as file:
+        assert file.read() == image
+
+
+def test_concurrency_limit():
+    running = [0, 0]
+
+    async def handler(_):
+        running[0] += 1
+        running[1] = max(running)
+        await asyncio.sleep(0.05)
+        running[0] -= 1
+        return aiohttp_web.Response(text='var a;', content_type='text/javascript')
+
+    async def scenario(web):
+        return await asyncio.gather(*[web.get_javascript('js/{}.js'.format(n)) for n in range(6)])
+
+    assert run_with_server(handler, scenario) == ['var a;'] * 6
+    assert running[1] == 2
+
+
+def test_non_retriable_status():
+    requests = []
+
+    async def handler(request):
+        requests.append(request.path)
+        return aiohttp_web.Response(status=404)
+
+    async def scenario(web):
+        with pytest.raises(UnexpectedStatusError):
+            await web.get_stylesheet()
+        return web.total_retries
+
+    assert run_with_server(handler, scenario) == 0
+    assert len(requests) == 1
+
+
+def test_retry_after(capsys):
+    requests = []
+
+    async def handler(request):
+        requests.append(request.path)
+        if len(requests) == 1:
+            return aiohttp_web.Response(status=503, headers={'Retry-After': '1'})
+        return aiohttp_web.Response(text='body {}', content_type='text/css')
+
+    async def scenario(web):
+        return await web.get_stylesheet(), web.total_retries
+
+    policy = RetryPolicy(base_delay=0.0, jitter=0.0)
+    assert run_with_server(handler, scenario, policy) == ('body {}', 1)
+    assert 'after 1.0 sec.' in capsys.readouterr().out
+
+
+def test_retry_broken_body():
+    requests = []
+
+    async def handler(request):
+        requests.append(request.path)
+        if len(requests) == 1:
+            response = aiohttp_web.StreamResponse(headers={'Content-Type': 'text/javascript', 'Content-Length': '100'})
+            await response.prepare(request)
+            await response.write(b'var')
+            request.transport.close()
+            return response
+        return aiohttp_web.Response(text='var a;', content_type='text/javascript')
+
+    async def scenario(web):
+        return await web.get_javascript('js/a.js'), web.total_retries
+
+    assert run_with_server(handler, scenario) == ('var a;', 1)
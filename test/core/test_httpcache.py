@@ -0,0 +1,74 @@
+import json
+import os
+
+from tslove.core.httpcache import ValidatorCache
+
+
+def test_key():
+    assert ValidatorCache.key('https://tslove.net/xhtml_style.php') == 'https://tslove.net/xhtml_style.php'
+    assert ValidatorCache.key('https://tslove.net/img_skin.php', {'w': '1', 'a': '2'}) == \
+        ValidatorCache.key('https://tslove.net/img_skin.php', {'a': '2', 'w': '1'})
+
+
+def test_request_headers():
+    cache = ValidatorCache()
+    assert cache.request_headers('css') == {}
+
+    cache.update('css', {'ETag': '"abc"', 'Last-Modified': 'Sat, 01 Jan 2022 00:00:00 GMT'})
+    assert cache.request_headers('css') == {'If-None-Match': '"abc"',
+                                            'If-Modified-Since': 'Sat, 01 Jan 2022 00:00:00 GMT'}
+
+    cache.update('js', {'Last-Modified': 'Sat, 01 Jan 2022 00:00:00 GMT'})
+    assert cache.request_headers('js') == {'If-Modified-Since': 'Sat, 01 Jan 2022 00:00:00 GMT'}
+
+
+def test_update_without_validators_forgets_entry():
+    cache = ValidatorCache()
+    cache.update('css', {'ETag': '"abc"'})
+    cache.update('css', {'Content-Type': 'text/css'})
+
+    assert cache.request_headers('css') == {}
+    assert len(cache) == 0
+
+
+def test_save_and_load(tmpdir):
+    file_name = os.path.join(tmpdir, 'http_cache.json')
+    cache = ValidatorCache()
+    cache.update('css', {'ETag': '"abc"'})
+    cache.save(file_name)
+
+    loaded = ValidatorCache()
+    loaded.load(file_name)
+    assert loaded.request_headers('css') == {'If-None-Match': '"abc"'}
+
+
+def test_save_only_when_modified(tmpdir):
+    file_name = os.path.join(tmpdir, 'http_cache.json')
+    cache = ValidatorCache()
+    cache.save(file_name)
+    assert not os.path.exists(file_name)
+
+    cache.update('css', {'ETag': '"abc"'})
+    cache.save(file_name)
+    with open(file_name, 'w', encoding='utf-8') as file:
+        json.dump({}, file)
+
+    cache.update('css', {'ETag': '"abc"'})
+    cache.save(file_name)
+    with open(file_name, 'r', encoding='utf-8') as file:
+        assert json.load(file) == {}
+
+
+def test_load_missing_file(tmpdir):
+    cache = ValidatorCache()
+    cache.load(os.path.join(tmpdir, 'missing.json'))
+    assert len(cache) == 0
+
+
+def test_keys():
+    cache = ValidatorCache()
+    cache.update('css', {'ETag': '"abc"'})
+    cache.update('js', {'ETag': '"def"'})
+    cache.update('js', {})
+
+    assert cache.keys() == ['css']
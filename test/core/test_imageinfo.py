@@ -0,0 +1,74 @@
+import os
+
+import pytest
+
+from tslove.core.imageinfo import sniff_image_type, is_consistent, read_image_size, ImageSizeCache
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'diarydump', 'data')
+
+
+@pytest.mark.parametrize('head, expect', [
+    (b'\xff\xd8\xff\xe0\x00\x10JFIF\x00', 'image/jpeg'),
+    (b'\x89PNG\r\n\x1a\n\x00\x00\x00\rIHDR', 'image/png'),
+    (b'GIF89a\x01\x00\x01\x00', 'image/gif'),
+    (b'GIF87a\x01\x00\x01\x00', 'image/gif'),
+    (b'RIFF\x00\x00\x00\x00WEBPVP8 ', 'image/webp'),
+    (b'<html></html>', None),
+    (b'', None),
+])
+def test_sniff_image_type(head, expect):
+    assert sniff_image_type(head) == expect
+
+
+def test_sniff_fixture_image():
+    with open(os.path.join(DATA_DIR, 'dummy_image1.jpg'), 'rb') as file:
+        assert sniff_image_type(file.read(16)) == 'image/jpeg'
+
+
+def test_is_consistent():
+    jpeg = b'\xff\xd8\xff\xe0\x00\x10JFIF\x00'
+
+    assert is_consistent('image/jpeg', jpeg)
+    assert is_consistent('image/jpg', jpeg)
+    assert is_consistent('image/jpeg; charset=binary', jpeg)
+    assert not is_consistent('image/png', jpeg)
+    assert not is_consistent('image/jpeg', b'<!DOCTYPE html>')
+    assert is_consistent('image/x-icon', b'\x00\x00\x01\x00')
+
+
+@pytest.mark.parametrize('name, expect', [
+    ('dummy_image1.jpg', (400, 400)),
+    ('dummy_image2.jpg', (400, 300)),
+    ('dummy_image3.jpg', (300, 400)),
+])
+def test_read_jpeg_size(name, expect):
+    assert read_image_size(os.path.join(DATA_DIR, name)) == expect
+
+
+@pytest.mark.parametrize('image_format', ['PNG', 'GIF', 'BMP'])
+def test_read_image_size(image_format, tmpdir):
+    Image = pytest.importorskip('PIL.Image')
+    file_name = os.path.join(tmpdir, 'image.' + image_format.lower())
+    Image.new('RGB', (123, 45)).save(file_name, image_format)
+
+    assert read_image_size(file_name) == (123, 45)
+
+
+def test_read_unknown_image_size(tmpdir):
+    file_name = os.path.join(tmpdir, 'image.txt')
+    with open(file_name, 'wb') as file:
+        file.write(b'<html></html>')
+
+    assert read_image_size(file_name) is None
+
+
+def test_image_size_cache(tmpdir):
+    cache_file = os.path.join(tmpdir, 'image_size.json')
+    cache = ImageSizeCache(cache_file)
+    assert cache.record('a.jpg', os.path.join(DATA_DIR, 'dummy_image2.jpg')) == (400, 300)
+    cache.save()
+
+    cache = ImageSizeCache(cache_file)
+    cache.load()
+    assert cache.get('a.jpg') == (400, 300)
+    assert cache.get('b.jpg') is None
@@ -0,0 +1,75 @@
+import os
+
+from tslove.core.imagestore import ImageStore
+
+
+def write(file_name, data):
+    with open(file_name, 'wb') as file:
+        file.write(data)
+
+
+def test_add_deduplicates_same_content(tmpdir):
+    store = ImageStore(os.path.join(tmpdir, 'store'))
+    first = os.path.join(tmpdir, 'a.jpg')
+    second = os.path.join(tmpdir, 'b.jpg')
+    write(first, b'same bytes')
+    write(second, b'same bytes')
+
+    digest = store.add('img.php?filename=a.jpg', first)
+    assert store.add('img.php?filename=b.jpg', second) == digest
+
+    assert os.path.samefile(first, second)
+    assert os.path.samefile(first, store.object_path(digest))
+    assert os.stat(first).st_nlink == 3
+
+
+def test_add_keeps_different_content(tmpdir):
+    store = ImageStore(os.path.join(tmpdir, 'store'))
+    first = os.path.join(tmpdir, 'a.jpg')
+    second = os.path.join(tmpdir, 'b.jpg')
+    write(first, b'first')
+    write(second, b'second')
+
+    assert store.add('a', first) != store.add('b', second)
+    assert not os.path.samefile(first, second)
+
+
+def test_link_known_key(tmpdir):
+    store = ImageStore(os.path.join(tmpdir, 'store'))
+    original = os.path.join(tmpdir, 'a.jpg')
+    write(original, b'image')
+    store.add('img.php?filename=a.jpg', original)
+
+    other_dump = os.path.join(tmpdir, 'other.jpg')
+    assert store.link('img.php?filename=a.jpg', other_dump)
+    assert os.path.samefile(original, other_dump)
+
+    assert not store.link('img.php?filename=unknown.jpg', os.path.join(tmpdir, 'unknown.jpg'))
+    assert not os.path.exists(os.path.join(tmpdir, 'unknown.jpg'))
+
+
+def test_save_and_load_index(tmpdir):
+    root = os.path.join(tmpdir, 'store')
+    original = os.path.join(tmpdir, 'a.jpg')
+    write(original, b'image')
+
+    store = ImageStore(root)
+    digest = store.add('a', original)
+    store.save()
+
+    loaded = ImageStore(root)
+    loaded.load()
+    assert loaded.lookup('a') == digest
+    assert len(loaded) == 1
+
+
+def test_lookup_missing_object(tmpdir):
+    root = os.path.join(tmpdir, 'store')
+    original = os.path.join(tmpdir, 'a.jpg')
+    write(original, b'image')
+
+    store = ImageStore(root)
+    digest = store.add('a', original)
+    os.remove(store.object_path(digest))
+
+    assert store.lookup('a') is None
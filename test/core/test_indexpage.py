@@ -0,0 +1,46 @@
+import datetime
+import io
+
+from tslove.core.indexpage import month_file_name, write_month_page, write_summary_page
+
+
+def test_month_file_name():
+    assert month_file_name(2020, 5) == 'index-2020-05.html'
+
+
+def test_write_month_page():
+    file = io.StringIO()
+    page_infos = [{'diary_id': '123456', 'date': datetime.datetime(2020, 5, 15, 12, 50, 30), 'title': 'Title <&> "C"'},
+                  {'diary_id': '90000', 'date': datetime.datetime(2020, 5, 1, 10, 50), 'title': 'Title-A'}]
+    write_month_page(file, 2020, 5, page_infos)
+    page = file.getvalue()
+
+    assert '<title>2020年05月</title>' in page
+    assert '<tr><td>2020年05月15日12:50</td><td><a href="./123456.html">Title &lt;&amp;&gt; &quot;C&quot;</a></td></tr>' in page
+    assert page.index('./123456.html') < page.index('./90000.html')
+    assert page.endswith('</table>\n</body>\n</html>\n')
+
+
+def test_write_summary_page():
+    file = io.StringIO()
+    write_summary_page(file, [(2020, 5, 3), (2020, 1, 1), (2019, 12, 10)])
+    page = file.getvalue()
+
+    assert page.count('<h2>') == 2
+    assert '<li><a href="./index-2020-05.html">2020年05月</a> (3)</li>' in page
+    assert page.index('<h2>2020年</h2>') < page.index('index-2020-01.html') < page.index('<h2>2019年</h2>')
+    assert page.count('<ul>') == page.count('</ul>') == 2
+
+
+def test_write_empty_summary_page():
+    file = io.StringIO()
+    write_summary_page(file, [])
+
+    assert '<ul>' not in file.getvalue()
+
+
+def test_write_summary_page_with_search_link():
+    file = io.StringIO()
+    write_summary_page(file, [(2020, 5, 3)], search_page=True)
+
+    assert '<a href="./search.html">' in file.getvalue()
@@ -0,0 +1,34 @@
+import datetime
+import os
+
+from tslove.core.journal import Journal
+
+
+def convert_datetime(dct):
+    if 'date' in dct:
+        dct['date'] = datetime.datetime.strptime(dct['date'], '%Y-%m-%d %H:%M:%S')
+    return dct
+
+
+def test_replay(tmpdir):
+    file_name = os.path.join(tmpdir, 'journal.jsonl')
+    with open(file_name, 'w', encoding='utf-8') as file:
+        file.write('{"id": "1", "page_info": {"title": "テスト", "date": "2018-01-02 03:04:05"}}\n'
+                   '{"id": "2", "page_info": {"title": "test", "date": "2018-01-02 03:04:05"}}\n')
+
+    records = list(Journal(file_name, object_hook=convert_datetime).replay())
+    assert [record['id'] for record in records] == ['1', '2']
+    assert records[0]['page_info'] == {'title': 'テスト', 'date': datetime.datetime(2018, 1, 2, 3, 4, 5)}
+
+
+def test_replay_ignores_torn_last_line(tmpdir):
+    file_name = os.path.join(tmpdir, 'journal.jsonl')
+    with open(file_name, 'w', encoding='utf-8') as file:
+        file.write('{"id": "1"}\n{"id": "2"}\n{"id": "3", "pa')
+
+    assert [record['id'] for record in Journal(file_name).replay()] == ['1', '2']
+    assert os.path.getsize(file_name) == len('{"id": "1"}\n{"id": "2"}\n{"id": "3", "pa')
+
+
+def test_replay_missing_file(tmpdir):
+    assert list(Journal(os.path.join(tmpdir, 'missing.jsonl')).replay()) == []
@@ -0,0 +1,59 @@
+import io
+import json
+
+from tslove.core.metrics import RequestMetrics, endpoint_name
+
+
+def test_endpoint_name():
+    assert endpoint_name('', {'m': 'pc', 'a': 'page_fh_diary'}) == 'page_fh_diary'
+    assert endpoint_name('img.php', {'filename': 'a.jpg'}) == 'img.php'
+    assert endpoint_name('./img_skin.php?filename=skin&amp;image_filename=a.gif') == 'img_skin.php'
+    assert endpoint_name('./skin/default/img/bg_button.gif') == 'skin/*'
+    assert endpoint_name('/img/ad/hige_pc.jpg') == 'img/*'
+    assert endpoint_name('') == '/'
+
+
+def test_record():
+    metrics = RequestMetrics()
+    metrics.record('img.php', 200, 'image/jpeg', 1000, 0.02)
+    metrics.record('img.php', 503, 'text/html; charset=UTF-8', 19, 0.3, retry=True)
+    metrics.record('img.php', None, '', 0, 15.0, retry=True)
+
+    result = metrics.snapshot()['img.php']
+    assert result['requests'] == 3
+    assert result['retries'] == 2
+    assert result['bytes'] == 1019
+    assert result['statuses'] == {'200': 1, '503': 1, 'error': 1}
+    assert result['content_types'] == {'image/jpeg': 1, 'text/html': 1, 'none': 1}
+    assert result['latency_buckets']['0.05'] == 1
+    assert result['latency_buckets']['0.5'] == 1
+    assert result['latency_buckets']['30.0'] == 1
+    assert metrics.summary() == (3, 2, 1019)
+
+
+def test_write_json():
+    metrics = RequestMetrics()
+    metrics.record('page_fh_diary', 200, 'text/html', 100, 0.5)
+
+    file = io.StringIO()
+    metrics.write_json(file)
+    assert json.loads(file.getvalue())['endpoints']['page_fh_diary']['requests'] == 1
+
+
+def test_write_prometheus():
+    metrics = RequestMetrics()
+    metrics.record('page_fh_diary', 200, 'text/html', 100, 0.07)
+    metrics.record('page_fh_diary', 200, 'text/html', 100, 3.0, retry=True)
+
+    file = io.StringIO()
+    metrics.write_prometheus(file)
+    lines = file.getvalue().splitlines()
+
+    assert '# TYPE tslove_request_duration_seconds histogram' in lines
+    assert 'tslove_requests_total{endpoint="page_fh_diary",status="200"} 2' in lines
+    assert 'tslove_retries_total{endpoint="page_fh_diary"} 1' in lines
+    assert 'tslove_received_bytes_total{endpoint="page_fh_diary"} 200' in lines
+    assert 'tslove_request_duration_seconds_bucket{endpoint="page_fh_diary",le="0.05"} 0' in lines
+    assert 'tslove_request_duration_seconds_bucket{endpoint="page_fh_diary",le="0.1"} 1' in lines
+    assert 'tslove_request_duration_seconds_bucket{endpoint="page_fh_diary",le="+Inf"} 2' in lines
+    assert 'tslove_request_duration_seconds_count{endpoint="page_fh_diary"} 2' in lines
@@ -0,0 +1,101 @@
+import os
+
+import pytest
+
+from tslove.core.diary import DiaryPage
+from tslove.core.parser import make_soup
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'diarydump', 'data')
+
+
+@pytest.fixture(scope='module')
+def diary_html():
+    with open(os.path.join(DATA_DIR, 'original-diary-page.html'), 'r', encoding='utf-8') as file:
+        return file.read()
+
+
+def test_parse_diary_page(diary_html):
+    page = DiaryPage()
+    page.append(diary_html)
+
+    assert page.title == 'テストの日記'
+    assert page.prev_diary_id == '2685064'
+    assert page.date.strftime('%Y-%m-%d %H:%M') == '2020-07-19 02:10'
+    assert './js/pne.js' in page.script_paths
+
+
+def test_detach_soup_is_unmodified(diary_html):
+    page = DiaryPage()
+    page.append(diary_html)
+
+    soup = page.detach_soup()
+
+    assert str(soup) == str(make_soup(diary_html))
+    with pytest.raises(ValueError):
+        page.detach_soup()
+
+
+def test_release(diary_html):
+    page = DiaryPage()
+    page.append(diary_html)
+    page.release()
+
+    assert len(page) == 1
+    with pytest.raises(ValueError):
+        page.detach_soup()
+
+
+PAGER = '<div class="pagerRelative"><p class="number">1番～15番を表示</p></div>'
+
+
+def comment_page(diary_html, number, pages):
+    '''コメントの number ページ目 (1ページ15件) を作成します'''
+    pager = '<div class="pagerRelative">'
+    if number > 1:
+        pager += '<p class="prev"><a href="./?m=pc&amp;a=page_fh_diary&amp;target_c_diary_id=2686448&amp;page={}">前を表示</a></p>'.format(number - 1)
+    pager += '<p class="number">{}番～{}番を表示</p>'.format((number - 1) * 15 + 1, number * 15)
+    if number < pages:
+        pager += '<p class="next"><a href="./?m=pc&amp;a=page_fh_diary&amp;target_c_diary_id=2686448&amp;page={}">次を表示</a></p>'.format(number + 1)
+    pager += '</div>'
+    return diary_html.replace(PAGER, pager)
+
+
+class FakeWeb:
+    def __init__(self, diary_html, pages):
+        self.diary_html = diary_html
+        self.pages = pages
+        self.requested = []
+
+    def get_page(self, param):
+        number = param.get('page', 1)
+        self.requested.append(number)
+        if number > self.pages:  # 最後のページより先は最後のページと同じ内容
+            number = self.pages
+        return comment_page(self.diary_html, number, self.pages)
+
+
+@pytest.mark.parametrize('pages', [1, 2, 5])
+def test_fetch_all_comment_pages(diary_html, pages):
+    web = FakeWeb(diary_html, pages)
+
+    page = DiaryPage.fetch_from_web(web, '2686448', workers=3)
+
+    assert len(page) == pages
+    assert page.comment_count == pages * 15
+    assert not page.has_next_comments
+    assert set(range(1, pages + 1)) <= set(web.requested)
+
+
+def test_detach_merged_soup(diary_html):
+    web = FakeWeb(diary_html, 3)
+
+    page = DiaryPage.fetch_from_web(web, '2686448', workers=2)
+    soup = page.detach_merged_soup()
+    page.release()
+
+    comment_div_tag = soup.find('div', id='commentList')
+    comments = comment_div_tag.dl.parent.find_all('dl', recursive=False)
+    assert len(comments) == 45
+    for pager_div_tag in comment_div_tag.find_all('div', class_='pagerRelative'):
+        assert pager_div_tag.find('p', class_=['prev', 'next']) is None
+        assert pager_div_tag.get_text(strip=True) == '1番～45番を表示'
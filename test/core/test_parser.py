@@ -0,0 +1,52 @@
+import importlib.util
+import os
+
+import pytest
+
+from tslove.core import parser
+from tslove.core.diary import DiaryPage
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'diarydump', 'data')
+
+HAS_LXML = importlib.util.find_spec('lxml') is not None
+
+
+@pytest.fixture(scope='module')
+def diary_html():
+    with open(os.path.join(DATA_DIR, 'original-diary-page.html'), 'r', encoding='utf-8') as file:
+        return file.read()
+
+
+@pytest.fixture()
+def restore_parser():
+    name = parser.html_parser()
+    yield
+    parser.set_html_parser(name)
+
+
+def parse_with(name, html):
+    parser.set_html_parser(name)
+    page = DiaryPage()
+    page.append(html)
+    return page
+
+
+def test_default_parser():
+    assert parser.html_parser() == parser.DEFAULT_PARSER == 'html.parser'
+
+
+def test_unknown_parser(restore_parser):
+    with pytest.raises(ValueError):
+        parser.set_html_parser('no-such-parser')
+
+
+@pytest.mark.skipif(not HAS_LXML, reason='lxml is not installed')
+def test_extraction_equivalence(diary_html, restore_parser):
+    expect = parse_with('html.parser', diary_html)
+    actual = parse_with('lxml', diary_html)
+
+    assert actual.title == expect.title
+    assert actual.date == expect.date
+    assert actual.prev_diary_id == expect.prev_diary_id
+    assert actual.image_paths == expect.image_paths
+    assert actual.script_paths == expect.script_paths
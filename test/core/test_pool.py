@@ -0,0 +1,87 @@
+import threading
+import time
+
+import pytest
+
+from tslove.core.pool import AssetPool
+
+
+def test_per_host_limit():
+    pool = AssetPool(workers=4, per_host=2)
+    lock = threading.Lock()
+    running = {'a': 0, 'b': 0}
+    peak = {'a': 0, 'b': 0}
+
+    def job(host):
+        with lock:
+            running[host] += 1
+            peak[host] = max(peak[host], running[host])
+        time.sleep(0.05)
+        with lock:
+            running[host] -= 1
+
+    for _ in range(6):
+        pool.submit('a', job, 'a')
+        pool.submit('b', job, 'b')
+    pool.shutdown()
+
+    assert peak == {'a': 2, 'b': 2}
+
+
+def test_when_done():
+    pool = AssetPool(workers=2, per_host=2)
+    finished = []
+
+    futures = [pool.submit('a', lambda n: (time.sleep(0.02), finished.append(n)), n) for n in range(3)]
+    group = pool.when_done(futures, lambda: sorted(finished))
+    pool.join()
+
+    assert group.result() == [0, 1, 2]
+    pool.shutdown()
+
+
+def test_when_done_without_jobs():
+    pool = AssetPool()
+    called = []
+
+    pool.when_done([], lambda: called.append(True))
+
+    assert called == [True]
+    pool.shutdown()
+
+
+def test_invalid_size():
+    with pytest.raises(ValueError):
+        AssetPool(workers=0)
+
+
+def test_workers_are_not_blocked_by_per_host_limit():
+    pool = AssetPool(workers=2, per_host=1)
+    started = threading.Event()
+    release = threading.Event()
+
+    pool.submit('a', lambda: (started.set(), release.wait(5)))
+    queued = [pool.submit('a', lambda: None) for _ in range(3)]
+    assert started.wait(5)
+
+    other = pool.submit('b', lambda: 'b')  # 'a' の待ち行列が空くのを待たずに実行される
+    assert other.result(timeout=1) == 'b'
+    assert not any(future.done() for future in queued)
+
+    release.set()
+    pool.shutdown()
+    assert all(future.done() for future in queued)
+
+
+def test_cancel_queued_job():
+    pool = AssetPool(workers=1, per_host=1)
+    release = threading.Event()
+    called = []
+
+    pool.submit('a', release.wait, 5)
+    queued = pool.submit('a', called.append, True)
+    assert queued.cancel()
+
+    release.set()
+    pool.shutdown()
+    assert called == []
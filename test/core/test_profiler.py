@@ -0,0 +1,89 @@
+import io
+import json
+import os
+import pstats
+import threading
+
+from tslove.core.profiler import StageProfiler, StageWriter, FETCH, PARSE, WRITE
+
+
+def test_disabled_profiler_records_nothing():
+    profiler = StageProfiler()
+    with profiler.diary('1'), profiler.stage(FETCH):
+        pass
+
+    func = len
+    assert profiler.bind(func, FETCH) is func
+    assert profiler.totals() == {}
+
+
+def test_nested_stage_is_exclusive():
+    profiler = StageProfiler(enabled=True)
+    with profiler.diary('1'):
+        with profiler.stage(FETCH):
+            with profiler.stage(PARSE):
+                sum(range(100000))
+
+    totals = profiler.totals()
+    assert totals[FETCH]['calls'] == 1
+    assert totals[PARSE]['calls'] == 1
+    assert totals[PARSE]['wall'] > totals[FETCH]['wall']
+    assert profiler.diaries()['1'][PARSE]['calls'] == 1
+
+
+def test_bind_carries_diary_to_other_thread():
+    profiler = StageProfiler(enabled=True)
+    with profiler.diary('1'):
+        job = profiler.bind(lambda: None, FETCH)
+
+    thread = threading.Thread(target=job)
+    thread.start()
+    thread.join()
+
+    assert profiler.diaries() == {'1': {FETCH: profiler.totals()[FETCH]}}
+
+
+def test_stage_without_diary_counts_in_totals_only():
+    profiler = StageProfiler(enabled=True)
+    with profiler.stage(FETCH):
+        pass
+
+    assert profiler.totals()[FETCH]['calls'] == 1
+    assert profiler.diaries() == {}
+
+
+def test_stage_writer():
+    profiler = StageProfiler(enabled=True)
+    file = io.StringIO()
+    StageWriter(file, profiler).write('abc')
+
+    assert file.getvalue() == 'abc'
+    assert profiler.totals()[WRITE]['calls'] == 1
+
+
+def test_report_and_json():
+    profiler = StageProfiler(enabled=True)
+    for diary_id in ('1', '2'):
+        with profiler.diary(diary_id), profiler.stage(FETCH):
+            pass
+
+    report = profiler.report(top=1)
+    assert report.splitlines()[0].split() == ['stage', 'wall(s)', 'cpu(s)', 'calls']
+    assert len([line for line in report.splitlines() if line.split()[:1] in (['1'], ['2'])]) == 1
+
+    file = io.StringIO()
+    profiler.write_json(file)
+    assert set(json.loads(file.getvalue())['diaries']) == {'1', '2'}
+
+
+def test_dump_stats(tmpdir):
+    profiler = StageProfiler(cprofile=True)
+    assert profiler.enabled
+
+    file_name = os.path.join(str(tmpdir), 'profile.pstats')
+    assert not profiler.dump_stats(file_name)
+
+    with profiler.stage(PARSE):
+        sorted(range(1000), key=str)
+    assert profiler.dump_stats(file_name)
+    assert pstats.Stats(file_name).total_calls > 0
@@ -0,0 +1,94 @@
+import threading
+
+import pytest
+
+from tslove.core.ratelimit import TokenBucket, RateController, PAGE, IMAGE
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+        self.lock = threading.Lock()
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        with self.lock:
+            self.now += seconds
+
+
+@pytest.fixture()
+def clock():
+    return FakeClock()
+
+
+def test_first_request_does_not_wait(clock):
+    bucket = TokenBucket(6, 12, clock=clock, sleep=clock.sleep)
+
+    assert bucket.acquire() == 0
+    assert bucket.acquire() == pytest.approx(10)
+    assert bucket.acquire() == pytest.approx(10)
+
+
+def test_refill_after_idle(clock):
+    bucket = TokenBucket(6, 12, clock=clock, sleep=clock.sleep)
+    bucket.acquire()
+    clock.now += 60
+
+    assert bucket.acquire() == 0
+
+
+def test_additive_increase_up_to_ceiling(clock):
+    bucket = TokenBucket(3, 6, increase=1, clock=clock, sleep=clock.sleep)
+    for _ in range(10):
+        bucket.success(0.2)
+
+    assert bucket.rpm == 6
+
+
+def test_multiplicative_decrease_down_to_floor(clock):
+    bucket = TokenBucket(12, 12, min_rpm=2, clock=clock, sleep=clock.sleep)
+    bucket.failure()
+    assert bucket.rpm == 6
+    for _ in range(10):
+        bucket.failure()
+
+    assert bucket.rpm == 2
+
+
+def test_slow_response_decreases_rate(clock):
+    bucket = TokenBucket(10, 20, clock=clock, sleep=clock.sleep)
+    bucket.success(0.2)
+    rpm = bucket.rpm
+    bucket.success(5.0)
+
+    assert bucket.rpm < rpm
+
+
+def test_lower_ceiling(clock):
+    bucket = TokenBucket(10, 20, min_rpm=6, clock=clock, sleep=clock.sleep)
+    bucket.max_rpm = 2
+
+    assert bucket.rpm == 2
+    bucket.failure()
+    assert bucket.rpm == 2
+
+
+def test_separate_budgets(clock):
+    controller = RateController({
+        PAGE: TokenBucket(6, 6, clock=clock, sleep=clock.sleep),
+        IMAGE: TokenBucket(60, 60, clock=clock, sleep=clock.sleep),
+    })
+    controller.acquire(PAGE)
+    controller.failure(PAGE)
+
+    assert controller.acquire(IMAGE) == 0
+    assert controller[PAGE].rpm == 3
+    assert controller[IMAGE].rpm == 60
+
+
+def test_burst(clock):
+    bucket = TokenBucket(6, 12, burst=3, clock=clock, sleep=clock.sleep)
+
+    assert [bucket.acquire() for _ in range(4)] == [0, 0, 0, pytest.approx(10)]
@@ -0,0 +1,119 @@
+import threading
+from datetime import datetime, timezone
+
+import pytest
+import requests
+
+from tslove.core.exception import (RequestError, RetryBudgetExceededError, RetryCountExceededError,
+                                   UnexpectedStatusError)
+from tslove.core.retry import RetryBudget, RetryPolicy, parse_retry_after
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_backoff_grows_and_is_capped():
+    policy = RetryPolicy(base_delay=10.0, multiplier=2.0, max_delay=50.0, jitter=0.0)
+
+    assert [policy.backoff(n) for n in range(1, 6)] == [10.0, 20.0, 40.0, 50.0, 50.0]
+
+
+def test_backoff_jitter_bounds():
+    assert RetryPolicy(base_delay=10.0, jitter=0.5, random_source=lambda: 0.0).backoff(1) == 10.0
+    assert RetryPolicy(base_delay=10.0, jitter=0.5, random_source=lambda: 0.999).backoff(1) == pytest.approx(5.005)
+
+
+def test_parse_retry_after():
+    now = datetime(2026, 10, 17, 12, 0, 0, tzinfo=timezone.utc)
+
+    assert parse_retry_after('120') == 120.0
+    assert parse_retry_after('Sat, 17 Oct 2026 12:00:30 GMT', now) == 30.0
+    assert parse_retry_after('Sat, 17 Oct 2026 11:00:00 GMT', now) == 0.0
+    assert parse_retry_after('soon') is None
+    assert parse_retry_after(None) is None
+
+
+def test_retry_after_extends_delay():
+    retry = RetryPolicy(base_delay=1.0, max_delay=60.0, jitter=0.0).start()
+
+    assert retry.failed(status=503, retry_after='30') == 30.0
+    assert retry.failed(status=429, retry_after='3600') == 60.0
+    assert retry.retries == 2
+
+
+def test_non_retriable_status_and_error():
+    policy = RetryPolicy()
+
+    with pytest.raises(UnexpectedStatusError) as excinfo:
+        policy.start().failed(status=404)
+    assert excinfo.value.status == 404
+
+    with pytest.raises(RequestError):
+        policy.start().failed(error=requests.TooManyRedirects())
+
+    assert policy.start().failed(error=requests.Timeout()) > 0
+
+
+def test_custom_classification():
+    policy = RetryPolicy(retry_statuses=frozenset({404}), retry_exceptions=(requests.TooManyRedirects,))
+
+    assert policy.start().failed(status=404) > 0
+    assert policy.start().failed(error=requests.TooManyRedirects()) > 0
+    with pytest.raises(UnexpectedStatusError):
+        policy.start().failed(status=503)
+
+
+def test_max_attempts():
+    retry = RetryPolicy(max_attempts=3, base_delay=0.0).start()
+    retry.failed()
+    retry.failed()
+
+    with pytest.raises(RetryCountExceededError):
+        retry.failed()
+
+
+def test_budget_limits_retries_within_window():
+    clock = FakeClock()
+    policy = RetryPolicy(base_delay=0.0, budget=RetryBudget(ratio=0.5, min_retries=1, window=10.0, clock=clock))
+
+    retries = [policy.start() for _ in range(2)]
+    retries[0].failed()
+    retries[1].failed()
+    with pytest.raises(RetryBudgetExceededError):
+        retries[0].failed()
+
+    clock.now = 10.0
+    assert policy.start().failed() == 0.0
+
+
+def test_shared_policy_counts_per_request():
+    policy = RetryPolicy(max_attempts=5, base_delay=0.0)
+    results = []
+
+    def worker():
+        retry = policy.start()
+        for _ in range(4):
+            retry.failed()
+        results.append(retry.retries)
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results == [4] * 8
+
+
+def test_invalid_policy():
+    with pytest.raises(ValueError):
+        RetryPolicy(max_attempts=0)
+    with pytest.raises(ValueError):
+        RetryPolicy(jitter=2.0)
+    with pytest.raises(ValueError):
+        RetryBudget(window=0)
@@ -0,0 +1,85 @@
+import datetime
+import io
+import json
+
+from benchmark.synthetic import load_diary_page
+from tslove.core.parser import make_soup
+from tslove.core.search import SearchIndex, bigrams, extract_diary_text, normalize
+
+
+def test_normalize():
+    assert normalize(' ＹｏｕＴｕｂｅの\n\tリンク ') == 'youtubeの リンク'
+
+
+def test_bigrams():
+    assert bigrams('日記の a') == {'日記', '記の'}
+    assert bigrams('日') == set()
+
+
+def test_extract_diary_text():
+    text = extract_diary_text(make_soup(load_diary_page()))
+
+    assert '動作を確認するための日記' in text
+    assert 'ソプラノのソロパート' in text
+    assert 'url2cmd' not in text
+    assert '編　集' not in text
+
+
+def make_index():
+    search_index = SearchIndex(':memory:')
+    search_index.update('1', '最初の日記', datetime.datetime(2020, 1, 1), '合唱曲を聴きました')
+    search_index.update('2', '二番目', datetime.datetime(2020, 2, 1), '曲を合唱しました')
+    search_index.update('3', '三番目', datetime.datetime(2020, 3, 1), 'YouTube の合唱曲')
+    return search_index
+
+
+def test_search():
+    with make_index() as search_index:
+        assert [result['diary_id'] for result in search_index.search('合唱曲')] == ['3', '1']
+        assert [result['diary_id'] for result in search_index.search('合唱')] == ['3', '2', '1']
+        assert [result['diary_id'] for result in search_index.search('ｙｏｕｔｕｂｅ 合唱')] == ['3']
+        assert [result['diary_id'] for result in search_index.search('合唱', limit=1)] == ['3']
+        assert search_index.search('存在しない') == []
+        assert search_index.search('  ') == []
+
+
+def test_search_single_character():
+    with make_index() as search_index:
+        assert [result['diary_id'] for result in search_index.search('曲')] == ['3', '2', '1']
+
+
+def test_search_result():
+    with make_index() as search_index:
+        result = search_index.search('聴き')[0]
+
+        assert result['title'] == '最初の日記'
+        assert result['date'] == datetime.datetime(2020, 1, 1)
+        assert '聴き' in result['snippet']
+
+
+def test_update_replaces_postings():
+    with make_index() as search_index:
+        search_index.update('1', '最初の日記', datetime.datetime(2020, 1, 1), '書き直しました')
+
+        assert [result['diary_id'] for result in search_index.search('合唱曲')] == ['3']
+        assert [result['diary_id'] for result in search_index.search('書き直し')] == ['1']
+        assert len(search_index) == 3
+
+
+def test_remove():
+    with make_index() as search_index:
+        search_index.remove('3')
+        search_index.remove('4')
+
+        assert '3' not in search_index
+        assert [result['diary_id'] for result in search_index.search('合唱曲')] == ['1']
+
+
+def test_export_json():
+    with make_index() as search_index:
+        file = io.StringIO()
+        search_index.export_json(file)
+        data = json.loads(file.getvalue())
+
+    assert data['diaries'][0] == ['3', '2020-03-01', '三番目']
+    assert [data['diaries'][position][0] for position in data['bigrams']['合唱']] == ['3', '2', '1']
@@ -0,0 +1,51 @@
+import io
+
+import pytest
+from bs4 import BeautifulSoup
+
+from benchmark.synthetic import build_diary_page, load_diary_page
+from tslove.core.serializer import iterate_html, write_html, COMPACT, COMPATIBLE
+
+PARSERS = ['html.parser', 'lxml']
+
+
+def write(soup, mode, chunk_size=64 * 1024):
+    file = io.StringIO()
+    write_html(soup, file, mode, chunk_size=chunk_size)
+    return file.getvalue()
+
+
+@pytest.mark.parametrize('parser', PARSERS)
+@pytest.mark.parametrize('comments', [None, 120])
+def test_compatible_equals_prettify(parser, comments):
+    soup = BeautifulSoup(load_diary_page() if comments is None else build_diary_page(comments), parser)
+
+    assert write(soup, COMPATIBLE) == soup.prettify(formatter='html')
+
+
+@pytest.mark.parametrize('parser', PARSERS)
+def test_compact_equals_decode(parser):
+    soup = BeautifulSoup(load_diary_page(), parser)
+
+    assert write(soup, COMPACT) == soup.decode(formatter='html')
+
+
+def test_preformatted_text_is_kept():
+    soup = BeautifulSoup('<html><body><pre>  a\n  b </pre><p>text <b>bold</b></p></body></html>', 'html.parser')
+
+    actual = write(soup, COMPATIBLE)
+    assert actual == soup.prettify(formatter='html')
+    assert '<pre>  a\n  b </pre>' in actual
+
+
+def test_small_chunks():
+    soup = BeautifulSoup(load_diary_page(), 'html.parser')
+
+    assert write(soup, COMPATIBLE, chunk_size=1) == write(soup, COMPATIBLE)
+
+
+def test_unknown_mode():
+    soup = BeautifulSoup('<p>text</p>', 'html.parser')
+
+    with pytest.raises(ValueError):
+        list(iterate_html(soup, 'pretty'))
@@ -0,0 +1,30 @@
+from tslove.core.session import SessionPool, DEFAULT_ACCOUNT
+
+
+def test_one_client_per_account():
+    sessions = SessionPool('http://127.0.0.1/')
+
+    alice = sessions.client('alice')
+    assert sessions.client('alice') is alice
+    assert sessions.client('bob') is not alice
+    assert sessions.client() is sessions.client(DEFAULT_ACCOUNT)
+    assert sessions.accounts == ['alice', 'bob', DEFAULT_ACCOUNT]
+    assert 'alice' in sessions and len(sessions) == 3
+    assert alice.url == 'http://127.0.0.1/'
+    assert not alice.logged_in
+
+    sessions.close()
+    assert len(sessions) == 0
+
+
+def test_clients_share_state():
+    sessions = SessionPool()
+    alice = sessions.client('alice')
+    bob = sessions.client('bob')
+
+    for client in (alice, bob):
+        assert client.rate_controller is sessions.rate_controller
+        assert client.validator_cache is sessions.validator_cache
+        assert client.metrics is sessions.metrics
+    assert alice.retry_policy is bob.retry_policy
+    assert sessions.total_retries == 0
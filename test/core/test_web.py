@@ -0,0 +1,58 @@
+import os
+
+import pytest
+import requests
+
+from tslove.core import ratelimit
+from tslove.core.exception import RetryCountExceededError
+from tslove.core.retry import RetryPolicy
+from tslove.core.web import TsLoveWeb
+
+from benchmark.standin import StandInServer, StandInSite
+
+
+@pytest.fixture()
+def fast_rate(monkeypatch):
+    for name in ('DEFAULT_PAGE_RPM', 'DEFAULT_MAX_PAGE_RPM', 'DEFAULT_IMAGE_RPM', 'DEFAULT_MAX_IMAGE_RPM'):
+        monkeypatch.setattr(ratelimit, name, 100000)
+
+
+def break_body(monkeypatch, times):
+    iter_content = requests.Response.iter_content
+    broken = []
+
+    def broken_iter_content(self, chunk_size=1, decode_unicode=False):
+        if len(broken) < times:
+            broken.append(self.url)
+            yield b'GIF8'
+            raise requests.exceptions.ChunkedEncodingError('Connection broken')
+        yield from iter_content(self, chunk_size, decode_unicode)
+
+    monkeypatch.setattr(requests.Response, 'iter_content', broken_iter_content)
+    return broken
+
+
+def test_download_image_retries_broken_body(fast_rate, monkeypatch, tmpdir):
+    broken = break_body(monkeypatch, 1)
+    file_name = os.path.join(str(tmpdir), 'skin.gif')
+
+    with StandInServer(StandInSite(diaries=1)) as server:
+        web = TsLoveWeb(server.url, retry_policy=RetryPolicy(base_delay=0.0, jitter=0.0))
+        assert web.download_image('img_skin.php', file_name) is True
+
+    assert len(broken) == 1
+    assert web.total_retries == 1
+    with open(file_name, 'rb') as file:
+        assert file.read(3) == b'GIF'
+    assert os.listdir(str(tmpdir)) == ['skin.gif']
+
+
+def test_download_image_gives_up_on_broken_body(fast_rate, monkeypatch, tmpdir):
+    break_body(monkeypatch, 2)
+
+    with StandInServer(StandInSite(diaries=1)) as server:
+        web = TsLoveWeb(server.url, retry_policy=RetryPolicy(max_attempts=2, base_delay=0.0, jitter=0.0))
+        with pytest.raises(RetryCountExceededError):
+            web.download_image('img_skin.php', os.path.join(str(tmpdir), 'skin.gif'))
+
+    assert os.listdir(str(tmpdir)) == []
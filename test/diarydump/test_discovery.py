@@ -0,0 +1,72 @@
+import sys
+
+import pytest
+
+from tslove.core.page import Page
+from tslove.diarydump import DiaryDumpApp
+
+DIARY_IDS = [str(diary_id) for diary_id in range(1050, 1000, -1)]
+LIST_PAGE_SIZE = 20
+
+
+def diary_list_page(page):
+    link = '<a href="./?m=pc&amp;a=page_fh_diary&amp;target_c_diary_id={0}">{1}</a>'
+    recent = ''.join('<li>{}</li>'.format(link.format(diary_id, '')) for diary_id in DIARY_IDS[:3])
+    diaries = DIARY_IDS[(page - 1) * LIST_PAGE_SIZE:page * LIST_PAGE_SIZE]
+    items = ''.join('<dd>{}</dd>'.format(link.format(diary_id, 'title ' + diary_id)) for diary_id in diaries)
+    return '<html><head><title>list</title></head><body><ul>{}</ul><dl>{}</dl></body></html>'.format(recent, items)
+
+
+@pytest.fixture()
+def fetched_pages(monkeypatch):
+    pages = []
+
+    def fetch_from_web(cls, web, action, **kwargs):
+        assert action == 'page_fh_diary_list'
+        pages.append(kwargs['param'])
+        page = Page()
+        page.append(diary_list_page(kwargs['param']['page']))
+        return page
+
+    monkeypatch.setattr(Page, 'fetch_from_web', classmethod(fetch_from_web))
+    return pages
+
+
+def make_app(tmpdir, monkeypatch, *args):
+    monkeypatch.setattr(sys, 'argv', ['diarydump', '-o', str(tmpdir), *args])
+    return DiaryDumpApp()
+
+
+def test_discover_diaries(fetched_pages, tmpdir, monkeypatch):
+    diaries = make_app(tmpdir, monkeypatch)._discover_diaries()
+
+    assert [diary_id for diary_id, _, _ in diaries] == DIARY_IDS
+    assert diaries[0][:2] == ('1050', 'title 1050')
+    assert diaries[0][2] == DiaryDumpApp._fingerprint('title 1050')
+    assert [param['page'] for param in fetched_pages] == [1, 2, 3, 4]
+    assert 'target_c_member_id' not in fetched_pages[0]
+
+
+def test_discover_member_diaries(fetched_pages, tmpdir, monkeypatch):
+    app = make_app(tmpdir, monkeypatch)
+    app._config.member_id = '45642'
+    app._discover_diaries()
+
+    assert all(param['target_c_member_id'] == '45642' for param in fetched_pages)
+
+
+def test_fingerprint_changes_with_entry():
+    assert DiaryDumpApp._fingerprint('title (3)') != DiaryDumpApp._fingerprint('title (4)')
+    assert len(DiaryDumpApp._fingerprint('title (3)')) == 16
+
+
+def test_filter_diary_ids(tmpdir, monkeypatch):
+    app = make_app(tmpdir, monkeypatch, '--from', '1010', '--to', '1040')
+
+    assert app._filter_diary_ids(DIARY_IDS) == [str(diary_id) for diary_id in range(1040, 1009, -1)]
+
+
+def test_filter_without_range(tmpdir, monkeypatch):
+    app = make_app(tmpdir, monkeypatch)
+
+    assert app._filter_diary_ids(DIARY_IDS) == DIARY_IDS
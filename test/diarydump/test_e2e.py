@@ -0,0 +1,229 @@
+import getpass
+import glob
+import json
+import os
+import sys
+
+import pytest
+
+from tslove.core import ratelimit, web
+from tslove.core.search import SearchIndex, SEARCH_INDEX_FILE_NAME
+from tslove import dumpapp
+from tslove.diarydump import DiaryDumpApp
+
+from benchmark.standin import Faults, StandInServer, StandInSite, USERNAME, PASSWORD
+
+
+@pytest.fixture()
+def fast_web(monkeypatch):
+    monkeypatch.setattr(web, 'RETRY_INTERVAL', 0)
+    for name in ('DEFAULT_PAGE_RPM', 'DEFAULT_MAX_PAGE_RPM', 'DEFAULT_IMAGE_RPM', 'DEFAULT_MAX_IMAGE_RPM'):
+        monkeypatch.setattr(ratelimit, name, 100000)
+    monkeypatch.setattr(ratelimit, 'FAILURE_DECREASE', 1.0)
+    monkeypatch.setattr(ratelimit, 'SLOW_DECREASE', 1.0)
+    monkeypatch.setattr('builtins.input', lambda prompt='': USERNAME)
+    monkeypatch.setattr(getpass, 'getpass', lambda prompt='': PASSWORD)
+
+
+def make_diarydump(monkeypatch, server, output_path, *options):
+    monkeypatch.setattr(sys, 'argv', ['diarydump', '-o', output_path, '--url', server.url,
+                                      '--max-rpm', '100000', '--max-image-rpm', '100000', *options])
+    return DiaryDumpApp()
+
+
+def run_diarydump(monkeypatch, server, output_path, *options):
+    return make_diarydump(monkeypatch, server, output_path, *options).run()
+
+
+def test_dump_through_faults(fast_web, monkeypatch, tmpdir):
+    faults = Faults(server_error_rate=0.05, error_page_rate=0.05, empty_image_rate=0.1, wrong_type_rate=0.05, seed=1)
+    site = StandInSite(diaries=25, comments=3, long_comments=230, long_every=10, faults=faults)
+
+    with StandInServer(site) as server:
+        app = make_diarydump(monkeypatch, server, str(tmpdir))
+        assert app.run() == 0
+
+    for diary_id in site.diary_ids:
+        assert os.path.exists(os.path.join(str(tmpdir), '{}.html'.format(diary_id)))
+    assert os.path.exists(os.path.join(str(tmpdir), 'index.html'))
+
+    with open(os.path.join(str(tmpdir), '{}.html'.format(site.diary_ids[9])), 'r', encoding='utf-8') as file:
+        assert '1番～230番を表示' in file.read()
+
+    stats = site.stats
+    assert stats['fault.server_error'] + stats['fault.error_page'] + stats['fault.wrong_type'] > 0
+    assert app._sessions.total_retries > 0
+
+
+def test_dump_saves_metrics(fast_web, monkeypatch, tmpdir):
+    site = StandInSite(diaries=3, faults=Faults(server_error_rate=0.1, seed=2))
+    stats_json = os.path.join(str(tmpdir), 'stats.json')
+    stats_prometheus = os.path.join(str(tmpdir), 'stats.prom')
+
+    with StandInServer(site) as server:
+        assert run_diarydump(monkeypatch, server, os.path.join(str(tmpdir), 'dump'),
+                             '--stats-json', stats_json, '--stats-prometheus', stats_prometheus) == 0
+
+    with open(stats_json, 'r', encoding='utf-8') as file:
+        endpoints = json.load(file)['endpoints']
+    assert endpoints['page_fh_diary']['requests'] == site.stats['page_fh_diary']
+    assert endpoints['page_fh_diary']['statuses']['200'] == 3
+    assert endpoints['img.php']['bytes'] > 0
+    assert sum(endpoint['retries'] for endpoint in endpoints.values()) == site.stats['fault.server_error']
+
+    with open(stats_prometheus, 'r', encoding='utf-8') as file:
+        assert 'tslove_requests_total{endpoint="do_o_login",status="302"} 1' in file.read().splitlines()
+
+
+def test_dump_with_wrong_password(fast_web, monkeypatch, tmpdir):
+    monkeypatch.setattr(getpass, 'getpass', lambda prompt='': 'wrong')
+
+    with StandInServer(StandInSite(diaries=1)) as server:
+        assert run_diarydump(monkeypatch, server, str(tmpdir)) == 1
+
+
+def test_dump_with_profile(fast_web, monkeypatch, tmpdir):
+    site = StandInSite(diaries=2)
+    stats_file = os.path.join(str(tmpdir), 'profile.pstats')
+
+    with StandInServer(site) as server:
+        assert run_diarydump(monkeypatch, server, os.path.join(str(tmpdir), 'dump'), '--profile-stats', stats_file) == 0
+
+    with open(os.path.join(str(tmpdir), 'dump', 'tslove-tools', 'profile.json'), 'r', encoding='utf-8') as file:
+        profile = json.load(file)
+    assert set(profile['diaries']) == set(site.diary_ids)
+    for stage in ('fetch', 'parse', 'image', 'rewrite', 'serialize', 'write'):
+        assert profile['totals'][stage]['calls'] > 0
+    assert os.path.exists(stats_file)
+
+
+def test_dump_multiple_targets(fast_web, monkeypatch, tmpdir):
+    site = StandInSite(diaries=4)
+    prompts = []
+    monkeypatch.setattr('builtins.input', lambda prompt='': prompts.append(prompt) or USERNAME)
+
+    with StandInServer(site) as server:
+        assert run_diarydump(monkeypatch, server, str(tmpdir), '--target', 'alice', '--target', 'alice:45642',
+                             '--target', 'bob') == 0
+
+    assert prompts == ['user: ', 'user: ']
+    assert site.stats['do_o_login'] == 2
+    for name in ('alice', 'alice-45642', 'bob'):
+        for diary_id in site.diary_ids:
+            assert os.path.exists(os.path.join(str(tmpdir), name, '{}.html'.format(diary_id)))
+        assert os.path.exists(os.path.join(str(tmpdir), name, 'index.html'))
+        assert os.path.exists(os.path.join(str(tmpdir), name, 'stylesheet', 'tslove.css'))
+    assert os.path.exists(os.path.join(str(tmpdir), 'tslove-tools', 'http_cache.json'))
+    assert site.stats['page_fh_diary'] == 3 * len(site.diary_ids)
+
+
+def test_dump_counts_output_failure(fast_web, monkeypatch, tmpdir):
+    site = StandInSite(diaries=2)
+
+    def broken_rewrite(self, soup):
+        raise RuntimeError('unexpected layout')
+
+    monkeypatch.setattr(DiaryDumpApp, '_rewrite_diary', broken_rewrite)
+    with StandInServer(site) as server:
+        assert run_diarydump(monkeypatch, server, str(tmpdir)) == 1
+
+    for diary_id in site.diary_ids:
+        assert not os.path.exists(os.path.join(str(tmpdir), '{}.html'.format(diary_id)))
+    assert not glob.glob(os.path.join(str(tmpdir), 'index-*.html'))  # 失敗した日記は索引に登録しない
+
+
+def test_dump_continues_after_unexpected_error(fast_web, monkeypatch, tmpdir):
+    site = StandInSite(diaries=3)
+    broken_id = site.diary_ids[1]
+    dump_diary = DiaryDumpApp._dump_diary
+
+    def broken_dump_diary(self, diary_id, file_name):
+        if diary_id == broken_id:
+            raise AttributeError('unexpected layout')
+        return dump_diary(self, diary_id, file_name)
+
+    monkeypatch.setattr(DiaryDumpApp, '_dump_diary', broken_dump_diary)
+    with StandInServer(site) as server:
+        app = make_diarydump(monkeypatch, server, str(tmpdir))
+        assert app.run() == 1
+
+    for diary_id in site.diary_ids:
+        assert os.path.exists(os.path.join(str(tmpdir), '{}.html'.format(diary_id))) == (diary_id != broken_id)
+    assert os.path.exists(os.path.join(str(tmpdir), 'index.html'))
+    assert app._diary_pool is None and app._asset_pool is None
+    assert app._archive is None and app._search_index is None
+
+
+def test_dump_closes_pools_when_loop_fails(fast_web, monkeypatch, tmpdir):
+    def broken_collect_diary(self, future):
+        raise RuntimeError('broken')
+
+    monkeypatch.setattr(DiaryDumpApp, '_collect_diary', broken_collect_diary)
+    with StandInServer(StandInSite(diaries=3)) as server:
+        app = make_diarydump(monkeypatch, server, str(tmpdir))
+        with pytest.raises(RuntimeError):
+            app.run()
+
+    assert app._diary_pool is None and app._asset_pool is None
+    assert app._archive is None and app._search_index is None
+
+
+def test_refresh_revalidates_skin_images_of_unchanged_stylesheet(fast_web, monkeypatch, tmpdir):
+    site = StandInSite(diaries=1)
+    skin_images = os.path.join(str(tmpdir), 'stylesheet', 'skin_skin_*.gif')
+
+    with StandInServer(site) as server:
+        assert run_diarydump(monkeypatch, server, str(tmpdir)) == 0
+        before = site.stats
+        assert run_diarydump(monkeypatch, server, str(tmpdir), '--refresh-assets') == 0
+        after = site.stats
+
+    assert after['xhtml_style.php'] - before['xhtml_style.php'] == 1
+    assert glob.glob(skin_images)
+    assert after['img_skin.php'] - before['img_skin.php'] == len(glob.glob(skin_images))
+
+
+def test_reindex_skips_undecodable_file(fast_web, monkeypatch, tmpdir):
+    site = StandInSite(diaries=3)
+    broken_id = site.diary_ids[1]
+
+    with StandInServer(site) as server:
+        assert run_diarydump(monkeypatch, server, str(tmpdir)) == 0
+        os.remove(os.path.join(str(tmpdir), 'tslove-tools', SEARCH_INDEX_FILE_NAME))
+        with open(os.path.join(str(tmpdir), '{}.html'.format(broken_id)), 'wb') as file:
+            file.write(b'\xff\xfe broken')
+        assert run_diarydump(monkeypatch, server, str(tmpdir)) == 0
+
+    index = SearchIndex(os.path.join(str(tmpdir), 'tslove-tools', SEARCH_INDEX_FILE_NAME))
+    try:
+        assert [diary_id in index for diary_id in site.diary_ids] == [True, False, True]
+    finally:
+        index.close()
+
+
+def test_failed_sync_keeps_dumped_file(fast_web, monkeypatch, tmpdir):
+    site = StandInSite(diaries=2)
+    changed_id = site.diary_ids[0]
+    file_name = os.path.join(str(tmpdir), '{}.html'.format(changed_id))
+
+    with StandInServer(site) as server:
+        assert run_diarydump(monkeypatch, server, str(tmpdir)) == 0
+        with open(file_name, 'rb') as file:
+            dumped = file.read()
+
+        comment_count = site.comment_count
+        monkeypatch.setattr(site, 'comment_count',
+                            lambda diary_id: comment_count(diary_id) + (diary_id == changed_id))
+
+        def broken_write_html(soup, file, mode):
+            file.write('<html>')
+            raise OSError('disk full')
+
+        monkeypatch.setattr(dumpapp, 'write_html', broken_write_html)
+        before = site.stats['page_fh_diary']
+        assert run_diarydump(monkeypatch, server, str(tmpdir), '--sync') == 1
+        assert site.stats['page_fh_diary'] == before + 1
+
+    with open(file_name, 'rb') as file:
+        assert file.read() == dumped
+    assert not glob.glob(os.path.join(str(tmpdir), '*.part'))
@@ -0,0 +1,49 @@
+import datetime
+import os
+import sys
+
+import pytest
+
+from tslove.core.archive import ArchiveIndex
+from tslove.diarydump import DiaryDumpApp
+
+
+def make_page_info(diary_id, month):
+    return {'diary_id': diary_id, 'date': datetime.datetime(2020, month, 1, 12, 0), 'title': 'diary ' + diary_id,
+            'prev_diary_id': None, 'fingerprint': None}
+
+
+@pytest.fixture()
+def app(tmpdir, monkeypatch):
+    monkeypatch.setattr(sys, 'argv', ['diarydump', '-o', str(tmpdir)])
+    the_app = DiaryDumpApp()
+    the_app._archive = ArchiveIndex(':memory:')
+    yield the_app
+    the_app._archive.close()
+
+
+def read(app, file_name):
+    with open(os.path.join(app._config.output_path['base'], file_name), 'r', encoding='utf-8') as file:
+        return file.read()
+
+
+def test_output_index_shards(app):
+    app._archive.put_many([make_page_info('1', 4), make_page_info('2', 5), make_page_info('3', 5)])
+    app._output_index(set())
+
+    assert 'index-2020-05.html">2020年05月</a> (2)' in read(app, 'index.html')
+    assert './3.html' in read(app, 'index-2020-05.html')
+    assert './1.html' not in read(app, 'index-2020-05.html')
+    assert './1.html' in read(app, 'index-2020-04.html')
+
+
+def test_output_index_regenerates_touched_months_only(app):
+    app._archive.put_many([make_page_info('1', 4), make_page_info('2', 5)])
+    app._output_index(set())
+
+    app._archive.put_many([make_page_info('3', 4), make_page_info('4', 5)])
+    app._output_index({(2020, 5)})
+
+    assert './4.html' in read(app, 'index-2020-05.html')
+    assert './3.html' not in read(app, 'index-2020-04.html')
+    assert '(2)' in read(app, 'index.html')
@@ -0,0 +1,52 @@
+import datetime
+import os
+
+from benchmark.synthetic import load_diary_page
+from tslove.core.parser import make_soup
+from tslove.core.serializer import write_html, COMPACT
+from tslove.diarydump import DiaryDumpApp
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+
+
+def write_diary(file_name, page_info):
+    soup = make_soup(load_diary_page())
+    DiaryDumpApp._embed_page_info(soup, page_info)
+    with open(file_name, 'w', encoding='utf-8') as file:
+        file.write(soup.prettify(formatter='html'))
+
+
+def test_embedded_page_info_round_trip(tmpdir):
+    file_name = os.path.join(tmpdir, '2686448.html')
+    page_info = {'title': 'It\'s "quoted" <&> テスト',
+                 'date': datetime.datetime(2020, 7, 19, 2, 10),
+                 'prev_diary_id': '2685064',
+                 'diary_id': '2686448'}
+    write_diary(file_name, page_info)
+
+    assert DiaryDumpApp._read_embedded_page_info(file_name) == page_info
+
+
+def test_embedded_page_info_without_prev(tmpdir):
+    file_name = os.path.join(tmpdir, '1.html')
+    page_info = {'title': 'first', 'date': datetime.datetime(2006, 1, 1), 'prev_diary_id': None, 'diary_id': '1'}
+    write_diary(file_name, page_info)
+
+    assert DiaryDumpApp._read_embedded_page_info(file_name) == page_info
+
+
+def test_embedded_page_info_in_compact_html(tmpdir):
+    file_name = os.path.join(tmpdir, '1.html')
+    page_info = {'title': 'compact', 'date': datetime.datetime(2006, 1, 1), 'prev_diary_id': None, 'diary_id': '1'}
+    soup = make_soup(load_diary_page())
+    DiaryDumpApp._embed_page_info(soup, page_info)
+    with open(file_name, 'w', encoding='utf-8') as file:
+        write_html(soup, file, COMPACT)
+
+    assert DiaryDumpApp._read_embedded_page_info(file_name) == page_info
+
+
+def test_legacy_file_has_no_embedded_page_info():
+    file_name = os.path.join(DATA_DIR, 'expect-diary-page.html')
+
+    assert DiaryDumpApp._read_embedded_page_info(file_name) is None
@@ -0,0 +1,89 @@
+import importlib.util
+import io
+import os
+import sys
+
+import bs4  # type: ignore
+import pytest
+
+from benchmark.legacy import legacy_rewrite
+from benchmark.synthetic import build_diary_page, load_diary_page
+from tslove.core import parser
+from tslove.core.parser import make_soup
+from tslove.core.serializer import write_html, COMPATIBLE
+from tslove.diarydump import DiaryDumpApp
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+
+IMAGE_FILES = {
+    'd_2686448_1_1595092211.jpg': 'dummy_image3.jpg',
+    'dc_24680272_1_1595092302.jpg': 'dummy_image3.jpg',
+    'dc_24680515_1_1595108560.jpg': 'dummy_image2.jpg',
+    'dc_24682850_1_1595164585.jpg': 'dummy_image1.jpg',
+}
+
+
+@pytest.fixture()
+def app(tmpdir, monkeypatch):
+    monkeypatch.setattr(sys, 'argv', ['diarydump', '-o', str(tmpdir)])
+    the_app = DiaryDumpApp()
+    for name, data_file in IMAGE_FILES.items():
+        the_app._image_sizes.record(name, os.path.join(DATA_DIR, data_file))
+    return the_app
+
+
+@pytest.mark.parametrize('comments', [None, 200])
+def test_rewrite_equals_legacy(app, comments):
+    html = load_diary_page() if comments is None else build_diary_page(comments)
+
+    expect = make_soup(html)
+    legacy_rewrite(app, expect)
+    actual = make_soup(html)
+    app._rewrite_diary(actual)
+
+    assert actual.prettify(formatter='html') == expect.prettify(formatter='html')
+
+
+def test_rewrite_result(app):
+    soup = make_soup(load_diary_page())
+    app._rewrite_diary(soup)
+
+    assert soup.find('form') is None
+    assert soup.find('input') is None
+    assert soup.find('div', id='commentForm') is None
+    assert soup.find('a', onclick=True) is None
+    assert soup.find('link', rel='stylesheet')['href'] == './stylesheet/tslove.css'
+    assert {tag['src'] for tag in soup.find_all('script', src=True)} == {'scripts/pne.js', 'scripts/www.youtube.com.js'}
+    assert soup.find('p', class_='prev').a['href'] == './2685064.html'
+
+    thumbnail = soup.find('img', src='./images/dc_24680515_1_1595108560.jpg')
+    assert str(thumbnail['width']) == '120' and not thumbnail.has_attr('height')
+
+
+def rewritten_html(app, parser_name, html):
+    name = parser.html_parser()
+    parser.set_html_parser(parser_name)
+    try:
+        soup = make_soup(html)
+    finally:
+        parser.set_html_parser(name)
+    app._rewrite_diary(soup)
+    for ad_tag in soup.find_all('div', style='padding:15px 0;'):  # lxml は p の外へ移す
+        ad_tag.decompose()
+    file = io.StringIO()
+    write_html(soup, file, COMPATIBLE)
+    return file.getvalue()
+
+
+@pytest.mark.skipif(importlib.util.find_spec('lxml') is None, reason='lxml is not installed')
+@pytest.mark.skipif(tuple(map(int, bs4.__version__.split('.')[:2])) < (4, 15),
+                    reason='html.parser nests unclosed <br> before beautifulsoup4 4.15')
+def test_lxml_rewrite_differs_only_in_known_places(app):
+    html = load_diary_page()
+    expect = rewritten_html(app, 'html.parser', html)
+    actual = rewritten_html(app, 'lxml', html)
+
+    expect_doctype, expect_body = expect.split('\n<html', 1)
+    actual_doctype, actual_body = actual.split('\n<html', 1)
+    assert actual_doctype.split() == expect_doctype.split()  # lxml は DOCTYPE の改行を空白にする
+    assert actual_body == expect_body
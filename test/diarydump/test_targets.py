@@ -0,0 +1,39 @@
+import os
+import sys
+
+import pytest
+
+from tslove.diarydump import DiaryDumpApp, Target, parse_target, round_robin
+
+
+def test_parse_target():
+    assert parse_target('alice') == Target('alice')
+    assert parse_target('alice:45642') == Target('alice', '45642')
+    assert parse_target('alice:45642').name == 'alice-45642'
+
+    for spec in ('', 'alice:', 'alice:bob', '../alice', '..', 'a/b'):
+        with pytest.raises(ValueError):
+            parse_target(spec)
+
+
+def test_round_robin():
+    assert list(round_robin([iter('abc'), iter(''), iter('de'), iter('f')])) == list('adfbec')
+
+
+def test_targets_option(tmpdir, monkeypatch):
+    monkeypatch.setattr(sys, 'argv', ['diarydump', '-o', str(tmpdir), '--target', 'alice', '--target', 'bob:1'])
+    app = DiaryDumpApp()
+
+    assert app._config.targets == [Target('alice'), Target('bob', '1')]
+    assert app._config.output_path['tools'] == os.path.join(str(tmpdir), 'tslove-tools')
+
+
+@pytest.mark.parametrize('specs', [['alice', 'alice'], ['alice:x']])
+def test_invalid_targets_option(tmpdir, monkeypatch, specs):
+    argv = ['diarydump', '-o', str(tmpdir)]
+    for spec in specs:
+        argv += ['--target', spec]
+    monkeypatch.setattr(sys, 'argv', argv)
+
+    with pytest.raises(SystemExit):
+        DiaryDumpApp()